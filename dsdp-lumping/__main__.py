@@ -1,69 +1,33 @@
-import hashlib
+import argparse
+import importlib
 from pathlib import Path
-import json
 import shutil
 import sys
 
-# from dsdp-lumping.py import processing, lumping, auts, gaut2gap
-from . import processing, lumping, auts, gaut2gap, viz_layout, __batch_run__
+# Subsystems are imported by the mode that uses them (see run_module), so headless modes never load Dash, Cytoscape
+# or GAP; dag only declares the stages and imports a stage's module when the stage runs.
+from . import dag
+from . import tracing
 
 BASE_PATH = Path(__file__).resolve().parents[1]
-DATA_DIR = BASE_PATH / 'data' / 'external' / '5_user_data'
-HASH_FILE = BASE_PATH / 'data_hash.json'  # File to store the hash value
 
+# Folders of the user pipeline emptied by --clean
+CLEAR_FOLDERS = [
+    BASE_PATH / 'data' / 'processed' / 'gap_output',
+    BASE_PATH / 'data' / 'processed' / 'lumping_output',
+    BASE_PATH / 'data' / 'processed' / 'processing_output',
+    BASE_PATH / 'data' / 'processed' / 'saucy_output',
+    BASE_PATH / 'data' / 'processed' / 'viz_files'
+]
 
-def calculate_dir_hash(directory: Path) -> str:
-    """
-    Calculate a combined hash for all files in the specified directory based solely on their contents.
-    Args:
-        directory (Path): The directory path whose contents will be hashed.
-    Returns:
-        str: A hexadecimal string representing the combined hash of the directory contents.
-    """
-    hash_obj = hashlib.sha256()
-
-    # Walk through each file in the directory (recursively) and sort for stable order
-    for file_path in sorted(directory.rglob('*')):
-        if file_path.is_file() and file_path.name != '.DS_Store':
-            # Open and read the file in binary mode
-            with open(file_path, 'rb') as file:
-                while chunk := file.read(8192):  # Read file in chunks
-                    hash_obj.update(chunk)
-    
-    # Return the resulting hash as a hexadecimal string
-    return hash_obj.hexdigest()
-
-def read_stored_hash() -> str:
-    """
-    Reads the stored hash from the HASH_FILE if it exists (HASH_FILE is stored at the start of this script).
-    Handles cases where the file is empty or corrupted.
-    
-    Returns:
-        str: The stored hash string if it exists and is valid, otherwise an empty string.
-    """
-    if HASH_FILE.exists():
-        try:
-            with open(HASH_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get('dir_hash', '')
-        except (json.JSONDecodeError, KeyError):
-            # If the file is empty or corrupt, return an empty string
-            print("Hash file is empty or corrupted. Returning an empty stored hash.")
-            return ''
-    return ''
-
-
-def store_hash(new_hash: str):
-    """
-    Stores the calculated hash in HASH_FILE which is set at the start of this script.
+# Subcommand -> the pipeline stage it runs (see dag.user_stages)
+STAGE_COMMANDS = {
+    'process' : 'processing',
+    'auts'    : 'saucy',
+    'gap'     : 'gaut2gap',
+    'lump'    : 'lumping',
+}
 
-    Args:
-        new_hash (str): The new hash string to be stored.
-    """
-
-    with open(HASH_FILE, 'w') as f:
-        json.dump({'dir_hash': new_hash}, f)
-    return
 
 def clear_folders(folders):
     """
@@ -84,61 +48,115 @@ def clear_folders(folders):
                     shutil.rmtree(item)  # Delete the directory and its contents
     return
 
-def main():
+def run_module(module, function='main', **kwargs):
     """
-    Main function to check for changes in user data and run necessary processing steps.
+    Imports a module of the package and runs one of its functions.
 
-    It calculates the current hash of the user data directory and compares it with the stored hash.
-    If there are changes, it clears specific folders, runs the data processing steps, and updates the stored hash.
-    Finally, it runs the visualization process.
+    Parameters:
+    module (str): Module name, e.g. 'viz_layout'.
+    function (str, optional): Name of the function to run. Defaults to 'main'.
+    **kwargs: Keyword arguments passed to the function.
     """
-    # Check for command-line arguments
-    if len(sys.argv) > 1:
-        mode = sys.argv[1]
-        if mode == 'batch': 
-            batch_run.run()  # Assume run() is a function in __batch_processing__.py
-        else:
-            print(f"Unknown mode: {mode}")
-    else:
-        print("Running default main operation...")
+    return getattr(importlib.import_module('.' + module, __package__), function)(**kwargs)
 
-    current_hash = calculate_dir_hash(DATA_DIR)
-    stored_hash = read_stored_hash()
 
+def run_stage(name, force=False):
+    """
+    Runs a single stage of the user pipeline through the stage runner, so the manifest stays up to date.
 
-    if current_hash == stored_hash:
-        print("Files are unchanged, skipping processes.")
-    else:
-        print("Files have changed, running processes...")
+    Parameters:
+    name (str): Stage name (see dag.user_stages).
+    force (bool, optional): Run the stage even if it is up to date. Defaults to False.
+    """
+    stages = [stage for stage in dag.user_stages() if stage.name == name]
+    return dag.run(stages, dag.user_networks(), force=[name] if force else [])
 
-        CLEAR_FOLDERS=[
-            BASE_PATH / 'data' / 'processed' / 'gap_output',
-            BASE_PATH / 'data' / 'processed' / 'lumping_output',
-            BASE_PATH / 'data' / 'processed' / 'processing_output',
-            BASE_PATH / 'data' / 'processed' / 'saucy_output',
-            BASE_PATH / 'data' / 'processed' / 'viz_files'
-        ]
 
+def main():
+    """
+    Main function to run the user pipeline, one of its stages, the visualisation or the batch pipeline.
+
+    Without a subcommand the stale stages of the user pipeline run and the visualisation starts. Every stage records
+    the hash of its inputs and code in the pipeline manifest (see dag.py), so only stages whose inputs or code changed
+    run again. '--force <stage>' reruns a stage and '--from <stage>' reruns a stage and all later stages, and '--clean'
+    clears every processed folder first.
+
+    The subcommands 'process', 'auts', 'gap' and 'lump' run a single stage, 'viz' only starts the visualisation and
+    'batch' runs the batch pipeline; 'batch --worker' joins a multi-node run as one of its workers and 'batch --merge'
+    merges the results of the workers (see work_queue.py), 'batch --archives' lumps the precomputed automorphisms of
+    the shipped zip archives without extracting them (see archive.py), and 'status' shows the progress of a batch run
+    in another terminal (see progress.py). 'bench' runs the scaling benchmarks (see benchmark.py) and exits with status
+    1 when a stage regressed against the baseline, and 'verify' checks every lumping engine against GAP (see
+    verify_engines.py), exiting with status 1 on a mismatch. Each imports only the modules it uses: Dash and
+    Cytoscape load with 'viz', and GAP starts with the lumping stage.
+    """
+    parser = argparse.ArgumentParser(prog='dsdp-lumping')
+    parser.add_argument('--force', action='append', default=[], metavar='STAGE', help="rerun a stage")
+    parser.add_argument('--from', dest='start', metavar='STAGE', help="rerun a stage and every later stage")
+    parser.add_argument('--clean', action='store_true', help="clear all processed outputs and rerun every stage")
+    commands = parser.add_subparsers(dest='mode', metavar='MODE')
+    for command, stage in STAGE_COMMANDS.items():
+        sub = commands.add_parser(command, help=f"run the {stage} stage")
+        sub.add_argument('--force', dest='rerun', action='store_true', help="rerun the stage even if up to date")
+    commands.add_parser('viz', help="start the visualisation")
+    batch = commands.add_parser('batch', help="run the batch pipeline")
+    queue = batch.add_mutually_exclusive_group()
+    queue.add_argument('--worker', action='store_true', help="claim networks from the shared work queue")
+    queue.add_argument('--merge', action='store_true', help="merge the results of the work-queue workers")
+    queue.add_argument('--archives', action='store_true', help="lump the networks of the shipped zip archives")
+    status = commands.add_parser('status', help="show the progress of a running or finished batch")
+    status.add_argument('--file', metavar='PATH', help="status file, e.g. the progress.json of a work-queue worker")
+    bench = commands.add_parser('bench', help="run the scaling benchmarks")
+    bench.add_argument('--quick', action='store_true', help="only the smallest size of every graph family")
+    bench.add_argument('--update-baseline', action='store_true', help="store this run as the new baseline")
+    bench.add_argument('--threshold', type=float, help="allowed relative slowdown, e.g. 0.25")
+    verify = commands.add_parser('verify', help="check the lumping engines against GAP")
+    verify.add_argument('--no-corpus', dest='corpus', action='store_false', help="only check random groups")
+    verify.add_argument('--random', type=int, default=50, metavar='N', help="number of random groups (default 50)")
+    verify.add_argument('--limit', type=int, metavar='N', help="only check the first N networks of the corpus")
+    verify.add_argument('--archives', action='store_true', help="read the corpus from the shipped GAP archive")
+    args = parser.parse_args()
+
+    if args.clean:
         print("Clearing old files to visualise new user data...")
         clear_folders(CLEAR_FOLDERS)
+        args.start = dag.user_stages()[0].name
+
+    if args.mode == 'batch' and args.worker:
+        run_module('work_queue')
+        tracing.export()
+    elif args.mode == 'batch' and args.merge:
+        run_module('work_queue', 'merge')
+        tracing.export()
+    elif args.mode == 'batch' and args.archives:
+        run_module('batch_lumping', archives=True)
+        tracing.export()
+    elif args.mode == 'batch':
+        run_module('__batch_run__')
+    elif args.mode == 'status':
+        run_module('progress', path=args.file)
+    elif args.mode == 'bench':
+        regressions = run_module('benchmark', quick=args.quick, update_baseline=args.update_baseline,
+                                 threshold=args.threshold)
+        if regressions:
+            sys.exit(1)
+    elif args.mode == 'verify':
+        mismatches = run_module('verify_engines', corpus=args.corpus, random_groups=args.random, limit=args.limit,
+                                archives=args.archives)
+        if mismatches:
+            sys.exit(1)
+    elif args.mode == 'viz':
+        run_module('viz_layout')
+    elif args.mode in STAGE_COMMANDS:
+        run_stage(STAGE_COMMANDS[args.mode], force=args.rerun or args.clean)
+        tracing.export()
+    else:
+        dag.run(dag.user_stages(), dag.user_networks(), force=args.force, start=args.start)
+        tracing.export()
 
-        print("Running processing...")
-        processing.main()
-
-        print("Running Saucy...")
-        auts.main()
-
-        print("Processing data for GAP")
-        gaut2gap.main()
-
-        print("Running lumping...")
-        lumping.main()
-
-        # Store the new hash after running the processes
-        store_hash(current_hash)
-
-    print("Running visualisation...")
-    viz_layout.main()
+        print("Running visualisation...")
+        run_module('viz_layout')
+    return
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,281 @@
+'''
+Streaming reads from the shipped zip archives.
+
+The saucy output (data/external/2_saucy_output) and the GAP-readable automorphism data
+(data/external/3_gap_readable_automorphism_data) ship as zip archives of thousands of small files. Rather than
+extracting them, the readers of the batch pipeline accept virtual paths into an archive,
+
+    data/external/2_saucy_output/networkrepositorydata_scyoutput_202021001.zip/networkrepository/ash85.log
+
+and open_text streams such a member straight from the archive: it seeks to the member's local header and inflates the
+compressed bytes in CHUNK_SIZE pieces, checking the CRC once the member has been read, so neither the archive nor a
+member is ever held in memory or written to disk. Plain paths are opened as usual, so callers need not care where
+their inputs live.
+
+The member offsets come from an index built once per archive from its central directory and stored as JSON in
+data/interim/archive_index; it is rebuilt only when the archive's size or modification time changes, so workers that
+each open the archive read a small index instead of parsing thousands of central directory entries.
+'''
+
+import io
+import os
+import json
+import glob
+import zlib
+import struct
+import zipfile
+from collections import namedtuple
+
+current_file_path = os.path.abspath(__file__)
+base_path = os.path.join(current_file_path, '..','..')
+base_path = os.path.normpath(base_path)
+
+index_directory = os.path.join(base_path,'data','interim','archive_index')
+
+# Bytes read from the archive (and produced by inflating) per step
+CHUNK_SIZE = 1 << 20  # 1MB
+
+# Local file header of a zip member (see the zip APPNOTE, section 4.3.7)
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# Position of a member in its archive and how it is stored
+Member = namedtuple('Member', ['offset', 'compress_size', 'file_size', 'compress_type', 'crc', 'flag_bits'])
+
+# Indexes loaded in this process: archive path -> member name -> Member
+_indexes = {}
+
+
+def shipped_directory(kind):
+    """
+    Returns the folder of networks inside a shipped archive, as a virtual path.
+
+    Parameters:
+    kind (str): 'saucy' for the .gaut and .log files, 'gap' for the .gap files.
+
+    Returns:
+    str: The virtual path of the archive's networkrepository folder.
+    """
+    folders = {'saucy': '2_saucy_output', 'gap': '3_gap_readable_automorphism_data'}
+    archives = sorted(glob.glob(os.path.join(base_path,'data','external',folders[kind],'*.zip')))
+    if not archives:
+        raise FileNotFoundError(f"No {kind} archive in data/external/{folders[kind]}.")
+    return os.path.join(archives[0], 'networkrepository')
+
+
+def split(path):
+    """
+    Splits a virtual path into its archive and member.
+
+    Parameters:
+    path (str or Path): A path that may lead through a .zip archive.
+
+    Returns:
+    tuple or None: The archive path and the member name ('/'-separated), or None for a plain path.
+    """
+    path = str(path)
+    for separator in {'/', os.sep}:
+        position = path.find('.zip' + separator)
+        if position >= 0 and os.path.isfile(path[:position + 4]):
+            return path[:position + 4], path[position + 5:].replace(os.sep, '/')
+    return None
+
+
+def is_member(path):
+    """
+    Returns whether a path leads into a zip archive.
+    """
+    return split(path) is not None
+
+
+def _build_index(archive_path):
+    # Member name -> Member for every file in the archive, read from its central directory.
+    with zipfile.ZipFile(archive_path) as archive:
+        return {info.filename: Member(info.header_offset, info.compress_size, info.file_size, info.compress_type,
+                                      info.CRC, info.flag_bits)
+                for info in archive.infolist() if not info.is_dir()}
+
+
+def index(archive_path):
+    """
+    Returns the member index of an archive, building and storing it on first use.
+
+    Parameters:
+    archive_path (str): Path of the zip archive.
+
+    Returns:
+    dict: Member name -> Member.
+    """
+    archive_path = os.path.abspath(archive_path)
+    st = os.stat(archive_path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    cached = _indexes.get(archive_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    index_path = os.path.join(index_directory, os.path.basename(archive_path) + '.json')
+    members = None
+    try:
+        with open(index_path, 'r') as f:
+            stored = json.load(f)
+        if stored['archive'] == archive_path and stored['stamp'] == stamp:
+            members = {name: Member(*entry) for name, entry in stored['members'].items()}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if members is None:
+        members = _build_index(archive_path)
+        os.makedirs(index_directory, exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'archive': archive_path, 'stamp': stamp,
+                       'members': {name: list(member) for name, member in members.items()}}, f)
+        os.replace(tmp_path, index_path)
+    _indexes[archive_path] = (stamp, members)
+    return members
+
+
+def _member(path):
+    # The archive and Member of a virtual path; FileNotFoundError if the archive has no such member.
+    archive_path, name = split(path)
+    member = index(archive_path).get(name)
+    if member is None:
+        raise FileNotFoundError(f"No member {name} in {archive_path}.")
+    return archive_path, member
+
+
+def exists(path):
+    """
+    Returns whether a file, or a member of an archive, exists.
+    """
+    if not is_member(path):
+        return os.path.exists(path)
+    archive_path, name = split(path)
+    return name in index(archive_path)
+
+
+def list_files(directory, suffix):
+    """
+    Lists the files with a suffix in a folder, or in a folder of an archive.
+
+    Parameters:
+    directory (str): A folder, or a virtual path to a folder inside an archive.
+    suffix (str): File suffix, e.g. '.gap'.
+
+    Returns:
+    list: Sorted paths (virtual paths for archive members).
+    """
+    if not is_member(os.path.join(directory, '')):
+        return sorted(glob.glob(os.path.join(directory, '*' + suffix)))
+    archive_path, prefix = split(os.path.join(directory, ''))
+    return sorted(os.path.join(archive_path, *name.split('/')) for name in index(archive_path)
+                  if name.startswith(prefix) and '/' not in name[len(prefix):] and name.endswith(suffix))
+
+
+def digest(path):
+    """
+    Identifies the contents of an archive member without reading it: its CRC-32 and size from the index.
+
+    Parameters:
+    path (str): Virtual path of the member.
+
+    Returns:
+    str: The CRC in hexadecimal and the size, e.g. '1c291ca3:2048'.
+    """
+    member = _member(path)[1]
+    return f"{member.crc:08x}:{member.file_size}"
+
+
+class _MemberReader(io.RawIOBase):
+    # Raw binary stream of one stored or deflated member, inflated CHUNK_SIZE bytes at a time.
+
+    def __init__(self, archive_path, member):
+        super().__init__()
+        self._file = open(archive_path, 'rb')
+        try:
+            self._file.seek(member.offset)
+            header = LOCAL_HEADER.unpack(self._file.read(LOCAL_HEADER.size))
+            if header[0] != LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(f"Bad local header at offset {member.offset} of {archive_path}.")
+            self._file.seek(header[-2] + header[-1], io.SEEK_CUR)  # file name and extra field
+        except BaseException:
+            self._file.close()
+            raise
+        self._member = member
+        self._left = member.compress_size
+        self._inflate = zlib.decompressobj(-zlib.MAX_WBITS) if member.compress_type == zipfile.ZIP_DEFLATED else None
+        self._buffer = b''
+        self._crc = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _read_raw(self):
+        data = self._file.read(min(CHUNK_SIZE, self._left))
+        if not data:
+            raise EOFError(f"Truncated member at offset {self._member.offset}.")
+        self._left -= len(data)
+        return data
+
+    def _fill(self):
+        while not self._buffer and not self._eof:
+            if self._inflate is None:
+                data = self._read_raw() if self._left else b''
+                self._eof = not self._left
+            else:
+                raw = self._inflate.unconsumed_tail or (self._read_raw() if self._left else b'')
+                data = self._inflate.decompress(raw, CHUNK_SIZE)
+                self._eof = self._inflate.eof or (not self._left and not self._inflate.unconsumed_tail and not data)
+            self._crc = zlib.crc32(data, self._crc)
+            self._buffer = data
+        if self._eof and not self._buffer and self._crc != self._member.crc:
+            raise zipfile.BadZipFile(f"CRC mismatch in member at offset {self._member.offset}.")
+
+    def readinto(self, b):
+        self._fill()
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def open_binary(path):
+    """
+    Opens a file, or a member of an archive, for reading bytes.
+
+    Parameters:
+    path (str or Path): A plain or virtual path.
+
+    Returns:
+    file object: A buffered binary stream.
+    """
+    if not is_member(path):
+        return open(path, 'rb')
+    archive_path, member = _member(path)
+    if member.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED) and not member.flag_bits & 0x1:
+        return io.BufferedReader(_MemberReader(archive_path, member), CHUNK_SIZE)
+    # Other compression methods are left to zipfile, at the cost of reading the central directory
+    archive = zipfile.ZipFile(archive_path)
+    stream = archive.open(split(path)[1])
+    stream._archive = archive  # keeps the archive open as long as the stream
+    return stream
+
+
+def open_text(path):
+    """
+    Opens a file, or a member of an archive, for reading text.
+
+    Parameters:
+    path (str or Path): A plain or virtual path.
+
+    Returns:
+    file object: A text stream, usable as a context manager and iterable by line.
+    """
+    if not is_member(path):
+        return open(path, 'r')
+    return io.TextIOWrapper(open_binary(path), encoding='utf-8')
@@ -11,6 +11,8 @@ The output from saucy is written to two files, one containing the automorphism g
 import subprocess
 from pathlib import Path
 
+from . import config
+
 def main():
     CURRENT_FILE_PATH = Path(__file__).resolve()
     BASE_PATH = CURRENT_FILE_PATH.parents[1]
@@ -26,9 +28,9 @@ def main():
     # File containing the network in .scy format    
     fname = str(BASE_PATH / 'data' / 'processed' / 'processing_output' / stub) + '.scy'
     
-    # Run the Saucy tool via a subprocess call, passing the input file
+    # Run the Saucy tool (config.SAUCY_PATH, set with DSDP_SAUCY) via a subprocess call, passing the input file
     # `-s` is the option to run saucy with a standard mode
-    p=subprocess.Popen(['saucy-3.0/saucy','-s',fname],stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+    p=subprocess.Popen([config.SAUCY_PATH,'-s',fname],stdout=subprocess.PIPE,stderr=subprocess.PIPE)
     
     # Capture the standard output and error from Saucy execution
     output, error = p.communicate()
@@ -12,23 +12,30 @@ import subprocess
 import os
 import glob
 
-def auts_gen(fname,logstub):
-    p=subprocess.Popen(['saucy-3.0/saucy','-s',fname],stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-    output, error = p.communicate()
-
-    # Write output to file
-    scy_fname = os.path.basename(fname)[:-4]
-    gautsout = os.path.join(logstub,scy_fname)
-    logsout = os.path.join(logstub,scy_fname)
+from . import config
+from . import tracing
+from . import progress
 
-    fgaut=open(gautsout+'.gaut','w')
-    flog=open(logsout+'.log','w')
+def auts_gen(fname,logstub):
+    # Traced as the saucy stage of the network (see tracing.py); saucy's CPU time is recorded as child usage
+    network = os.path.basename(fname)[:-4]
+    with tracing.span('saucy', network, category='stage'), progress.task('saucy', network):
+        p=subprocess.Popen([config.SAUCY_PATH,'-s',fname],stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+        output, error = p.communicate()
+
+        # Write output to file
+        scy_fname = os.path.basename(fname)[:-4]
+        gautsout = os.path.join(logstub,scy_fname)
+        logsout = os.path.join(logstub,scy_fname)
+
+        fgaut=open(gautsout+'.gaut','w')
+        flog=open(logsout+'.log','w')
                     
-    fgaut.write(output.decode("utf-8"))
-    flog.write(error.decode("utf-8"))
+        fgaut.write(output.decode("utf-8"))
+        flog.write(error.decode("utf-8"))
 
-    fgaut.close()
-    flog.close()
+        fgaut.close()
+        flog.close()
     return
 
 def main():
@@ -2,11 +2,16 @@ import os
 import re
 import glob
 
+from . import archive
+from . import tracing
+from . import progress
+
 current_file_path = os.path.abspath(__file__)
 
 base_path = os.path.join(current_file_path, '..','..')
 base_path = os.path.normpath(base_path)
 
+@tracing.traced()
 def readautomorphismgroup(fname):
     # fname should be the stub for the output from scy
     # You should therefore have two files:
@@ -16,7 +21,7 @@ def readautomorphismgroup(fname):
     N = None  # Initialize N to handle cases where it's not found
     
     # Get the number of vertices from the log file
-    with open(fname+'.log','r') as flog:
+    with archive.open_text(fname+'.log') as flog:
         for line in flog:
             if line.startswith('vertices'):
                 try:
@@ -32,7 +37,7 @@ def readautomorphismgroup(fname):
     generators = []
     
     # Get generators from gaut file
-    with open(fname+'.gaut','r') as fgaut:
+    with archive.open_text(fname+'.gaut') as fgaut:
         for gstring in fgaut:
             # Remove brackets and split up into twocycles
             gstringlist = gstring.lstrip('(').rstrip(')\n').split(')(')
@@ -43,6 +48,47 @@ def readautomorphismgroup(fname):
     return N, generators
 
 
+def write_gap(foutname, N, generators):
+    # Writes the generators in GAP format; a trivial group (empty .gaut) is written as the identity '()' so the
+    # network still reaches lumping, which counts it without GAP
+    with open(foutname, 'w') as fout:
+        fout.write('N:={0};;\n'.format(N))
+        fout.write('z:=[')
+        if len(generators) == 0:
+            fout.write('()')
+
+        first = True
+        for generator in generators:    
+            if first:
+                first = False
+            else:
+                fout.write(',')
+            # Write cycle                
+            for cycle in generator:
+                fout.write('(')
+                firstvertex = True                    
+                for vertex in cycle:
+                    if firstvertex:
+                        firstvertex = False
+                    else:
+                        fout.write(',')
+                    fout.write('{0}'.format(vertex + 1))
+                fout.write(')')
+
+        fout.write('];;\n')
+        fout.write('g:=Group(z);')
+    return
+
+
+def gaut_to_gap(fname, foutname):
+    # Converts one saucy output stub (fname.gaut and fname.log) to a .gap file, as gaut2gap does for a directory.
+    network = os.path.basename(fname)
+    with tracing.span('gaut2gap', network, category='stage'), progress.task('gaut2gap', network):
+        N, generators = readautomorphismgroup(fname)
+        write_gap(foutname, N, generators)
+    return foutname
+
+
 def gaut2gap(stub):
         
     count = 1
@@ -51,8 +97,10 @@ def gaut2gap(stub):
         dname = os.path.join(base_path, 'data', 'interim', 'batch_gap_output')        
         for file in files:
             foutname = os.path.join(dname, file[:-5]) + '.gap'
+            if file[-4:] == 'gaut' and file[0] != '.' and os.path.isfile(foutname):
+                progress.skip('gaut2gap', file[:-5])  # converted by an earlier run
             # Check file type and whether it exists already
-            if file[-4:] == 'gaut' and file[0] != '.' and not os.path.isfile(foutname):
+            elif file[-4:] == 'gaut' and file[0] != '.' and not os.path.isfile(foutname):
                 # Make directory if it doesn't exist
                 if len(dname) > 0 and not os.path.exists(dname):
                     print('Making directory: ' + dname)
@@ -64,39 +112,17 @@ def gaut2gap(stub):
                 count += 1
 
                 # Try to get generators and handle errors if they occur
+                progress.start('gaut2gap', file[:-5])
                 try:
                     N, generators = readautomorphismgroup(fname)
                 except ValueError as e:
                     # Print a warning and skip to the next file
                     print(f"Skipping {fname}. Reason: {e}")
+                    progress.finish('gaut2gap', file[:-5], ok=False)
                     continue  # Move to the next file
 
-                # Write generators to file if there are any
-                if len(generators) > 0:
-                    with open(foutname, 'w') as fout:
-                        fout.write('N:={0};;\n'.format(N))
-                        fout.write('z:=[')
-
-                        first = True
-                        for generator in generators:    
-                            if first:
-                                first = False
-                            else:
-                                fout.write(',')
-                            # Write cycle                
-                            for cycle in generator:
-                                fout.write('(')
-                                firstvertex = True                    
-                                for vertex in cycle:
-                                    if firstvertex:
-                                        firstvertex = False
-                                    else:
-                                        fout.write(',')
-                                    fout.write('{0}'.format(vertex + 1))
-                                fout.write(')')
-
-                        fout.write('];;\n')
-                        fout.write('g:=Group(z);')
+                write_gap(foutname, N, generators)
+                progress.finish('gaut2gap', file[:-5])
     
     return
 
@@ -1,20 +1,32 @@
 import numpy as np
-import ast
 from pathlib import Path
 import math
-import time
 
 import os
 import re
 import networkx as nx
 
-import pandas as pd
 from gappy import gap
 
 import subprocess
 import glob
 
-import json
+from . import config
+from . import archive
+from . import tracing
+from . import progress
+from .gap_pool import GapPool
+from . import skip_ledger
+from . import manifest
+from . import results_store
+from . import orbits
+from . import permutations
+from . import approx_rho
+from . import rho_engines
+from . import generator_reduction
+from . import edge_orbits
+from . import quotient
+from . import equitable
 
 current_file_path   = os.path.abspath(__file__)
 base_path = os.path.join(current_file_path, '..','..')
@@ -22,13 +34,24 @@ base_path = os.path.normpath(base_path)
 
 lumpsout_path = os.path.join(base_path,'data','interim','batch_lumping_output')
 
-# Set GAP options with increased memory (e.g., GB)
-# gap.eval('SetUserPref("GAP_MEM_LIMIT", 4000000000);')  # 4GB
+# Checkpoint manifest recording per-network stage status (see manifest.py)
+manifest_path = os.path.join(lumpsout_path,'manifest.sqlite')
+
+# Consolidated results store with one row per network (see results_store.py)
+store_path = os.path.join(lumpsout_path,'results.sqlite')
+
+# Folder of array-encoded orbit partitions (see orbits.py)
+orbits_path = os.path.join(lumpsout_path,'orbits')
+
+# Networks in the .scy format saucy read (see batch_auts.py); edge orbits and equitable partitions use the same labels
+scy_path = os.path.join(base_path,'data','external','1_network_data','networkrepository')
+
+# GAP memory is capped per worker process by the pool in gap_pool.py (see config.GAP_MEM_LIMIT)
 
 def read_am(aut_filename):
     #Reads in the automorphism data for a given network from a .gap file.
     aut_in = []
-    with open(aut_filename, 'r') as file: #Open file in read mode
+    with archive.open_text(aut_filename) as file: # Open file (or archive member, see archive.py) in read mode
         for line in file:
                 aut_in.append(line.strip()) # Remove leading/trailing whitespace and add to list
     return  aut_in
@@ -39,6 +62,7 @@ def read_log(log_filename):
         'vertices',
         'edges',
         'up size',
+        'group size',
         'levels',
         'nodes',
         'generators',
@@ -51,7 +75,7 @@ def read_log(log_filename):
     
     extracted_data = {}
 
-    with open(log_filename,'r') as file:
+    with archive.open_text(log_filename) as file:
         for line in file:
             if '=' in line:
                 key, value = line.split('=', 1)
@@ -71,38 +95,23 @@ def aut_processing(aut_in,autstub):
     n_pattern = r'N:=([^;]+);;' # Pattern to extract the number of nodes
     z_pattern = r'z=([^;]+);;' # Pattern to extract automorphism group generators
     
-    nstring = aut_in[0]
-    nstring = nstring.replace('N:=','')
-    nstring = nstring.replace(';;','')
-    network_n = int(ast.literal_eval(nstring)) # Convert nstring to integer
-
-    if network_n >= 100000000: # If network size is too large
-        flag = -1 # Return a flag value
-        return flag
-    else:
-
-        zout = aut_in[1]
+    # Whether and how to count rho for a network of this size is decided by rho_engines, not by a size cut-off
+    zout = aut_in[1]
 
-        if zout.count(';') > 1:
-            zout = zout.replace(';;',';')
-    
-        #zaut = gap.eval(zout)
-        zaut = zout
+    if zout.count(';') > 1:
+        zout = zout.replace(';;',';')
 
-        # Write the automorphism group data to a test file
-        ztestpath = os.path.join(lumpsout_path,'zaut_test',autstub+'.txt')
-        txt_file = open(ztestpath,"a")
-        txt_file.write(zout)
-        txt_file.close()
-        return zaut
+    zaut = zout
+    return zaut
 
 # Order() is order of the group
 # Does Group() results in the same output as GroupWithGenerators()?
 
+@tracing.traced()
 def norbits(zin, N, rho_method):
     #  Calculates the number of orbits in a graph using different methods.
 
-    z = gap.eval(zin)
+    z = gap.eval(generator_reduction.reduce_gap(zin, N, config.MINIMISE_GENERATORS))
     G = gap.eval('zgroup:=GroupWithGenerators(z);')
     
     if rho_method == 'tuple':
@@ -112,11 +121,6 @@ def norbits(zin, N, rho_method):
     elif rho_method == 'polya':
         zorbits = -1
         orbit_count = polya_enum(G, N)
-
-        # If polya_enum returned infinity, handle it safely
-        if math.isinf(orbit_count):
-            print("Polya enumeration returned infinity. Setting orbit count to a default value.")
-            orbit_count = -1  # Use a fallback value for orbit_count if necessary
         zorbits = list(gap.Orbits(G))
 
     zorder = int(gap.Size(G)) # Get the size of the group
@@ -127,12 +131,12 @@ def norbits(zin, N, rho_method):
 def cycle_number(p,n):
     #Calculates the cycle number of a permutation.
     cs = gap.CycleStructurePerm(p) # Get cycle structure of permutation
-    m = gap.NrMovedPoints(p) # Get number of moved points
+    m = int(gap.NrMovedPoints(p)) # Get number of moved points
     cyc_tot = 0
 
     for x in cs:
-        if x is int:
-            tot += x
+        if x: # unbound entries (no cycles of that length) come back empty
+            cyc_tot += int(x)
     return cyc_tot+n-m
 
 def rationals_fix(rational):
@@ -141,13 +145,14 @@ def rationals_fix(rational):
     if '/' in rational:
         num, denom = rational.split('/',1)
         num = num.strip()
-        denom = num.strip()
+        denom = denom.strip()
         quot = int(num)/int(denom)
         return quot
 
     else:
         return float(rational)
 
+@tracing.traced()
 def polya_enum(G, N):
     #Implements polya enumeration of a group to count the number of distinct objects.
     cl = gap.ConjugacyClasses(G)
@@ -158,36 +163,13 @@ def polya_enum(G, N):
         rep = gap.Representative(item)
         cn = cycle_number(rep, N)
         size = gap.Size(item)
-        
-        try:
-            # Safely calculate the increment and handle overflow
-            increment = size * 2**cn
-            if math.isinf(increment):
-                raise OverflowError(f"Overflow in increment calculation: size={size}, cn={cn}")
-            tot += increment
-        except OverflowError as e:
-            print(f"OverflowError: {e}. Skipping this term.")
-            continue
-
-    try:
-        order_g = gap.Order(G)
-
-        # Ensure neither total nor order is infinite
-        gorder = rationals_fix(str(order_g))
-        tot = rationals_fix(str(tot))
+        tot += int(size) * 2**cn
 
-        if math.isinf(tot) or math.isinf(gorder):
-            raise OverflowError("Infinity encountered in total or group order.")
+    order_g = gap.Order(G)
 
-        quot = tot / gorder
-    except ZeroDivisionError:
-        print("Division by zero in Polya enumeration. Returning infinity.")
-        return float('inf')
-    except OverflowError as e:
-        print(f"OverflowError during Polya enumeration: {e}. Returning infinity.")
-        return float('inf')
-
-    return quot
+    # Burnside's sum is divisible by the group order, so the count is exact in integer arithmetic
+    # (and exact integers never overflow, so no term is dropped)
+    return int(tot) // int(order_g)
 
 def delta_gen(log_extract, rho):
     #  Calculates the delta parameter for a network.
@@ -209,26 +191,69 @@ def delta_gen(log_extract, rho):
 
     return delta
 
-def gen_row(stubpath):
+def gap_polya(zin, N):
+    # Exact rho and group order with GAP, used by rho_engines for blocks too large to enumerate natively.
+    gap.eval(zin)
+    G = gap.eval('zgroup:=GroupWithGenerators(z);')
+    return polya_enum(G, N), int(gap.Size(G))
+
+def gen_row(stubpath, exactness=config.LUMPING_EXACTNESS, shard=None):
+    # Lumps one network in a GAP worker, traced as the network's lumping stage (see tracing.py)
+    with tracing.span('lumping', os.path.basename(stubpath)[:-4], category='stage', exactness=exactness):
+        return _gen_row(stubpath, exactness, shard)
+
+def log_path(stubpath):
+    # Saucy log of the network of a .gap path: the shipped saucy archive for .gap files in the shipped archive (see
+    # archive.py), the batch saucy output otherwise
+    rowstub = os.path.basename(stubpath)[:-4]
+    if archive.is_member(stubpath):
+        return os.path.join(archive.shipped_directory('saucy'), rowstub + '.log')
+    return os.path.join(base_path,'data','interim','batch_saucy_output', rowstub + '.log')
+
+def _gen_row(stubpath, exactness, shard):
+    # exactness is 'exact', 'auto' or 'approximate'; rho_engines picks the fastest engine that meets it. A worker of a
+    # multi-node run passes its shard folder, where its own manifest and results store live (see work_queue.py)
     print(stubpath)
     new_row = dict()
     
     rowstub = os.path.basename(stubpath)[:-4]
-        
-    aut_directory = os.path.join(base_path,'data','interim','batch_gap_output')
-    log_directory = os.path.join(base_path,'data','interim','batch_saucy_output')
 
-    aut_filename = os.path.join(aut_directory,rowstub+'.gap')
-    log_filename = os.path.join(log_directory,rowstub+'.log')
+    # The .gap file may be a member of the shipped archive, whose saucy logs then come from the saucy archive
+    aut_filename = os.path.join(os.path.dirname(stubpath),rowstub+'.gap')
+    log_filename = log_path(stubpath)
 
-    if os.path.exists(log_filename):
+    run_manifest_path = os.path.join(shard, 'manifest.sqlite') if shard else manifest_path
+    run_store_path = os.path.join(shard, 'results.sqlite') if shard else store_path
+
+    # Record the start of the stage; it is only marked done once the outputs below have been written
+    conn = manifest.connect(run_manifest_path)
+    in_hash = manifest.input_hash([aut_filename, log_filename])
+    engine_version = config.APPROX_ENGINE if exactness == 'approximate' else config.LUMPING_ENGINE
+    manifest.mark_running(conn, rowstub, 'lumping', in_hash, engine_version)
+
+    if archive.exists(log_filename):
         log_extract = read_log(log_filename)
 
-    if os.path.exists(aut_filename):
-        aut_in = read_am(aut_filename)
-        zaut = aut_processing(aut_in,rowstub)
+    # Saucy reports asymmetric networks directly; they need neither the .gap file nor GAP
+    trivial = archive.exists(log_filename) and log_extract.get('generators') == '0'
 
-        n_orbits, zorder, zorbits = norbits(zaut,int(log_extract['vertices']),'polya')
+    if (archive.exists(aut_filename) or trivial) and archive.exists(log_filename):
+        N = int(log_extract['vertices'])
+        if trivial:
+            generators = []
+            result = rho_engines.trivial_result(N)
+        else:
+            aut_in = read_am(aut_filename)
+            zaut = aut_processing(aut_in,rowstub)
+            generators = permutations.parse_gap_generators(zaut, N)
+            log10_order = approx_rho.log10_group_size(log_extract.get('group size'))
+            result = rho_engines.count_rho(generators, N, exactness, log10_order, gap_count=gap_polya,
+                                           time_budget=config.APPROX_TIME_BUDGET,
+                                           minimise=config.MINIMISE_GENERATORS)
+        ids = permutations.orbit_labels(generators, N)
+        zorbits = orbits.decode(ids)
+        n_orbits = result.rho
+        zorder = result.order if result.order is not None else log_extract.get('group size', -1)
 
         #colours = colour_gen(zorbits)
         new_row = {
@@ -243,19 +268,43 @@ def gen_row(stubpath):
             'orbits'        : str(zorbits),
             'delta'         : delta_gen(log_extract,n_orbits)
             }
+        new_row.update({
+            'log10_rho'      : result.log10_rho,
+            'log10_rho_low'  : result.log10_low,
+            'log10_rho_high' : result.log10_high,
+            'engine_reason'  : result.reason,
+            })
         
-        datpath = os.path.join(lumpsout_path,'rowdat',rowstub+'.json')
-        
-        with open(datpath,'w') as fp:
-            json.dump(new_row,fp)
-
-        colourspath = os.path.join(lumpsout_path,'orbit_colours',rowstub+'.txt')
+        # Edge (and optionally ordered-pair) orbits for edge-based lumped models, from the .scy file saucy read so
+        # that the edges carry the labels of the generators; computed before the row is stored, so a failure leaves
+        # no row behind
+        partition_files = []
+        scy_filename = os.path.join(scy_path,rowstub+'.scy')
+        if os.path.exists(scy_filename):
+            edges = quotient.read_scy(scy_filename)[1]
+            partition_files += edge_orbits.save_edge_orbits(orbits_path, rowstub, generators, edges, N,
+                                                            pairs=config.PAIR_ORBITS)
+
+        # Append the row and the orbit partition to the results store, and save the partition for memory-mapped reads
+        store = results_store.connect(run_store_path)
+        results_store.put_row(store, new_row, ids, engine=result.engine)
+        store.close()
+        partition_files += orbits.save_partition(orbits_path, rowstub, ids)
+
+        manifest.mark_done(conn, rowstub, 'lumping', [run_store_path] + partition_files)
+    else:
+        manifest.mark_failed(conn, rowstub, 'lumping', 'missing .gap or .log input')
 
-        coloursf = open(colourspath,"a")
-        coloursf.write(str(zorbits))
-        coloursf.close()
+    conn.close()
     return new_row
 
+def needs_estimate(conn, rowstub, in_hash):
+    # An estimate is only computed when there is no up-to-date result from either engine.
+    entry = manifest.get_entry(conn, rowstub, 'lumping')
+    if entry is None or entry['status'] != 'done' or entry['input_hash'] != in_hash:
+        return True
+    return entry['engine_version'] not in (config.LUMPING_ENGINE, config.APPROX_ENGINE)
+
 def stub_gen(directory):
     files = []
     stub_pattern = r'.gap'
@@ -268,53 +317,115 @@ def stub_gen(directory):
 
     return sorted(files), len(files)
 
-def main():
-    current_file_path   = os.path.abspath(__file__)
-    base_path = os.path.join(current_file_path, '..','..')
-    base_path = os.path.normpath(base_path)
-
-    lumpsout_path = os.path.join(base_path,'data','interim','batch_lumping_output')
-
-    stubpath = os.path.join(base_path,'data','interim','batch_gap_output','*')
-    stubs = sorted(glob.glob(stubpath))
-
-    # Read skipped networks
+def read_skipped_networks():
+    # Stubs of the networks listed in skipped_networks.txt, which are only given an estimated rho
     skipped_networks_file = os.path.join(base_path, 'skipped_networks.txt')
     if os.path.exists(skipped_networks_file):
         with open(skipped_networks_file, 'r') as f:
-            skipped_networks = set(line.strip() for line in f)
-    else:
-        skipped_networks = set()
-
-    inter_table = []
-    
-    txtbase = os.path.join(base_path,'data','interim','batch_lumping_output','zaut_test')
-    
-    for stub in stubs:
-        rowstub = os.path.basename(stub)[:-4]
-
-        # Skip if in skipped networks
-        if rowstub in skipped_networks:
-            print(f"Skipping network: {rowstub} as listed in skipped_networks.txt.")
-            continue
-
-        txt_file = rowstub + '.txt'
-        txt_path = os.path.join(txtbase, txt_file)
-        if os.path.exists(txt_path):
-            print(f"Skipping file: {txt_path}. '{txt_file}' already exists.")
-        else:
-            rowi = []
-            start_time = time.time()
-            rowi = gen_row(stub)
-            elapsed_time = time.time() - start_time
-
-            if elapsed_time > 120:
-                print(f"{stub} took more than 120s to complete")
-                continue
-            inter_table.append(rowi)
-
-    output_table = pd.DataFrame(inter_table)
-
+            return set(line.strip().replace('.gap', '') for line in f)
+    return set()
+
+def plan_job(conn, store, ledger, skipped_networks, stub, time_budget, mem_budget):
+    """
+    Decides how a network is lumped in this run.
+
+    Parameters:
+    conn (sqlite3.Connection): Checkpoint manifest connection.
+    store (sqlite3.Connection): Results store connection.
+    ledger (dict): Skip ledger (see skip_ledger.py).
+    skipped_networks (set): Stubs listed in skipped_networks.txt.
+    stub (str): Path of the network's .gap file.
+    time_budget (float): Wall-clock budget of an exact job in seconds.
+    mem_budget (int): Memory budget of an exact job in bytes.
+
+    Returns:
+    str or None: 'exact', 'approximate' for an estimate of a skipped network, or None when it is up to date.
+    """
+    rowstub = os.path.basename(stub)[:-4]
+    mode = _plan_job(conn, store, ledger, skipped_networks, stub, rowstub, time_budget, mem_budget)
+    if mode != 'exact':
+        progress.skip('lumping', rowstub)
+    if mode == 'approximate':
+        progress.add('estimate', rowstub)
+    return mode
+
+def _plan_job(conn, store, ledger, skipped_networks, stub, rowstub, time_budget, mem_budget):
+    # The decision of plan_job, without the progress bookkeeping
+    in_hash = manifest.input_hash([stub, log_path(stub)])
+
+    # Skip if in skipped networks
+    if rowstub in skipped_networks:
+        print(f"Skipping network: {rowstub} as listed in skipped_networks.txt.")
+        return 'approximate' if needs_estimate(conn, rowstub, in_hash) else None
+
+    entry = ledger.get(rowstub)
+    if entry and not skip_ledger.should_retry(entry, time_budget, mem_budget, config.LUMPING_ENGINE):
+        print(f"Skipping network: {rowstub} ({entry['reason']} after {entry['elapsed_s']}s, see skip_ledger.json).")
+        return 'approximate' if needs_estimate(conn, rowstub, in_hash) else None
+
+    if manifest.get_entry(conn, rowstub, 'lumping') is None and results_store.get_row(store, rowstub) is not None:
+        # Results written by a run that predates the manifest, recorded under the GAP engine that produced them so
+        # they are recounted by the current engine
+        manifest.mark_running(conn, rowstub, 'lumping', in_hash, 'gap-polya')
+        manifest.mark_done(conn, rowstub, 'lumping', [store_path])
+
+    if manifest.needs_run(conn, rowstub, 'lumping', in_hash, config.LUMPING_ENGINE):
+        return 'exact'
+    print(f"Skipping network: {rowstub}. Lumping is up to date in the manifest.")
+    return None
+
+def record_result(conn, ledger, ledger_path, result, time_budget, mem_budget, estimate=False):
+    """
+    Records the outcome of a lumping job from the GAP pool in the skip ledger and the checkpoint manifest.
+
+    Parameters:
+    conn (sqlite3.Connection): Checkpoint manifest connection.
+    ledger (dict): Skip ledger, updated in place and written to ledger_path.
+    ledger_path (str): Path of skip_ledger.json.
+    result (gap_pool.JobResult): The outcome; its key is the path of the network's .gap file.
+    time_budget (float): Wall-clock budget of an exact job in seconds.
+    mem_budget (int): Memory budget of an exact job in bytes.
+    estimate (bool, optional): True for an approximate job, whose failures are not added to the ledger.
+
+    Returns:
+    bool: True if the job finished.
+    """
+    rowstub = os.path.basename(result.key)[:-4]
+    if result.status != 'done':
+        label = 'estimate ' if estimate else ''
+        print(f"{result.key} {label}{result.status} after {result.elapsed:.1f}s: {result.value}")
+        detail = str(result.value).strip().splitlines()[-1] if result.value else ''
+        if not estimate:
+            ledger[rowstub] = skip_ledger.make_entry(result.status, result.elapsed, result.peak_rss,
+                                                     time_budget, mem_budget, config.LUMPING_ENGINE, detail)
+            skip_ledger.write_ledger(ledger_path, ledger)
+        manifest.mark_failed(conn, rowstub, 'lumping', f"{label}{result.status}: {detail}", result.elapsed)
+        progress.finish('estimate' if estimate else 'lumping', rowstub, ok=False)
+        if not estimate:
+            progress.add('estimate', rowstub)  # networks the exact engine could not finish are estimated next
+        return False
+
+    if not estimate and ledger.pop(rowstub, None) is not None:
+        skip_ledger.write_ledger(ledger_path, ledger)
+    progress.finish('estimate' if estimate else 'lumping', rowstub)
+    return True
+
+def lumping_started(stub):
+    # on_start callback of the GAP pool: marks an exact lumping job as running (see progress.py)
+    progress.start('lumping', os.path.basename(stub)[:-4])
+
+def estimate_started(stub):
+    # on_start callback of the GAP pool: marks an approximate lumping job as running (see progress.py)
+    progress.start('estimate', os.path.basename(stub)[:-4])
+
+def export_results(store):
+    """
+    Exports lumps_out.csv from the results store and lumps every network saucy read by its coarsest equitable
+    partition.
+
+    Parameters:
+    store (sqlite3.Connection): Results store connection.
+    """
     out_colnames = [
         'graph_name',
         'n_nodes',
@@ -325,12 +436,99 @@ def main():
         'tot_support',
         'delta']
         #'colours']
-        
-    output_table = pd.DataFrame(inter_table)
-    output_table = output_table.drop(index=output_table.index[0], axis=0)
+
+    # The results store is the source of truth; lumps_out.csv is exported from it for external use
+    output_table = results_store.read_table(store, out_colnames)
     tablepath = os.path.join(lumpsout_path,'lumps_out.csv')
     
     output_table.to_csv(tablepath,index=False)
+
+    # Coarsest equitable partitions need no automorphisms, so every network saucy read gets one; its node labels are
+    # those of the automorphism partitions in orbits_path, so the two can be compared
+    if config.EQUITABLE_LUMPING:
+        scy_files = sorted(glob.glob(os.path.join(scy_path,'*.scy')))
+        equitable.run(scy_files, os.path.join(lumpsout_path,'equitable.sqlite'), orbits_path)
+    return
+
+def main(archives=False):
+    """
+    Lumps every network of the batch and stores the results.
+
+    Parameters:
+    archives (bool): Read the .gap files and saucy logs straight from the shipped zip archives (see archive.py)
+        instead of the batch output folders.
+    """
+    current_file_path   = os.path.abspath(__file__)
+    base_path = os.path.join(current_file_path, '..','..')
+    base_path = os.path.normpath(base_path)
+
+    lumpsout_path = os.path.join(base_path,'data','interim','batch_lumping_output')
+
+    if archives:
+        # Nothing from the batch has to exist beforehand: the output folder may be missing in a fresh checkout
+        os.makedirs(lumpsout_path, exist_ok=True)
+        gap_directory = archive.shipped_directory('gap')
+        log_directory = archive.shipped_directory('saucy')
+        stubs = archive.list_files(gap_directory, '.gap')
+    else:
+        gap_directory = os.path.join(base_path,'data','interim','batch_gap_output')
+        log_directory = os.path.join(base_path,'data','interim','batch_saucy_output')
+        stubs = sorted(glob.glob(os.path.join(gap_directory,'*')))
+
+    skipped_networks = read_skipped_networks()
+
+    # Networks that previously blew their budget are skipped until the budget is raised or the engine changes
+    ledger_path = os.path.join(lumpsout_path, 'skip_ledger.json')
+    ledger = skip_ledger.read_ledger(ledger_path)
+    time_budget = config.LUMPING_TIME_BUDGET
+    mem_budget = config.GAP_MEM_LIMIT
+
+    # Bring results from runs that predate the results store into it
+    store = results_store.connect(store_path)
+    rowdat_dir = os.path.join(lumpsout_path, 'rowdat')
+    if os.path.isdir(rowdat_dir):
+        results_store.import_legacy(store, rowdat_dir)
+
+    n_lumped = 0
+
+    # Resume from the checkpoint manifest: only networks that are new, failed, interrupted or stale are run
+    conn = manifest.connect(manifest_path)
+
+    # Asymmetric networks whose .gap file was never written are lumped from their saucy log alone (see gen_row)
+    for log_filename in archive.list_files(log_directory, '.log'):
+        rowstub = os.path.basename(log_filename)[:-4]
+        aut_filename = os.path.join(gap_directory, rowstub + '.gap')
+        if not archive.exists(aut_filename) and read_log(log_filename).get('generators') == '0':
+            stubs.append(aut_filename)
+
+    jobs = []
+    approx_jobs = []  # networks the exact engine cannot handle, given an estimated rho instead
+    for stub in stubs:
+        mode = plan_job(conn, store, ledger, skipped_networks, stub, time_budget, mem_budget)
+        if mode == 'exact':
+            jobs.append((stub, (stub,)))
+        elif mode == 'approximate':
+            approx_jobs.append((stub, (stub, 'approximate')))
+
+    # Run gen_row for each network on a pool of isolated GAP workers, each job under a time and memory budget
+    with GapPool(mem_limit=mem_budget) as pool:
+        for result in pool.imap(gen_row, jobs, time_limit=time_budget, on_start=lumping_started):
+            if record_result(conn, ledger, ledger_path, result, time_budget, mem_budget):
+                n_lumped += 1
+            else:
+                approx_jobs.append((result.key, (result.key, 'approximate')))
+
+        # Estimate rho for the networks the exact engine skipped or could not finish
+        n_estimated = 0
+        for result in pool.imap(gen_row, approx_jobs, time_limit=2 * config.APPROX_TIME_BUDGET,
+                                on_start=estimate_started):
+            if record_result(conn, ledger, ledger_path, result, time_budget, mem_budget, estimate=True):
+                n_estimated += 1
+    conn.close()
+    print(f"Lumped {n_lumped} networks and estimated rho for {n_estimated} in this run.")
+
+    export_results(store)
+    store.close()
     return
 
 if __name__ == '__batch_run__':
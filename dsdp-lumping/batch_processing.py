@@ -5,6 +5,8 @@ import glob
 
 import networkx as nx
 
+from . import tracing
+
 def read_in(input_dir):
 # Reads in a filename and returns a nested list.
     lines = []
@@ -91,6 +93,7 @@ def rm_duplicates(df):
     
     return df
 
+@tracing.traced()
 def scy_formatting(G_in,edgelist_df,write_path):
 #    Output file with edges in .scy format
     n_nodes = len(G_in.nodes()) # Get the number of nodes in the graph
@@ -0,0 +1,473 @@
+'''
+Scaling benchmarks for the pipeline stages.
+
+Graphs are generated locally from parametrised families with known automorphism groups:
+
+- star(n): one centre and n leaves, acted on by S_n;
+- bipartite(a, b): the complete bipartite graph K_{a,b}, acted on by S_a x S_b (and the swap of the sides if a = b);
+- twin_tree(r, h): the balanced r-ary tree of height h, whose sibling leaves are twins; every set of sibling subtrees is
+  permuted by S_r;
+- johnson(n, k): the Johnson graph J(n, k) on the k-subsets of n points, as in the johnson8-* inputs, acted on by S_n
+  (and complementation if n = 2k);
+- regular(d, n): a random d-regular graph, almost surely asymmetric;
+- union(m, c): c disjoint copies of star(m), acted on by S_m in every copy and S_c on the copies.
+
+Every case is run through each stage in turn: canonicalise (edge_orbits.canonical_edges on a shuffled, doubled edge
+list), scy_write, saucy (when the binary runs here; otherwise the known generators are used), gaut_parse, orbits,
+group_order (Schreier-Sims, see generator_reduction.py) and rho (rho_engines.count_rho without GAP). A stage is timed
+as the best of several repeats and its peak Python memory is measured with tracemalloc in one more run (saucy reports
+the peak resident memory of its processes instead).
+
+Runs are appended to reports/benchmarks/history.json. The first run, or any run made with --update-baseline, is stored
+as reports/benchmarks/baseline.json, and every stage slower than the baseline by more than config.BENCH_THRESHOLD is
+flagged as a regression. Stages faster than MIN_SECONDS are too noisy to compare and are never flagged.
+'''
+
+import os
+import json
+import time
+import socket
+import tempfile
+import itertools
+import subprocess
+import tracemalloc
+from pathlib import Path
+from collections import namedtuple
+
+import numpy as np
+import networkx as nx
+
+try:
+    import resource
+except ImportError:  # resource is POSIX only; saucy memory is then not recorded
+    resource = None
+
+from . import config
+from . import pipeline
+from . import permutations
+from . import edge_orbits
+from . import rho_engines
+from . import generator_reduction
+
+# Get the current file path and set the base path for data processing
+CURRENT_FILE_PATH = Path(__file__).resolve()
+BASE_PATH = CURRENT_FILE_PATH.parents[1]
+
+bench_path = BASE_PATH / 'reports' / 'benchmarks'
+history_path = bench_path / 'history.json'
+baseline_path = bench_path / 'baseline.json'
+
+STAGES = ['canonicalise', 'scy_write', 'saucy', 'gaut_parse', 'orbits', 'group_order', 'rho']
+
+# Stages whose throughput is counted in edges per second; the others count nodes per second
+EDGE_STAGES = {'canonicalise', 'scy_write', 'saucy'}
+
+# Stages faster than this many seconds are not compared against the baseline
+MIN_SECONDS = 0.005
+
+# Seconds allowed for sampled rho in a benchmark case
+RHO_TIME_BUDGET = 1.0
+
+# Seconds allowed for the trial run that checks saucy works
+SAUCY_PROBE_TIMEOUT = 10
+
+# A generated graph: its case name, node count, edges and a generating set of its automorphism group
+Case = namedtuple('Case', ['name', 'N', 'edges', 'generators'])
+
+# A stage slower than its baseline by more than the threshold
+Regression = namedtuple('Regression', ['case', 'stage', 'seconds', 'baseline_seconds', 'ratio'])
+
+
+def _symmetric_group(points, N):
+    # Generators of the symmetric group on points: a transposition and a full cycle.
+    if len(points) < 2:
+        return []
+    return [permutations.from_cycles([points[:2]], N), permutations.from_cycles([points], N)]
+
+
+def star(n):
+    """
+    Generates a star with n leaves.
+
+    Parameters:
+    n (int): Number of leaves.
+
+    Returns:
+    Case: Node 0 is the centre.
+    """
+    edges = np.stack([np.zeros(n, dtype=np.int64), np.arange(1, n + 1)], axis=1)
+    return Case(f"star-n{n}", n + 1, edges, _symmetric_group(list(range(1, n + 1)), n + 1))
+
+
+def bipartite(a, b):
+    """
+    Generates the complete bipartite graph K_{a,b}.
+
+    Parameters:
+    a (int): Size of the first side.
+    b (int): Size of the second side.
+
+    Returns:
+    Case: Nodes 0..a-1 form the first side.
+    """
+    N = a + b
+    edges = np.array([(u, v) for u in range(a) for v in range(a, N)], dtype=np.int64).reshape(-1, 2)
+    generators = _symmetric_group(list(range(a)), N) + _symmetric_group(list(range(a, N)), N)
+    if a == b:
+        generators.append(permutations.from_cycles([[u, u + a] for u in range(a)], N))
+    return Case(f"bipartite-{a}x{b}", N, edges, generators)
+
+
+def twin_tree(r, h):
+    """
+    Generates the balanced r-ary tree of height h.
+
+    Parameters:
+    r (int): Number of children of every internal node.
+    h (int): Height of the tree.
+
+    Returns:
+    Case: Nodes are numbered breadth first, so the children of node v are r*v+1, ..., r*v+r.
+    """
+    G = nx.balanced_tree(r, h)
+    N = G.number_of_nodes()
+    edges = np.array(G.edges(), dtype=np.int64).reshape(-1, 2)
+
+    def subtree_map(source, target):
+        # Map the subtree under source onto the subtree under target, node by node.
+        mapping, frontier = {}, [(source, target)]
+        while frontier:
+            u, v = frontier.pop()
+            mapping[u] = v
+            frontier += [(r * u + 1 + k, r * v + 1 + k) for k in range(r) if r * u + 1 + k < N]
+        return mapping
+
+    generators = []
+    for v in range(N):
+        children = [r * v + 1 + k for k in range(r) if r * v + 1 + k < N]
+        if len(children) < 2:
+            continue
+        for images in ([children[1], children[0]], children[1:] + children[:1]):
+            p = permutations.identity(N)
+            for source, target in zip(children, images):
+                for u, w in subtree_map(source, target).items():
+                    p[u] = w
+            generators.append(p)
+    return Case(f"twin_tree-r{r}h{h}", N, edges, generators)
+
+
+def johnson(n, k):
+    """
+    Generates the Johnson graph J(n, k): k-subsets of n points, adjacent when they share k-1 points.
+
+    Parameters:
+    n (int): Number of points.
+    k (int): Subset size.
+
+    Returns:
+    Case: Nodes are the k-subsets in lexicographic order.
+    """
+    subsets = list(itertools.combinations(range(n), k))
+    index = {subset: i for i, subset in enumerate(subsets)}
+    N = len(subsets)
+    edges = []
+    for i, subset in enumerate(subsets):
+        members = set(subset)
+        for out in subset:
+            for new in range(n):
+                if new not in members:
+                    j = index[tuple(sorted(members - {out} | {new}))]
+                    if i < j:
+                        edges.append((i, j))
+    edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+
+    def induced(point_map):
+        return np.array([index[tuple(sorted(point_map[x] for x in subset))] for subset in subsets], dtype=np.int64)
+
+    generators = [induced({0: 1, 1: 0, **{x: x for x in range(2, n)}}), induced({x: (x + 1) % n for x in range(n)})]
+    if n == 2 * k:
+        generators.append(np.array([index[tuple(sorted(set(range(n)) - set(subset)))] for subset in subsets],
+                                   dtype=np.int64))
+    return Case(f"johnson-{n}-{k}", N, edges, generators)
+
+
+def regular(d, n, seed=0):
+    """
+    Generates a random d-regular graph.
+
+    Parameters:
+    d (int): Degree.
+    n (int): Number of nodes.
+    seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+    Case: The graph, with an empty generating set (random regular graphs are almost surely asymmetric).
+    """
+    G = nx.random_regular_graph(d, n, seed=seed)
+    return Case(f"regular-d{d}n{n}", n, np.array(G.edges(), dtype=np.int64).reshape(-1, 2), [])
+
+
+def union(m, c):
+    """
+    Generates c disjoint copies of a star with m leaves.
+
+    Parameters:
+    m (int): Leaves of each star.
+    c (int): Number of copies.
+
+    Returns:
+    Case: Copy i uses nodes i*(m+1), ..., i*(m+1)+m, with its centre first.
+    """
+    part = star(m)
+    size = part.N
+    N = size * c
+    edges = np.concatenate([part.edges + i * size for i in range(c)])
+    # S_m on the leaves of the first copy, and S_c on the copies, which carries it to every other copy
+    generators = _symmetric_group(list(range(1, size)), N)
+    if c > 1:
+        generators += [permutations.from_cycles([[i * size + x for i in copies] for x in range(size)], N)
+                       for copies in ([0, 1], list(range(c)))]
+    return Case(f"union-m{m}c{c}", N, edges, generators)
+
+
+def cases(quick=False):
+    """
+    Returns the benchmark cases. Sizes are bounded by the group_order stage: Schreier-Sims grows steeply with the
+    size of the symmetric groups involved (rho stays within RHO_TIME_BUDGET), so only the asymmetric random regular
+    graphs reach 10^4 nodes.
+
+    Parameters:
+    quick (bool, optional): Only the smallest size of every family, e.g. for a smoke test. Defaults to False.
+
+    Returns:
+    list: Case tuples, smallest first within each family.
+    """
+    families = [
+        (star, [(8,), (16,), (24,)]),
+        (bipartite, [(4, 6), (8, 12), (10, 10)]),
+        (twin_tree, [(2, 3), (2, 4), (2, 6)]),
+        (johnson, [(8, 2), (8, 4), (12, 3)]),
+        (regular, [(3, 100), (3, 1000), (4, 10000)]),
+        (union, [(3, 4), (4, 8), (5, 12)]),
+        ]
+    return [family(*params) for family, sizes in families for params in (sizes[:1] if quick else sizes)]
+
+
+def gaut_text(generators):
+    """
+    Formats generators as saucy prints them, one per line in 0-indexed cycle notation.
+
+    Parameters:
+    generators (list): Permutation arrays.
+
+    Returns:
+    str: The .gaut text.
+    """
+    return ''.join(''.join('(' + ' '.join(map(str, cycle)) + ')' for cycle in permutations.cycles(g)) + '\n'
+                   for g in generators)
+
+
+def _measure(func, repeats):
+    # Best wall time over the repeats, then the tracemalloc peak of one more run; returns (seconds, peak bytes, value).
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak, value
+
+
+def saucy_runs():
+    """
+    Checks that saucy runs here by trying it on a single edge. The shipped binary may be built for another platform
+    (e.g. a Mach-O binary on Linux), so the path existing is not enough.
+
+    Returns:
+    bool: True if saucy ran successfully.
+    """
+    try:
+        pipeline.run_saucy(pipeline.scy_text(np.array([[0, 1]]), 2), timeout=SAUCY_PROBE_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return True
+
+
+def run_case(case, repeats=3, saucy=None):
+    """
+    Runs every stage on a benchmark case.
+
+    Parameters:
+    case (Case): The case.
+    repeats (int, optional): Timed runs per stage; the best is kept. Defaults to 3.
+    saucy (bool, optional): Run saucy. Defaults to whether it runs here (see saucy_runs).
+
+    Returns:
+    dict: Stage -> {'seconds', 'throughput', 'unit', 'peak_mb'}; skipped stages are left out.
+    """
+    saucy = saucy_runs() if saucy is None else saucy
+    rng = np.random.default_rng(0)
+    raw = np.concatenate([case.edges, case.edges[:, ::-1]])[rng.permutation(2 * len(case.edges))]
+    M = len(case.edges)
+    results = {}
+
+    def record(stage, seconds, peak):
+        count = M if stage in EDGE_STAGES else case.N
+        results[stage] = {'seconds': seconds, 'throughput': count / seconds if seconds > 0 else None,
+                          'unit': 'edges/s' if stage in EDGE_STAGES else 'nodes/s',
+                          'peak_mb': None if peak is None else peak / 2**20}
+
+    seconds, peak, edges = _measure(lambda: edge_orbits.canonical_edges(raw, case.N), repeats)
+    record('canonicalise', seconds, peak)
+
+    with tempfile.TemporaryDirectory() as folder:
+        scy_path = os.path.join(folder, case.name + '.scy')
+
+        def write_scy():
+            with open(scy_path, 'w') as f:
+                f.write(pipeline.scy_text(edges, case.N))
+        seconds, peak, _ = _measure(write_scy, repeats)
+        record('scy_write', seconds, peak)
+
+    text = gaut_text(case.generators)
+    if saucy:
+        scy = pipeline.scy_text(edges, case.N)
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            text = pipeline.run_saucy(scy)[0]
+            best = min(best, time.perf_counter() - start)
+        # Peak resident memory of the largest child process so far (kilobytes on Linux)
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024 if resource is not None else None
+        record('saucy', best, peak)
+
+    seconds, peak, generators = _measure(lambda: permutations.parse_gaut(text, case.N), repeats)
+    record('gaut_parse', seconds, peak)
+
+    seconds, peak, _ = _measure(lambda: permutations.orbit_labels(generators, case.N), repeats)
+    record('orbits', seconds, peak)
+
+    seconds, peak, order = _measure(
+        lambda: generator_reduction.group_order(generator_reduction.schreier_sims(generators, case.N)), repeats)
+    record('group_order', seconds, peak)
+
+    seconds, peak, rho = _measure(lambda: rho_engines.count_rho(generators, case.N, 'auto',
+                                                                time_budget=RHO_TIME_BUDGET), 1)
+    record('rho', seconds, peak)
+    results['rho']['engine'] = rho.engine
+    results['group_order']['order_digits'] = len(str(order))
+    return results
+
+
+def _commit():
+    # Current git commit of the repository, if it can be read.
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=str(BASE_PATH), stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick=False, repeats=3):
+    """
+    Runs the benchmark suite.
+
+    Parameters:
+    quick (bool, optional): Only the smallest size of every family. Defaults to False.
+    repeats (int, optional): Timed runs per stage. Defaults to 3.
+
+    Returns:
+    dict: The run: time, host, commit, whether saucy ran, and case -> stage -> measurements.
+    """
+    saucy = saucy_runs()
+    if not saucy:
+        print(f"saucy does not run here ({config.SAUCY_PATH}): using the known generators of every case.")
+    results = {}
+    for case in cases(quick):
+        results[case.name] = run_case(case, repeats, saucy)
+        timings = ', '.join(f"{stage} {values['seconds'] * 1e3:.1f}ms" for stage, values in results[case.name].items())
+        print(f"{case.name} (N={case.N}, M={len(case.edges)}): {timings}")
+    return {'time': time.time(), 'host': socket.gethostname(), 'commit': _commit(), 'saucy': saucy,
+            'quick': quick, 'results': results}
+
+
+def compare(current, baseline, threshold=None):
+    """
+    Finds the stages of a run that are slower than in the baseline.
+
+    Parameters:
+    current (dict): A run from run.
+    baseline (dict): The baseline run.
+    threshold (float, optional): Allowed relative slowdown, e.g. 0.25 for 25%. Defaults to config.BENCH_THRESHOLD.
+
+    Returns:
+    list: Regression tuples, worst first.
+    """
+    threshold = config.BENCH_THRESHOLD if threshold is None else threshold
+    regressions = []
+    for case, stages in current['results'].items():
+        for stage, values in stages.items():
+            base = baseline['results'].get(case, {}).get(stage)
+            if base is None or max(values['seconds'], base['seconds']) < MIN_SECONDS:
+                continue
+            ratio = values['seconds'] / base['seconds'] if base['seconds'] > 0 else float('inf')
+            if ratio > 1 + threshold:
+                regressions.append(Regression(case, stage, values['seconds'], base['seconds'], ratio))
+    return sorted(regressions, key=lambda regression: -regression.ratio)
+
+
+def _read_json(path, default):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return default
+
+
+def _write_json(path, data):
+    # Write under a temporary name and move into place, so an interrupted run never truncates the history.
+    os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+    tmp_path = str(path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, str(path))
+    return
+
+
+def main(quick=False, update_baseline=False, threshold=None):
+    """
+    Runs the benchmark suite, appends the run to the history and flags regressions against the baseline.
+
+    Parameters:
+    quick (bool, optional): Only the smallest size of every family. Defaults to False.
+    update_baseline (bool, optional): Store this run as the new baseline. Defaults to False.
+    threshold (float, optional): Allowed relative slowdown. Defaults to config.BENCH_THRESHOLD.
+
+    Returns:
+    list: Regression tuples; empty when every stage is within the threshold.
+    """
+    current = run(quick)
+    history = _read_json(history_path, [])
+    history.append(current)
+    _write_json(history_path, history)
+
+    baseline = _read_json(baseline_path, None)
+    regressions = [] if baseline is None else compare(current, baseline, threshold)
+    if baseline is None or update_baseline:
+        _write_json(baseline_path, current)
+        print(f"Baseline written to {baseline_path}")
+    for regression in regressions:
+        print(f"REGRESSION {regression.case} {regression.stage}: {regression.seconds * 1e3:.1f}ms against "
+              f"{regression.baseline_seconds * 1e3:.1f}ms ({regression.ratio:.2f}x)")
+    if baseline is not None and not regressions:
+        print("No regressions against the baseline.")
+    return regressions
+
+
+if __name__ == "__main__":
+    main()
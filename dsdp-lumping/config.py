@@ -0,0 +1,82 @@
+'''
+Shared settings for the batch pipeline.
+
+Values can be overridden with environment variables so long runs on shared servers can be tuned without editing code.
+'''
+
+import os
+
+# Number of isolated GAP worker processes used by batch_lumping (defaults to one per core)
+GAP_WORKERS = int(os.environ.get('DSDP_GAP_WORKERS', os.cpu_count() or 1))
+
+# Memory ceiling for a single GAP worker in bytes, i.e. the memory budget of one lumping job; a worker growing past it
+# is killed and restarted (0 disables)
+GAP_MEM_LIMIT = int(os.environ.get('DSDP_GAP_MEM_LIMIT', 4000000000))  # 4GB
+
+# Recycle a worker after it has completed this many jobs
+GAP_MAX_JOBS_PER_WORKER = int(os.environ.get('DSDP_GAP_MAX_JOBS', 50))
+
+# Recycle a worker between jobs once its resident memory has grown past this many bytes
+GAP_RECYCLE_RSS = int(os.environ.get('DSDP_GAP_RECYCLE_RSS', 2000000000))  # 2GB
+
+# Wall-clock budget for lumping a single network in seconds; the job is killed once it is exceeded (0 disables)
+LUMPING_TIME_BUDGET = float(os.environ.get('DSDP_TIME_BUDGET', 120))
+
+# Name of the engine computing rho; networks that blew their budget are retried when this changes
+LUMPING_ENGINE = 'adaptive'
+
+# How exact rho must be: 'exact' (native enumeration or GAP), 'auto' (GAP only for moderate group orders, sampling
+# beyond) or 'approximate' (never GAP); see rho_engines.py
+LUMPING_EXACTNESS = os.environ.get('DSDP_EXACTNESS', 'auto')
+
+# Engine used for networks that are skipped or blow the exact engine's budget: rho is estimated from random group
+# elements (see approx_rho.py) within its own time budget in seconds
+APPROX_ENGINE = 'sample-burnside'
+APPROX_TIME_BUDGET = float(os.environ.get('DSDP_APPROX_TIME_BUDGET', 30))
+
+# Minimise the generating set of every block handed to GAP or sampling with a native Schreier-Sims pass, on top of
+# dropping duplicates and merging disjoint pieces (see generator_reduction.py); set DSDP_MINIMISE_GENERATORS=0 to skip
+MINIMISE_GENERATORS = os.environ.get('DSDP_MINIMISE_GENERATORS', '1') != '0'
+
+# Also partition the ordered node pairs of networks with at most edge_orbits.MAX_PAIR_NODES nodes, for
+# pair-approximation models; edge orbits are saved next to the vertex orbits of every network whose .scy file is at hand
+PAIR_ORBITS = os.environ.get('DSDP_PAIR_ORBITS', '0') != '0'
+
+# Also lump every network by its coarsest equitable partition (see equitable.py), which needs neither saucy nor GAP
+EQUITABLE_LUMPING = os.environ.get('DSDP_EQUITABLE_LUMPING', '1') != '0'
+
+# Snapshot mode for temporal networks (see temporal.py): window length and distance between window starts, in the
+# units of the timestamps column; a window of 0 disables snapshots and the step defaults to the window
+TEMPORAL_WINDOW = float(os.environ.get('DSDP_TEMPORAL_WINDOW', 0))
+TEMPORAL_STEP = float(os.environ.get('DSDP_TEMPORAL_STEP', 0)) or None
+
+# Path to the saucy binary, relative to the directory the pipeline is run from
+SAUCY_PATH = os.environ.get('DSDP_SAUCY', 'saucy-3.0/saucy')
+
+# Stream every network of the batch through saucy, gaut2gap and lumping on its own (see orchestrator.py) instead of
+# running each stage on all networks in turn; set DSDP_OVERLAP_BATCH=0 to run the stages in phases
+OVERLAP_BATCH = os.environ.get('DSDP_OVERLAP_BATCH', '1') != '0'
+
+# Concurrency limits of the overlapped batch: saucy subprocesses and .gaut to .gap conversion processes (lumping uses
+# GAP_WORKERS)
+SAUCY_WORKERS = int(os.environ.get('DSDP_SAUCY_WORKERS', os.cpu_count() or 1))
+CONVERT_WORKERS = int(os.environ.get('DSDP_CONVERT_WORKERS', 2))
+
+# Multi-node batch runs (see work_queue.py): seconds after which the lease of a worker that stopped sending heartbeats
+# expires and its network can be claimed by another worker, and the queue folder on the shared filesystem (defaults to
+# data/interim/work_queue)
+LEASE_TTL = float(os.environ.get('DSDP_LEASE_TTL', 300))
+QUEUE_DIR = os.environ.get('DSDP_QUEUE_DIR')
+
+# Folder for pipeline traces (see tracing.py): when set, every stage and hot function records its wall and CPU time,
+# memory and child-process usage there, exported as a Chrome trace and a per-network summary; unset disables tracing
+TRACE_DIR = os.environ.get('DSDP_TRACE')
+
+# Relative slowdown of a benchmark stage against the stored baseline that is flagged as a regression (see benchmark.py)
+BENCH_THRESHOLD = float(os.environ.get('DSDP_BENCH_THRESHOLD', 0.25))
+
+# Status file of batch runs (see progress.py); defaults to data/interim/batch_progress.json
+PROGRESS_FILE = os.environ.get('DSDP_PROGRESS_FILE')
+
+# Local port serving the batch status as JSON while a batch runs; 0 disables it
+PROGRESS_PORT = int(os.environ.get('DSDP_PROGRESS_PORT', 0))
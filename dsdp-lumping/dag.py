@@ -0,0 +1,205 @@
+'''
+Make-like runner for the stages of the user pipeline.
+
+Each stage declares, per network, the files it reads and the files it writes, and the source files whose code it runs.
+The checkpoint manifest (see manifest.py) records for every (network, stage) the hash of the inputs and the code
+version that produced the outputs; input files are hashed through the file manifest (see hashing.py), so unchanged
+files are only stat'ed. On a rerun a stage only runs for a network when
+
+- it has never finished, or its inputs or code changed since it last did,
+- one of its outputs is missing, or
+- it is forced with --force <stage>, or lies at or after --from <stage>.
+
+Stages run in order, so a stage whose upstream outputs changed sees a new input hash and reruns, while a stage whose
+inputs came out byte-identical is skipped. Outputs of a stage are deleted before it runs, so stages that append to
+their outputs (processing writes .scy in append mode) start clean without clearing whole folders.
+'''
+
+import os
+import hashlib
+import importlib
+import time
+from pathlib import Path
+from collections import namedtuple
+
+from . import config
+from . import manifest
+from . import hashing
+from . import tracing
+
+# Get the current file path and set the base path for data processing
+CURRENT_FILE_PATH = Path(__file__).resolve()
+PACKAGE_PATH = CURRENT_FILE_PATH.parent
+BASE_PATH = CURRENT_FILE_PATH.parents[1]
+
+DATA_DIR = BASE_PATH / 'data' / 'external' / '5_user_data'
+PROCESSED = BASE_PATH / 'data' / 'processed'
+manifest_path = PROCESSED / 'pipeline_manifest.sqlite'
+file_manifest_path = PROCESSED / 'file_manifest.sqlite'
+
+# A pipeline stage: run(network) does the work; inputs(network) and outputs(network) list file paths; code lists the
+# modules (and settings) whose change makes the stage stale
+Stage = namedtuple('Stage', ['name', 'run', 'inputs', 'outputs', 'code'])
+
+
+def code_version(stage):
+    """
+    Hashes the code a stage runs.
+
+    Parameters:
+    stage (Stage): The stage; '.py' entries of stage.code are read from the package, others are hashed as text.
+
+    Returns:
+    str: A short hexadecimal digest.
+    """
+    hash_obj = hashlib.sha256()
+    for item in stage.code:
+        hash_obj.update(item.encode())
+        if item.endswith('.py'):
+            hash_obj.update((PACKAGE_PATH / item).read_bytes())
+    return hash_obj.hexdigest()[:16]
+
+
+def downstream(stages, start):
+    """
+    Returns the names of a stage and every stage after it.
+
+    Parameters:
+    stages (list): Stages in run order.
+    start (str): Name of the first stage.
+
+    Returns:
+    list: Stage names from start onwards.
+    """
+    names = [stage.name for stage in stages]
+    if start not in names:
+        raise ValueError(f"Unknown stage '{start}', expected one of {names}.")
+    return names[names.index(start):]
+
+
+def run(stages, networks, db_path=manifest_path, force=(), start=None):
+    """
+    Runs the stale stages of every network.
+
+    Parameters:
+    stages (list): Stages in run order.
+    networks (list): Network stubs.
+    db_path (str or Path, optional): Manifest database. Defaults to manifest_path.
+    force (iterable, optional): Names of stages to run regardless of their state.
+    start (str, optional): Name of a stage to force together with every later stage.
+
+    Returns:
+    dict: Network -> list of the stages that ran.
+    """
+    names = [stage.name for stage in stages]
+    forced = set(force) | set(downstream(stages, start) if start else [])
+    unknown = forced - set(names)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}, expected some of {names}.")
+
+    os.makedirs(os.path.dirname(str(db_path)), exist_ok=True)
+    conn = manifest.connect(str(db_path))
+    files = hashing.connect(os.path.join(os.path.dirname(str(db_path)), os.path.basename(str(file_manifest_path))))
+    ran = {}
+    try:
+        for network in networks:
+            ran[network] = []
+            for stage in stages:
+                outputs = [str(path) for path in stage.outputs(network)]
+                in_hash = hashing.input_hash(files, stage.inputs(network))
+                version = code_version(stage)
+                stale = (stage.name in forced or manifest.needs_run(conn, network, stage.name, in_hash, version)
+                         or not all(os.path.exists(path) for path in outputs))
+                if not stale:
+                    print(f"{network}: {stage.name} is up to date")
+                    continue
+
+                print(f"{network}: running {stage.name}")
+                for path in outputs:
+                    if os.path.exists(path):
+                        os.remove(path)
+                manifest.mark_running(conn, network, stage.name, in_hash, version)
+                start_time = time.perf_counter()
+                try:
+                    with tracing.span(stage.name, network, category='stage'):
+                        stage.run(network)
+                except Exception as e:
+                    manifest.mark_failed(conn, network, stage.name, repr(e), time.perf_counter() - start_time)
+                    print(f"{network}: {stage.name} failed ({e!r}); skipping its later stages")
+                    break
+                manifest.mark_done(conn, network, stage.name, [path for path in outputs if os.path.exists(path)])
+                ran[network].append(stage.name)
+    finally:
+        conn.close()
+        files.close()
+    return ran
+
+
+def _main_of(module):
+    # Stage body calling module.main(), imported only when the stage runs (lumping needs GAP).
+    def run_main(network):
+        return importlib.import_module('.' + module, __package__).main()
+    return run_main
+
+
+def user_networks():
+    """
+    Returns the stub of the user network; as in processing.main, the first file in the user data folder is used.
+
+    Returns:
+    list: The network stub, or an empty list if there is no user data.
+    """
+    files = sorted(DATA_DIR.glob('*.*'))
+    return [files[0].stem] if files else []
+
+
+def user_stages():
+    """
+    Declares the stages of the user pipeline.
+
+    Returns:
+    list: Stages in run order.
+    """
+    def user_file(network):
+        return [path for path in DATA_DIR.glob('*.*') if path.stem == network][:1]
+
+    def scy(network):
+        return PROCESSED / 'processing_output' / (network + '.scy')
+
+    def saucy(network, suffix):
+        return PROCESSED / 'saucy_output' / (network + suffix)
+
+    def gap(network):
+        return PROCESSED / 'gap_output' / (network + '.gap')
+
+    def partition(network, kind=''):
+        return [PROCESSED / 'lumping_output' / 'orbits' / (network + kind + suffix)
+                for suffix in ('.ids.npy', '.members.npy', '.offsets.npy')]
+
+    lumping_code = ['lumping.py', 'rho_engines.py', 'permutations.py', 'generator_reduction.py', 'approx_rho.py',
+                    'orbits.py', 'edge_orbits.py', config.LUMPING_ENGINE, config.LUMPING_EXACTNESS,
+                    f"pairs={config.PAIR_ORBITS}"]
+    stages = [
+        Stage('processing', _main_of('processing'), user_file, lambda n: [scy(n)], ['processing.py']),
+        Stage('saucy', _main_of('auts'), lambda n: [scy(n)], lambda n: [saucy(n, '.gaut'), saucy(n, '.log')],
+              ['auts.py', config.SAUCY_PATH]),
+        Stage('gaut2gap', _main_of('gaut2gap'), lambda n: [saucy(n, '.gaut'), saucy(n, '.log')], lambda n: [gap(n)],
+              ['gaut2gap.py']),
+        Stage('lumping', _main_of('lumping'), lambda n: [gap(n), saucy(n, '.log'), scy(n)], partition, lumping_code),
+        ]
+    if config.EQUITABLE_LUMPING:
+        stages.append(Stage('equitable', _main_of('equitable'), lambda n: [scy(n)],
+                            lambda n: partition(n, '.equitable'),
+                            ['equitable.py', 'quotient.py']))
+    if config.TEMPORAL_WINDOW > 0:
+        stages.append(Stage('temporal', _main_of('temporal'), user_file, lambda n: [],
+                            ['temporal.py', 'rho_engines.py', str(config.TEMPORAL_WINDOW), str(config.TEMPORAL_STEP)]))
+    stages += [
+        Stage('quotient', _main_of('quotient'), lambda n: [gap(n), scy(n)] + partition(n),
+              lambda n: [PROCESSED / 'lumping_output' / 'quotient' / (n + '.quotient_edges.npz'),
+                         PROCESSED / 'lumping_output' / 'quotient' / (n + '.quotient_neighbours.npz')],
+              ['quotient.py']),
+        Stage('simulate', _main_of('simulate'), lambda n: [gap(n), scy(n)], lambda n: [],
+              ['simulate.py', 'quotient.py']),
+        ]
+    return stages
@@ -0,0 +1,142 @@
+'''
+Orbits of the automorphism group on edges and on ordered pairs of nodes.
+
+Edge-state and pair-approximation models lump over these orbits rather than over vertex orbits. The undirected edges
+of a network are put in a canonical order (each edge as (u, v) with u < v, sorted, duplicates and self-loops removed),
+so an edge is identified by its index in that array. Every generator is mapped onto the edge index array in one
+vectorised lookup, and the orbits are the connected components of the resulting permutations, as for vertex orbits in
+permutations.orbit_labels. Ordered pairs (i, j) are indexed i * N + j; the diagonal pairs (i, i) form copies of the
+vertex orbits.
+
+Partitions use the canonical encoding of orbits.py and are saved next to the vertex orbits with orbits.save_partition,
+under the stubs '<stub>.edge' and '<stub>.pair', together with the canonical edge array '<stub>.edge.index.npy'. Pair
+orbits need N^2 entries, so they are only computed for networks of at most MAX_PAIR_NODES nodes.
+'''
+
+import os
+
+import numpy as np
+
+from . import orbits
+from . import permutations
+
+# Largest network whose N^2 ordered pairs are partitioned (1M int32 ids)
+MAX_PAIR_NODES = 1000
+
+
+def canonical_edges(edges, N):
+    """
+    Puts the undirected edges of a network in canonical order.
+
+    Parameters:
+    edges (np.ndarray): (M, 2) array of 0-indexed edges.
+    N (int): Number of nodes.
+
+    Returns:
+    np.ndarray: int32 (M', 2) array of distinct edges (u, v) with u < v, sorted by u * N + v.
+    """
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    keys = np.unique(edges[:, 0] * N + edges[:, 1])
+    return np.stack([keys // N, keys % N], axis=1).astype(np.int32)
+
+
+def edge_permutation(p, edges, N):
+    """
+    Maps a node permutation onto the canonical edge index array.
+
+    Parameters:
+    p (np.ndarray): Node permutation.
+    edges (np.ndarray): Canonical edges from canonical_edges.
+    N (int): Number of nodes.
+
+    Returns:
+    np.ndarray: Edge permutation e -> index of the image of edge e.
+    """
+    keys = edges[:, 0].astype(np.int64) * N + edges[:, 1]
+    image = np.sort(p[edges], axis=1).astype(np.int64)
+    image_keys = image[:, 0] * N + image[:, 1]
+    index = np.searchsorted(keys, image_keys).clip(max=len(keys) - 1)
+    if len(keys) and not (keys[index] == image_keys).all():
+        raise ValueError("Permutation does not map edges onto edges; it is not an automorphism of the network.")
+    return index
+
+
+def edge_orbit_labels(generators, edges, N):
+    """
+    Computes the orbits of the group on the edges of a network.
+
+    Parameters:
+    generators (list): Permutation arrays generating the automorphism group.
+    edges (np.ndarray): Canonical edges from canonical_edges.
+    N (int): Number of nodes.
+
+    Returns:
+    np.ndarray: Canonical edge -> orbit id array.
+    """
+    return permutations.orbit_labels([edge_permutation(g, edges, N) for g in generators], len(edges))
+
+
+def pair_orbit_labels(generators, N):
+    """
+    Computes the orbits of the group on ordered pairs of nodes.
+
+    Parameters:
+    generators (list): Permutation arrays generating the automorphism group.
+    N (int): Number of nodes (at most MAX_PAIR_NODES).
+
+    Returns:
+    np.ndarray: Canonical pair -> orbit id array of length N^2, pair (i, j) at index i * N + j.
+    """
+    if N > MAX_PAIR_NODES:
+        raise ValueError(f"{N} nodes give too many ordered pairs to partition (limit {MAX_PAIR_NODES}).")
+    # (i, j) -> (p[i], p[j]) as an index permutation
+    pair_generators = [(g.astype(np.int64)[:, None] * N + g[None, :]).ravel() for g in generators]
+    return permutations.orbit_labels(pair_generators, N * N)
+
+
+def save_edge_orbits(folder, stub, generators, edges, N, pairs=False):
+    """
+    Computes and saves the edge orbits, and optionally the ordered-pair orbits, of a network next to its vertex orbits.
+
+    Parameters:
+    folder (str): Folder holding the partitions.
+    stub (str): Network stub.
+    generators (list): Permutation arrays generating the automorphism group.
+    edges (np.ndarray): (M, 2) array of 0-indexed edges, in any order.
+    N (int): Number of nodes.
+    pairs (bool, optional): Also partition the ordered pairs when N is at most MAX_PAIR_NODES. Defaults to False.
+
+    Returns:
+    list: The paths written.
+    """
+    edges = canonical_edges(edges, N)
+    written = orbits.save_partition(folder, stub + '.edge', edge_orbit_labels(generators, edges, N))
+    index_path = os.path.join(str(folder), stub + '.edge.index.npy')
+    tmp_path = index_path[:-4] + '.tmp.npy'
+    np.save(tmp_path, edges)
+    os.replace(tmp_path, index_path)
+    written.append(index_path)
+
+    if pairs and N <= MAX_PAIR_NODES:
+        written += orbits.save_partition(folder, stub + '.pair', pair_orbit_labels(generators, N))
+    return written
+
+
+def load_edge_orbits(folder, stub):
+    """
+    Memory-maps the saved edge orbits of a network.
+
+    Parameters:
+    folder (str): Folder holding the partitions.
+    stub (str): Network stub.
+
+    Returns:
+    tuple or None: The canonical edges and the edge orbit partition (see orbits.load_partition), or None if they have
+                   not been saved.
+    """
+    index_path = os.path.join(str(folder), stub + '.edge.index.npy')
+    partition = orbits.load_partition(folder, stub + '.edge')
+    if partition is None or not os.path.exists(index_path):
+        return None
+    return np.load(index_path, mmap_mode='r'), partition
@@ -0,0 +1,223 @@
+'''
+Pool of isolated GAP worker processes.
+
+Each worker is a fresh interpreter (spawned, not forked) with its own gappy session, so one pathological group can
+only take down its own worker. Jobs are dispatched from a queue to idle workers over per-worker pipes; workers are
+recycled after a fixed number of jobs or once their memory grows past a threshold, and crashed or over-limit workers
+are restarted automatically. Jobs can be given a wall-clock budget, and the peak resident memory of each job is
+sampled while it runs.
+'''
+
+import os
+import time
+import queue
+import traceback
+import multiprocessing as mp
+from collections import deque, namedtuple
+from multiprocessing.connection import wait
+
+try:
+    import psutil
+except ImportError:  # psutil is optional, /proc is used as a fallback on Linux
+    psutil = None
+
+from . import config
+
+# Seconds between supervisor checks on busy workers
+POLL_INTERVAL = 0.5
+
+# Outcome of a single job: status is 'done', 'failed', 'crashed', 'memory' or 'timeout'
+JobResult = namedtuple('JobResult', ['key', 'status', 'value', 'elapsed', 'pid', 'peak_rss'])
+
+
+def rss_bytes(pid):
+    """
+    Returns the resident set size of a process.
+
+    Parameters:
+    pid (int): The process id.
+
+    Returns:
+    int or None: Resident memory in bytes, or None if it cannot be read.
+    """
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _worker(conn):
+    # Worker loop: receive (key, func, args), run it and send back the outcome until told to stop with None.
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        key, func, args = job
+        start_time = time.time()
+        try:
+            value = func(*args)
+            status = 'done'
+        except Exception:
+            value = traceback.format_exc()
+            status = 'failed'
+        conn.send(JobResult(key, status, value, time.time() - start_time, os.getpid(), None))
+    conn.close()
+
+
+class GapPool:
+    """
+    A supervised pool of GAP worker processes.
+
+    Parameters:
+    n_workers (int, optional): Number of worker processes. Defaults to config.GAP_WORKERS.
+    mem_limit (int, optional): Memory ceiling per worker in bytes (0 disables). Defaults to config.GAP_MEM_LIMIT.
+    max_jobs (int, optional): Jobs a worker completes before it is recycled. Defaults to config.GAP_MAX_JOBS_PER_WORKER.
+    recycle_rss (int, optional): Resident memory after which a worker is recycled between jobs.
+                                 Defaults to config.GAP_RECYCLE_RSS.
+    """
+
+    def __init__(self, n_workers=None, mem_limit=None, max_jobs=None, recycle_rss=None):
+        self.n_workers = max(1, n_workers or config.GAP_WORKERS)
+        self.mem_limit = config.GAP_MEM_LIMIT if mem_limit is None else mem_limit
+        self.max_jobs = max_jobs or config.GAP_MAX_JOBS_PER_WORKER
+        self.recycle_rss = config.GAP_RECYCLE_RSS if recycle_rss is None else recycle_rss
+        self._ctx = mp.get_context('spawn')
+        self._workers = [None] * self.n_workers  # slot -> (process, connection)
+        self._jobs_done = [0] * self.n_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start_worker(self, slot):
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_worker, args=(child_conn,), daemon=True)
+        proc.start()
+        child_conn.close()
+        self._workers[slot] = (proc, parent_conn)
+        self._jobs_done[slot] = 0
+
+    def _stop_worker(self, slot, kill=False):
+        proc, conn = self._workers[slot]
+        if kill:
+            proc.kill()
+        else:
+            try:
+                conn.send(None)
+            except (OSError, BrokenPipeError):
+                proc.kill()
+        proc.join(timeout=5)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+        conn.close()
+        self._workers[slot] = None
+
+    def _restart_worker(self, slot, kill=False):
+        self._stop_worker(slot, kill=kill)
+        self._start_worker(slot)
+
+    def close(self):
+        """
+        Stops every worker in the pool.
+        """
+        for slot in range(self.n_workers):
+            if self._workers[slot] is not None:
+                self._stop_worker(slot)
+
+    def imap(self, func, jobs, time_limit=None, on_start=None):
+        """
+        Runs func over a sequence of jobs and yields a JobResult as each one finishes (in completion order).
+
+        Parameters:
+        func (callable): A module-level function, so that it can be sent to a spawned worker.
+        jobs (iterable or queue.Queue): (key, args) pairs, or (key, args, time_limit) triples overriding the budget;
+                                        func is called as func(*args) and key identifies the job in the results. A
+                                        queue is read while jobs run, so jobs can be added as they become ready, and
+                                        is closed by putting None on it.
+        time_limit (float, optional): Wall-clock budget per job in seconds. A job running longer has its worker killed
+                                      and is reported with status 'timeout'.
+        on_start (callable, optional): Called with the key of every job when it is handed to a worker.
+
+        Returns:
+        generator: JobResult tuples.
+        """
+        feed = jobs if isinstance(jobs, queue.Queue) else None
+        pending = deque() if feed is not None else deque(jobs)
+        busy = {}  # slot -> [key, start time, peak resident memory, time limit]
+
+        for slot in range(self.n_workers):
+            if self._workers[slot] is None:
+                self._start_worker(slot)
+
+        while pending or busy or feed is not None:
+            # Take the jobs added to the feed, waiting for one when there is nothing else to do
+            while feed is not None:
+                try:
+                    job = feed.get(timeout=POLL_INTERVAL) if not (pending or busy) else feed.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    feed = None
+                else:
+                    pending.append(job)
+
+            # Hand the next job in the queue to every idle worker
+            for slot in range(self.n_workers):
+                if slot not in busy and pending:
+                    key, args, *limit = pending.popleft()
+                    self._workers[slot][1].send((key, func, args))
+                    busy[slot] = [key, time.time(), 0, limit[0] if limit else time_limit]
+                    if on_start is not None:
+                        on_start(key)
+
+            conns = {self._workers[slot][1]: slot for slot in busy}
+            for conn in wait(list(conns), timeout=POLL_INTERVAL):
+                slot = conns[conn]
+                try:
+                    result = conn.recv()
+                except (EOFError, OSError):
+                    continue  # The worker died; handled by the liveness check below
+                rss = rss_bytes(self._workers[slot][0].pid) or 0
+                peak_rss = max(busy.pop(slot)[2], rss)
+                self._jobs_done[slot] += 1
+                yield result._replace(peak_rss=peak_rss or None)
+
+                # Recycle workers that have done their share of jobs or grown too large
+                if self._jobs_done[slot] >= self.max_jobs or (self.recycle_rss and rss > self.recycle_rss):
+                    self._restart_worker(slot)
+
+            for slot, (key, start_time, peak_rss, job_limit) in list(busy.items()):
+                proc = self._workers[slot][0]
+                elapsed = time.time() - start_time
+                if not proc.is_alive():
+                    del busy[slot]
+                    yield JobResult(key, 'crashed', f'worker exited with code {proc.exitcode}',
+                                    elapsed, proc.pid, peak_rss or None)
+                    self._restart_worker(slot, kill=True)
+                    continue
+
+                rss = rss_bytes(proc.pid) or 0
+                peak_rss = busy[slot][2] = max(peak_rss, rss)
+                if self.mem_limit and rss > self.mem_limit:
+                    del busy[slot]
+                    yield JobResult(key, 'memory', f'worker exceeded {self.mem_limit} bytes ({rss} bytes resident)',
+                                    elapsed, proc.pid, peak_rss)
+                    self._restart_worker(slot, kill=True)
+                elif job_limit and elapsed > job_limit:
+                    del busy[slot]
+                    yield JobResult(key, 'timeout', f'job exceeded {job_limit}s wall-clock budget',
+                                    elapsed, proc.pid, peak_rss)
+                    self._restart_worker(slot, kill=True)
+        return
@@ -1,11 +1,14 @@
 import os
 import re
 
+from . import tracing
+
 current_file_path = os.path.abspath(__file__)
 
 base_path = os.path.join(current_file_path, '..','..')
 base_path = os.path.normpath(base_path)
 
+@tracing.traced()
 def readautomorphismgroup(fname):
     """
     Reads the automorphism group data from the .log and .gaut files generated by SCY.
@@ -77,34 +80,36 @@ def main():
                 # Generators
                 N,generators=readautomorphismgroup(fname)
                         
-                # Write generators to file
-                if len(generators)>0:
-                    fout=open(foutname,'w')
-                
-                    fout.write('N:={0};;\n'.format(N))
-                    fout.write('z:=[')
+                # Write generators to file; a trivial group (empty .gaut) is written as the identity '()' so the
+                # network still reaches lumping, which counts it without GAP
+                fout=open(foutname,'w')
+            
+                fout.write('N:={0};;\n'.format(N))
+                fout.write('z:=[')
+                if len(generators)==0:
+                    fout.write('()')
 
-                    first=True
-                    for generator in generators:    
-                        if first:
-                            first=False
-                        else:
-                            fout.write(',')
-                    # Write cycle                
-                        for cycle in generator:
-                            fout.write('(')
-                            firstvertex=True                    
-                            for vertex in cycle:
-                                if firstvertex:
-                                    firstvertex=False
-                                else:
-                                    fout.write(',')
-                                fout.write('{0}'.format(vertex+1))
-                            fout.write(')')
+                first=True
+                for generator in generators:    
+                    if first:
+                        first=False
+                    else:
+                        fout.write(',')
+                # Write cycle                
+                    for cycle in generator:
+                        fout.write('(')
+                        firstvertex=True                    
+                        for vertex in cycle:
+                            if firstvertex:
+                                firstvertex=False
+                            else:
+                                fout.write(',')
+                            fout.write('{0}'.format(vertex+1))
+                        fout.write(')')
 
-                    fout.write('];;\n')
-                    fout.write('g:=Group(z);')
-                    fout.close()
+                fout.write('];;\n')
+                fout.write('g:=Group(z);')
+                fout.close()
     return
 
 if __name__ == '__main__':
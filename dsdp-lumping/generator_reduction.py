@@ -0,0 +1,234 @@
+'''
+Reduction of saucy generating sets before they are handed to GAP.
+
+Saucy often emits many redundant generators, and every GAP operation on GroupWithGenerators pays for each of them.
+reduce_generators returns a smaller generating set for the same group in up to three passes:
+
+1. identity and duplicate generators are dropped;
+2. generators with disjoint supports and coprime orders are merged into their product, which generates both (its
+   powers recover each factor by the Chinese remainder theorem);
+3. optionally, a native Schreier-Sims stabiliser chain gives the group order, and generators are kept greedily only
+   while they enlarge the group generated so far, stopping as soon as the full order is reached.
+
+Schreier-Sims is pure Python and grows steeply with the size of the group, so both it and the minimisation accept a
+deadline: past it schreier_sims gives up and returns None, and reduce_generators returns the set from pass 2.
+
+Permutations follow the conventions of permutations.py (0-indexed arrays, products acting on the right).
+'''
+
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from . import permutations
+
+# One level of a stabiliser chain: the base point, the strong generators fixing all earlier base points and a
+# transversal mapping every point in the base point's orbit to an element carrying the base point there
+Level = namedtuple('Level', ['point', 'generators', 'transversal'])
+
+
+def _key(p):
+    return p.tobytes()
+
+
+def _orbit_transversal(point, generators):
+    # Breadth-first orbit of point with, for every orbit point, an element mapping point to it.
+    transversal = {point: permutations.identity(len(generators[0]))}
+    queue = [point]
+    for current in queue:
+        for s in generators:
+            image = int(s[current])
+            if image not in transversal:
+                transversal[image] = permutations.multiply(transversal[current], s)
+                queue.append(image)
+    return transversal
+
+
+def sift(chain, g, start=0):
+    """
+    Sifts a permutation through a stabiliser chain.
+
+    Parameters:
+    chain (list): Levels of a stabiliser chain.
+    g (np.ndarray): A permutation.
+    start (int, optional): Level to start sifting at. Defaults to 0.
+
+    Returns:
+    tuple: The residue and the level at which sifting stopped (len(chain) if it passed every level).
+    """
+    for i in range(start, len(chain)):
+        level = chain[i]
+        image = int(g[level.point])
+        if image not in level.transversal:
+            return g, i
+        g = permutations.multiply(g, permutations.inverse(level.transversal[image]))
+    return g, len(chain)
+
+
+def _level(point, strong, base_prefix):
+    # Level of the chain at point: strong generators fixing every earlier base point, and their transversal.
+    gens = [s for s in strong if all(s[b] == b for b in base_prefix)]
+    if not gens:
+        return Level(point, gens, {point: permutations.identity(len(strong[0]))})
+    return Level(point, gens, _orbit_transversal(point, gens))
+
+
+def schreier_sims(generators, N, deadline=None):
+    """
+    Builds a stabiliser chain (base and strong generating set) with the deterministic Schreier-Sims algorithm.
+
+    Parameters:
+    generators (list): Permutation arrays.
+    N (int): Number of points.
+    deadline (float, optional): time.perf_counter() value at which to give up. Defaults to none.
+
+    Returns:
+    list or None: Levels of the chain; the group order is the product of the transversal sizes. None if the deadline
+                  passed first.
+    """
+    strong = [g for g in generators if len(permutations.support(g))]
+    base = []
+    for g in strong:
+        if all(g[b] == b for b in base):
+            base.append(int(permutations.support(g)[0]))
+    chain = [_level(b, strong, base[:i]) for i, b in enumerate(base)]
+
+    # Work from the deepest level up; a Schreier generator that does not sift through adds a strong generator, which
+    # joins every level it fixes the earlier base points of, and the check resumes at the deepest level it reached
+    i = len(chain) - 1
+    while i >= 0:
+        residue, j = None, None
+        level = chain[i]
+        for point, u in level.transversal.items():
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            for s in level.generators:
+                v = level.transversal[int(s[point])]
+                schreier = permutations.multiply(permutations.multiply(u, s), permutations.inverse(v))
+                residue, j = sift(chain, schreier, i + 1)
+                if len(permutations.support(residue)):
+                    break
+                residue = None
+            if residue is not None:
+                break
+        if residue is None:
+            i -= 1
+            continue
+        strong.append(residue)
+        if j == len(base):
+            base.append(int(permutations.support(residue)[0]))
+            chain.append(None)
+        for l in range(i + 1, j + 1):
+            chain[l] = _level(base[l], strong, base[:l])
+        i = j
+    return chain
+
+
+def group_order(chain):
+    """
+    Returns the order of a group from its stabiliser chain.
+
+    Parameters:
+    chain (list): Levels of a stabiliser chain.
+
+    Returns:
+    int: The product of the orbit lengths of the base points.
+    """
+    return math.prod(len(level.transversal) for level in chain)
+
+
+def contains(chain, g):
+    """
+    Tests group membership by sifting.
+
+    Parameters:
+    chain (list): Levels of a stabiliser chain.
+    g (np.ndarray): A permutation.
+
+    Returns:
+    bool: True if g lies in the group.
+    """
+    residue, j = sift(chain, g)
+    return j == len(chain) and not len(permutations.support(residue))
+
+
+def merge_coprime(generators):
+    """
+    Merges generators with disjoint supports and coprime orders into their products.
+
+    Parameters:
+    generators (list): Permutation arrays.
+
+    Returns:
+    list: An equivalent generating set that is no larger.
+    """
+    merged = []  # [product, support mask, order]
+    for g in generators:
+        moved = g != np.arange(len(g))
+        k = permutations.order(g)
+        for entry in merged:
+            if not (entry[1] & moved).any() and math.gcd(entry[2], k) == 1:
+                entry[0] = permutations.multiply(entry[0], g)
+                entry[1] = entry[1] | moved
+                entry[2] *= k
+                break
+        else:
+            merged.append([g, moved, k])
+    return [entry[0] for entry in merged]
+
+
+def reduce_generators(generators, N, minimise=False, deadline=None):
+    """
+    Reduces a generating set before it is handed to GAP.
+
+    Parameters:
+    generators (list): Permutation arrays.
+    N (int): Number of points.
+    minimise (bool, optional): Also keep only generators that enlarge the group, using Schreier-Sims. Defaults to False.
+    deadline (float, optional): time.perf_counter() value after which minimisation is abandoned. Defaults to none.
+
+    Returns:
+    list: A generating set for the same group, with no identity or duplicate elements.
+    """
+    unique, seen = [], set()
+    for g in generators:
+        if len(permutations.support(g)) and _key(g) not in seen:
+            seen.add(_key(g))
+            unique.append(g)
+    reduced = merge_coprime(unique)
+
+    if minimise and len(reduced) > 1:
+        chain = schreier_sims(reduced, N, deadline)
+        if chain is None:
+            return reduced
+        full_order = group_order(chain)
+        # Try generators with the largest support first, as they tend to generate most of the group
+        kept, chain = [], []
+        for g in sorted(reduced, key=lambda g: -len(permutations.support(g))):
+            if not contains(chain, g):
+                kept.append(g)
+                chain = schreier_sims(kept, N, deadline)
+                if chain is None:
+                    return reduced
+                if group_order(chain) == full_order:
+                    break
+        reduced = kept
+    return reduced
+
+
+def reduce_gap(zin, N, minimise=False):
+    """
+    Reduces the generating set in a GAP generator line.
+
+    Parameters:
+    zin (str): GAP generator line, e.g. 'z:=[(1,2),(1,2)];'.
+    N (int): Number of points.
+    minimise (bool, optional): As for reduce_generators. Defaults to False.
+
+    Returns:
+    str: An equivalent GAP generator line.
+    """
+    generators = reduce_generators(permutations.parse_gap_generators(zin, N), N, minimise)
+    return permutations.to_gap(generators or [permutations.identity(N)])
@@ -0,0 +1,188 @@
+'''
+Fast change detection for data files.
+
+A single SQLite file manifest records (size, mtime_ns, inode, digest) for every file it has seen. On a scan every file
+is stat'ed, and only the files whose size, modification time or inode differ from the recorded ones are read again;
+the rest keep their recorded digest. Changed files are hashed with BLAKE2b in large blocks on a thread pool (hashlib
+releases the GIL while hashing), so a no-op check on a multi-GB directory costs one stat per file.
+
+Digests are only written back with record, so a caller can scan, run the work that depends on the files and record the
+new state once the work has succeeded.
+'''
+
+import os
+import time
+import sqlite3
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .manifest import BUSY_TIMEOUT
+
+# Bytes read per call while hashing
+BUFFER_SIZE = 1 << 22  # 4MB
+
+# Threads hashing changed files
+HASH_WORKERS = int(os.environ.get('DSDP_HASH_WORKERS', min(32, (os.cpu_count() or 1) + 4)))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path        TEXT PRIMARY KEY,
+    size        INTEGER,
+    mtime_ns    INTEGER,
+    inode       INTEGER,
+    digest      TEXT,
+    checked     REAL
+);
+'''
+
+# Recorded state of a file; digest is None for a missing file
+FileState = namedtuple('FileState', ['path', 'size', 'mtime_ns', 'inode', 'digest'])
+
+
+def connect(db_path):
+    """
+    Opens (and if necessary creates) a file manifest.
+
+    Parameters:
+    db_path (str or Path): Path to the SQLite database file.
+
+    Returns:
+    sqlite3.Connection: A connection in autocommit mode with WAL journaling enabled.
+    """
+    conn = sqlite3.connect(str(db_path), timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL;')
+    conn.execute('PRAGMA synchronous=NORMAL;')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def file_digest(path, buffer_size=BUFFER_SIZE):
+    """
+    Hashes the contents of a file.
+
+    Parameters:
+    path (str or Path): Path to the file.
+    buffer_size (int, optional): Bytes read per call. Defaults to BUFFER_SIZE.
+
+    Returns:
+    str: Hexadecimal BLAKE2b digest.
+    """
+    hash_obj = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        while chunk := f.read(buffer_size):
+            hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+def recorded(conn, paths=None):
+    """
+    Reads recorded file states.
+
+    Parameters:
+    conn (sqlite3.Connection): File manifest connection.
+    paths (list, optional): Paths to read. Defaults to every recorded file.
+
+    Returns:
+    dict: Absolute path -> FileState.
+    """
+    rows = conn.execute('SELECT path, size, mtime_ns, inode, digest FROM files;').fetchall()
+    states = {row[0]: FileState(*row) for row in rows}
+    if paths is not None:
+        wanted = set(os.path.abspath(str(path)) for path in paths)
+        states = {path: state for path, state in states.items() if path in wanted}
+    return states
+
+
+def scan(conn, paths, workers=HASH_WORKERS):
+    """
+    Computes the current state of files, rehashing only those whose stat changed since they were recorded.
+
+    Parameters:
+    conn (sqlite3.Connection): File manifest connection.
+    paths (list): Paths of the files to check.
+    workers (int, optional): Threads hashing changed files. Defaults to HASH_WORKERS.
+
+    Returns:
+    tuple: The current FileState of every path, in order, and the paths whose digest differs from the recorded one
+           (new, modified or missing files).
+    """
+    paths = [os.path.abspath(str(path)) for path in paths]
+    known = recorded(conn, paths)
+    states, to_hash = {}, []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            states[path] = FileState(path, None, None, None, None)
+            continue
+        old = known.get(path)
+        if old is not None and (old.size, old.mtime_ns, old.inode) == (st.st_size, st.st_mtime_ns, st.st_ino):
+            states[path] = old
+        else:
+            states[path] = FileState(path, st.st_size, st.st_mtime_ns, st.st_ino, None)
+            to_hash.append(path)
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(to_hash)))) as pool:
+            for path, digest in zip(to_hash, pool.map(file_digest, to_hash)):
+                states[path] = states[path]._replace(digest=digest)
+
+    changed = [path for path in paths if path not in known or known[path].digest != states[path].digest]
+    return [states[path] for path in paths], changed
+
+
+def record(conn, states):
+    """
+    Records file states, e.g. once the work depending on them has succeeded.
+
+    Parameters:
+    conn (sqlite3.Connection): File manifest connection.
+    states (list): FileState tuples from scan; missing files are removed from the manifest.
+    """
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE;')
+    try:
+        for state in states:
+            if state.digest is None:
+                conn.execute('DELETE FROM files WHERE path = ?;', (state.path,))
+            else:
+                conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?);', tuple(state) + (now,))
+    except Exception:
+        conn.execute('ROLLBACK;')
+        raise
+    conn.execute('COMMIT;')
+    return
+
+
+def combined_digest(states):
+    """
+    Combines the digests of several files into one, e.g. the input hash of a pipeline stage.
+
+    Parameters:
+    states (list): FileState tuples in a fixed order; missing files contribute their name only.
+
+    Returns:
+    str: Hexadecimal BLAKE2b digest.
+    """
+    hash_obj = hashlib.blake2b()
+    for state in states:
+        hash_obj.update(state.path.encode())
+        hash_obj.update((state.digest or '<missing>').encode())
+    return hash_obj.hexdigest()
+
+
+def input_hash(conn, paths):
+    """
+    Hashes a set of input files through the file manifest, recording their current state.
+
+    Parameters:
+    conn (sqlite3.Connection): File manifest connection.
+    paths (list): Paths of the input files, in a fixed order.
+
+    Returns:
+    str: The combined digest of the files.
+    """
+    states = scan(conn, paths)[0]
+    record(conn, states)
+    return combined_digest(states)
@@ -1,5 +1,4 @@
 import numpy as np
-import ast
 from pathlib import Path
 import math
 
@@ -13,7 +12,16 @@ from gappy import gap # library that interfaces with GAP (Group Algebra Program)
 import subprocess
 import glob
 
-import json
+from . import results_store
+from . import orbits
+from . import config
+from . import permutations
+from . import approx_rho
+from . import rho_engines
+from . import generator_reduction
+from . import edge_orbits
+from . import quotient
+from . import tracing
 
 # Get the current file path and set the base path for data processing
 CURRENT_FILE_PATH = Path(__file__).resolve()
@@ -22,6 +30,9 @@ BASE_PATH = CURRENT_FILE_PATH.parents[1]
 # Define output paths for lumping outputs
 lumpsout_path = BASE_PATH / 'data' / 'processed' / 'lumping_output'
 
+# Results store holding the row and orbit partition of the user network (see results_store.py)
+store_path = lumpsout_path / 'results.sqlite'
+
 def read_am(aut_filename):
     """
     Reads in the automorphism data from a .gap file.
@@ -52,6 +63,7 @@ def read_log(log_filename):
         'vertices',
         'edges',
         'up size',
+        'group size',
         'levels',
         'nodes',
         'generators',
@@ -84,7 +96,7 @@ def aut_processing(aut_in):
     aut_in (list): A list of strings representing automorphism data, where the first line contains 'N' and the second line contains 'z'.
 
     Returns:
-    str or int: The processed 'z' value for GAP input if the network is small enough, otherwise returns -1 to indicate skipping.
+    str: The processed 'z' value for GAP input.
     """
     #example of aut_in:
     # ['N:=18;;', 'z:=[(5,6),(5,8),(13,15),(1,2),(1,3)];;', 'g:=Group(z);']
@@ -93,32 +105,23 @@ def aut_processing(aut_in):
     n_pattern = r'N:=([^;]+);;'
     z_pattern = r'z=([^;]+);;'
     
-    # Extract and clean 'N' value (number of nodes)
-    nstring = aut_in[0]
-    nstring = nstring.replace('N:=','')
-    nstring = nstring.replace(';;','')
-
-    network_n = int(ast.literal_eval(nstring)) # Convert string to integer
-    if network_n >= 30: # Skip large networks
-        flag = -1
-        return flag
-    else:
+    # Large networks are no longer skipped here: rho_engines picks an engine that can handle them
+    zout = aut_in[1]
 
-        zout = aut_in[1]
+    # Clean 'z' value if multiple ';' are present
+    if zout.count(';') > 1:
+        zout = zout.replace(';;',';')
 
-        # Clean 'z' value if multiple ';' are present
-        if zout.count(';') > 1:
-            zout = zout.replace(';;',';')
+    zaut = zout # Placeholder for GAP processing
+    zautpath = os.path.join(lumpsout_path,'zaut_test.txt')
     
-        zaut = zout # Placeholder for GAP processing
-        zautpath = os.path.join(lumpsout_path,'zaut_test.txt')
-        
-        # Write the 'z' data to a file
-        txt_file = open(zautpath,"a")
-        txt_file.write(zout)
-        txt_file.close()
-        return zaut
+    # Write the 'z' data to a file
+    txt_file = open(zautpath,"a")
+    txt_file.write(zout)
+    txt_file.close()
+    return zaut
 
+@tracing.traced()
 def norbits(zin,N,rho_method):
     """
     Counts the number of orbits and computes related group information using GAP.
@@ -135,7 +138,7 @@ def norbits(zin,N,rho_method):
         - list: The list of orbits (if applicable).
     """
 
-    z = gap.eval(zin) # Evaluate the input using GAP
+    z = gap.eval(generator_reduction.reduce_gap(zin, N, config.MINIMISE_GENERATORS)) # Evaluate the reduced input
     G = gap.eval('zgroup:=GroupWithGenerators(z);')  # Create a group with generators
 
     # Depending on the method, compute orbits
@@ -163,12 +166,12 @@ def cycle_number(p,n):
     int: The total cycle count after considering moved points.
     """
     cs = gap.CycleStructurePerm(p)
-    m = gap.NrMovedPoints(p)
+    m = int(gap.NrMovedPoints(p))
     cyc_tot = 0
 
     for x in cs:
-        if x is int:
-            tot += x
+        if x: # unbound entries (no cycles of that length) come back empty
+            cyc_tot += int(x)
     return cyc_tot+n-m
 
 def rationals_fix(rational):
@@ -184,13 +187,14 @@ def rationals_fix(rational):
     if '/' in rational:
         num, denom = rational.split('/',1)
         num = num.strip()
-        denom = num.strip()
+        denom = denom.strip()
         quot = int(num)/int(denom)
         return quot
 
     else:
         return float(rational)
 
+@tracing.traced()
 def polya_enum(G,N):
     """
     Performs Polya enumeration for a group.
@@ -200,7 +204,7 @@ def polya_enum(G,N):
     N (int): Number of nodes in the network.
 
     Returns:
-    float: The Polya enumeration result for the group.
+    int: The Polya enumeration result for the group.
     """
     cl = gap.ConjugacyClasses(G)
     tot = 0
@@ -210,16 +214,13 @@ def polya_enum(G,N):
         rep = gap.Representative(item)
         cn = cycle_number(rep,N)
         size = gap.Size(item)
-        increment = size*2^cn
+        increment = int(size)*2**cn
         tot += increment
     
     order_g = gap.Order(G)
 
-    gorder = rationals_fix(str(order_g))
-    tot = rationals_fix(str(tot))
-
-    quot = tot/gorder
-    return quot
+    # Burnside's sum is divisible by the group order, so the count is exact in integer arithmetic
+    return int(tot)//int(order_g)
 
 def delta_gen(log_extract,rho):
     """
@@ -241,6 +242,21 @@ def delta_gen(log_extract,rho):
     delta = round(num/denom)
     return delta
                 
+def gap_polya(zin, N):
+    """
+    Counts rho exactly with GAP, for blocks of the group that rho_engines cannot enumerate natively.
+
+    Parameters:
+    zin (str): GAP expression defining the generators, e.g. 'z:=[(1,2),(3,4)];'.
+    N (int): Number of points the generators act on.
+
+    Returns:
+    tuple: rho and the order of the group.
+    """
+    gap.eval(zin)
+    G = gap.eval('zgroup:=GroupWithGenerators(z);')
+    return polya_enum(G, N), int(gap.Size(G))
+
 def gen_row(stubpath):
     """
     Generates a row of data for the output table based on the automorphism and log data.
@@ -267,11 +283,28 @@ def gen_row(stubpath):
     if Path(log_filename).is_file():
         log_extract = read_log(log_filename) # Read log data
 
-    if Path(aut_filename).is_file():
-        aut_in = read_am(aut_filename)
-        zaut = aut_processing(aut_in) # Read automorphism data
-
-        n_orbits, zorder, zorbits = norbits(zaut,int(log_extract['vertices']),'polya')
+    # Saucy reports asymmetric networks directly; they need neither the .gap file nor GAP
+    trivial = Path(log_filename).is_file() and log_extract.get('generators') == '0'
+
+    if Path(aut_filename).is_file() or trivial:
+        N = int(log_extract['vertices'])
+        if trivial:
+            generators = []
+            result = rho_engines.trivial_result(N)
+        else:
+            aut_in = read_am(aut_filename)
+            zaut = aut_processing(aut_in) # Read automorphism data
+
+            # Count rho with the fastest engine that meets the configured exactness (see rho_engines.py)
+            generators = permutations.parse_gap_generators(zaut, N)
+            log10_order = approx_rho.log10_group_size(log_extract.get('group size'))
+            result = rho_engines.count_rho(generators, N, config.LUMPING_EXACTNESS, log10_order, gap_count=gap_polya,
+                                           time_budget=config.APPROX_TIME_BUDGET,
+                                           minimise=config.MINIMISE_GENERATORS)
+        ids = permutations.orbit_labels(generators, N)
+        zorbits = orbits.decode(ids)
+        n_orbits = result.rho
+        zorder = result.order if result.order is not None else log_extract.get('group size', -1)
 
         # Create a new row for the output table
         new_row = {
@@ -286,19 +319,24 @@ def gen_row(stubpath):
             'orbits'        : str(zorbits),
             'delta'         : delta_gen(log_extract,n_orbits)
             }
+        new_row.update({
+            'log10_rho'      : result.log10_rho,
+            'log10_rho_low'  : result.log10_low,
+            'log10_rho_high' : result.log10_high,
+            'engine_reason'  : result.reason,
+            })
         
-        datpath = lumpsout_path / 'rowdat.json'
-
-        # Write the row data to a JSON file
-        with open(datpath,'w') as fp:
-            json.dump(new_row,fp)
-
-        coloursfolder = BASE_PATH / 'data' / 'processed' / 'lumping_output'
-        colourspath = coloursfolder / 'orbitcolours.txt'
-
-        coloursf = open(colourspath,"a")
-        coloursf.write(str(zorbits))
-        coloursf.close()
+        # Write the row data and orbit partition to the results store, and save the partition for memory-mapped reads
+        store = results_store.connect(store_path)
+        results_store.put_row(store, new_row, ids, engine=result.engine)
+        store.close()
+        orbits.save_partition(lumpsout_path / 'orbits', stub, ids)
+
+        # Edge (and optionally ordered-pair) orbits next to the vertex orbits, for edge-based lumped models
+        scy_path = BASE_PATH / 'data' / 'processed' / 'processing_output' / (stub + '.scy')
+        if scy_path.is_file():
+            edges = quotient.read_scy(scy_path)[1]
+            edge_orbits.save_edge_orbits(lumpsout_path / 'orbits', stub, generators, edges, N, pairs=config.PAIR_ORBITS)
     return new_row
 
 def main():
@@ -311,6 +349,10 @@ def main():
     directory_path = BASE_PATH / 'data' / 'processed' /  'gap_output'
     
     stubs = [file.stem for file in directory_path.iterdir() if file.is_file()]
+
+    # Asymmetric networks may have no .gap file; their saucy log is enough (see gen_row)
+    log_directory = BASE_PATH / 'data' / 'processed' / 'saucy_output'
+    stubs += [file.stem for file in log_directory.glob('*.log') if file.stem not in stubs]
     # stubs = ['reptilia-tortoise-network-sg'] # List of graph stubs to process
     inter_table = []
 
@@ -332,10 +374,11 @@ def main():
         'tot_support',
         'delta']
         #'colours']
-        
-    output_table = pd.DataFrame(inter_table)
-    
-    # Write the output table to a CSV file
+
+    # Export the results store to a CSV file
+    store = results_store.connect(store_path)
+    output_table = results_store.read_table(store, out_colnames)
+    store.close()
     output_table.to_csv(outpath,index=False)
 
     return
@@ -0,0 +1,239 @@
+'''
+Transactional checkpoint manifest for batch runs.
+
+The manifest is a SQLite database in WAL mode with one row per (network, stage). Each row records the stage status
+('running', 'done' or 'failed'), a hash of the stage inputs, the engine version that produced it, timings, the output
+files written and the last error. A stage is only marked 'done' after its outputs have been written, so a crash part way
+through a computation leaves the network 'running' (or 'failed') and it is picked up again on the next run. Several
+worker processes can write to the manifest at once; every write is a short IMMEDIATE transaction and writers wait on
+the database lock rather than failing.
+'''
+
+import json
+import time
+import sqlite3
+import hashlib
+
+from . import archive
+
+# Seconds a writer waits for the database lock before giving up
+BUSY_TIMEOUT = 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS stages (
+    network         TEXT NOT NULL,
+    stage           TEXT NOT NULL,
+    status          TEXT NOT NULL,
+    input_hash      TEXT,
+    engine_version  TEXT,
+    started         REAL,
+    finished        REAL,
+    elapsed         REAL,
+    outputs         TEXT,
+    error           TEXT,
+    PRIMARY KEY (network, stage)
+);
+CREATE INDEX IF NOT EXISTS stages_status ON stages (stage, status);
+'''
+
+
+def connect(db_path):
+    """
+    Opens (and if necessary creates) a manifest database.
+
+    Parameters:
+    db_path (str): Path to the SQLite database file.
+
+    Returns:
+    sqlite3.Connection: A connection in autocommit mode with WAL journaling enabled.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL;')
+    conn.execute('PRAGMA synchronous=NORMAL;')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _write(conn, sql, params):
+    # Run a single statement in its own IMMEDIATE transaction so concurrent writers serialise cleanly.
+    conn.execute('BEGIN IMMEDIATE;')
+    try:
+        conn.execute(sql, params)
+    except Exception:
+        conn.execute('ROLLBACK;')
+        raise
+    conn.execute('COMMIT;')
+    return
+
+
+def input_hash(paths):
+    """
+    Hashes the contents of a stage's input files.
+
+    Parameters:
+    paths (list): Paths of the input files, in a fixed order. Missing files contribute their name only, archive
+        members (see archive.py) their CRC and size from the archive's index.
+
+    Returns:
+    str: A hexadecimal SHA-256 digest.
+    """
+    hash_obj = hashlib.sha256()
+    for path in paths:
+        hash_obj.update(str(path).encode())
+        if archive.is_member(path):
+            hash_obj.update(archive.digest(path).encode() if archive.exists(path) else b'<missing>')
+            continue
+        try:
+            with open(path, 'rb') as f:
+                while chunk := f.read(1 << 20):
+                    hash_obj.update(chunk)
+        except FileNotFoundError:
+            hash_obj.update(b'<missing>')
+    return hash_obj.hexdigest()
+
+
+def get_entry(conn, network, stage):
+    """
+    Fetches the manifest row for a network and stage.
+
+    Parameters:
+    conn (sqlite3.Connection): Manifest connection.
+    network (str): Network stub.
+    stage (str): Stage name, e.g. 'lumping'.
+
+    Returns:
+    dict or None: The row as a dictionary, or None if the stage has never run for the network.
+    """
+    cur = conn.execute('SELECT * FROM stages WHERE network = ? AND stage = ?;', (network, stage))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    entry = dict(zip([col[0] for col in cur.description], row))
+    entry['outputs'] = json.loads(entry['outputs']) if entry['outputs'] else []
+    return entry
+
+
+def needs_run(conn, network, stage, in_hash, engine_version):
+    """
+    Decides whether a stage has to be (re)run for a network.
+
+    Parameters:
+    conn (sqlite3.Connection): Manifest connection.
+    network (str): Network stub.
+    stage (str): Stage name.
+    in_hash (str): Hash of the current stage inputs.
+    engine_version (str): Version of the engine that would run the stage.
+
+    Returns:
+    bool: True unless the stage is 'done' with the same inputs and engine version.
+    """
+    entry = get_entry(conn, network, stage)
+    if entry is None or entry['status'] != 'done':
+        return True
+    return entry['input_hash'] != in_hash or entry['engine_version'] != engine_version
+
+
+def mark_running(conn, network, stage, in_hash, engine_version):
+    """
+    Records that a stage has started for a network.
+
+    Parameters:
+    conn (sqlite3.Connection): Manifest connection.
+    network (str): Network stub.
+    stage (str): Stage name.
+    in_hash (str): Hash of the stage inputs.
+    engine_version (str): Version of the engine running the stage.
+    """
+    _write(conn, '''
+        INSERT INTO stages (network, stage, status, input_hash, engine_version, started, finished, elapsed, outputs, error)
+        VALUES (?, ?, 'running', ?, ?, ?, NULL, NULL, NULL, NULL)
+        ON CONFLICT (network, stage) DO UPDATE SET
+            status = 'running', input_hash = excluded.input_hash, engine_version = excluded.engine_version,
+            started = excluded.started, finished = NULL, elapsed = NULL, outputs = NULL, error = NULL;''',
+        (network, stage, in_hash, engine_version, time.time()))
+    return
+
+
+def mark_done(conn, network, stage, outputs):
+    """
+    Records that a stage finished and its outputs are on disk.
+
+    Parameters:
+    conn (sqlite3.Connection): Manifest connection.
+    network (str): Network stub.
+    stage (str): Stage name.
+    outputs (list): Paths of the files the stage wrote.
+    """
+    now = time.time()
+    _write(conn, '''
+        UPDATE stages SET status = 'done', finished = ?, elapsed = ? - COALESCE(started, ?), outputs = ?, error = NULL
+        WHERE network = ? AND stage = ?;''',
+        (now, now, now, json.dumps([str(p) for p in outputs]), network, stage))
+    return
+
+
+def mark_failed(conn, network, stage, error, elapsed=None):
+    """
+    Records that a stage failed for a network.
+
+    Parameters:
+    conn (sqlite3.Connection): Manifest connection.
+    network (str): Network stub.
+    stage (str): Stage name.
+    error (str): Description of the failure.
+    elapsed (float, optional): Wall-clock seconds the stage ran for, if known.
+    """
+    now = time.time()
+    _write(conn, '''
+        INSERT INTO stages (network, stage, status, started, finished, elapsed, error)
+        VALUES (?, ?, 'failed', ?, ?, ?, ?)
+        ON CONFLICT (network, stage) DO UPDATE SET
+            status = 'failed', finished = excluded.finished,
+            elapsed = COALESCE(?, excluded.finished - stages.started), error = excluded.error;''',
+        (network, stage, now, now, elapsed, error, elapsed))
+    return
+
+
+def stage_summary(conn, stage):
+    """
+    Counts networks by status for a stage.
+
+    Parameters:
+    conn (sqlite3.Connection): Manifest connection.
+    stage (str): Stage name.
+
+    Returns:
+    dict: Number of networks per status.
+    """
+    cur = conn.execute('SELECT status, COUNT(*) FROM stages WHERE stage = ? GROUP BY status;', (stage,))
+    return dict(cur.fetchall())
+
+
+def merge(conn, shard_path):
+    """
+    Copies the rows of another manifest, e.g. the shard of a work-queue worker (see work_queue.py), into this one.
+    Where both manifests hold a (network, stage), the most recently started run is kept.
+
+    Parameters:
+    conn (sqlite3.Connection): Manifest connection.
+    shard_path (str): Path of the manifest to merge in.
+
+    Returns:
+    int: Number of rows copied.
+    """
+    conn.execute('ATTACH DATABASE ? AS shard;', (str(shard_path),))
+    try:
+        conn.execute('BEGIN IMMEDIATE;')
+        try:
+            count = conn.execute('''
+                INSERT OR REPLACE INTO stages SELECT * FROM shard.stages AS s
+                WHERE NOT EXISTS (SELECT 1 FROM stages AS m
+                                  WHERE m.network = s.network AND m.stage = s.stage
+                                  AND m.started >= s.started);''').rowcount
+        except Exception:
+            conn.execute('ROLLBACK;')
+            raise
+        conn.execute('COMMIT;')
+    finally:
+        conn.execute('DETACH DATABASE shard;')
+    return count
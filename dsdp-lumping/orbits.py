@@ -0,0 +1,200 @@
+'''
+Array encoding of orbit partitions.
+
+A partition of the N nodes of a network into orbits is stored as a dense int32 array ids of length N, where node i
+(GAP point i+1) lies in orbit ids[i]. Orbit ids run from 0 and are ordered by the smallest node in each orbit, so the
+encoding is canonical. The inverse index lists the nodes of every orbit contiguously: the members of orbit k are
+members[offsets[k]:offsets[k+1]], in increasing order.
+
+Partitions are saved as plain .npy files so they can be memory-mapped on read; loading the partition of a 100k-node
+network only maps the files and takes milliseconds. Colouring, orbit-size statistics and quotient construction are all
+array lookups on ids and the inverse index.
+'''
+
+import os
+from itertools import chain
+from collections import namedtuple
+
+import numpy as np
+
+# A memory-mapped orbit partition and its inverse index
+OrbitPartition = namedtuple('OrbitPartition', ['ids', 'members', 'offsets'])
+
+# Colours cycled through for orbits with more than one node, as in the dashboard
+RGB_CODES = ['#FF0000', '#FF8700', '#FFD300', '#DEFF0A', '#A1FF0A',
+             '#0AFF99', '#0AEFFF', '#147DF5', '#580AFF', '#BE0AFF']
+DEFAULT_COLOUR = '#f3f3f3'
+
+
+def canonical(labels):
+    """
+    Relabels an arbitrary node -> label array into the canonical orbit id encoding.
+
+    Parameters:
+    labels (np.ndarray): Array of length N; nodes with equal labels are in the same orbit.
+
+    Returns:
+    np.ndarray: int32 orbit ids ordered by the smallest node in each orbit.
+    """
+    labels = np.asarray(labels)
+    n = len(labels)
+    # Smallest node carrying each label, then rank those representatives
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int32)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first), dtype=np.int32)
+    return rank[inverse.reshape(n)]
+
+
+def encode(zorbits, N):
+    """
+    Encodes GAP orbits as a dense node -> orbit id array.
+
+    Parameters:
+    zorbits (list): Orbits as returned by gap.Orbits, i.e. lists of 1-indexed points. Fixed points may be omitted.
+    N (int): Number of nodes in the network.
+
+    Returns:
+    np.ndarray: int32 array of length N of orbit ids.
+    """
+    lengths = np.fromiter((len(orbit) for orbit in zorbits), dtype=np.int64, count=len(zorbits))
+    labels = np.arange(N, dtype=np.int64)
+    if lengths.sum() > 0:
+        lengths = lengths[lengths > 0]
+        flat = np.fromiter(chain.from_iterable(zorbits), dtype=np.int64, count=int(lengths.sum())) - 1
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        labels[flat] = np.repeat(np.minimum.reduceat(flat, starts), lengths)
+    return canonical(labels)
+
+
+def inverse_index(ids):
+    """
+    Builds the orbit -> members index of a partition.
+
+    Parameters:
+    ids (np.ndarray): Node -> orbit id array.
+
+    Returns:
+    tuple: members (int32 nodes grouped by orbit) and offsets (int64, length n_orbits + 1).
+    """
+    members = np.argsort(ids, kind='stable').astype(np.int32)
+    offsets = np.zeros(int(ids.max()) + 2 if len(ids) else 1, dtype=np.int64)
+    np.cumsum(np.bincount(ids), out=offsets[1:])
+    return members, offsets
+
+
+def decode(ids):
+    """
+    Decodes a partition back into GAP-style orbit lists.
+
+    Parameters:
+    ids (np.ndarray): Node -> orbit id array.
+
+    Returns:
+    list: Lists of 1-indexed nodes for every orbit with more than one node, ordered by orbit id.
+    """
+    members, offsets = inverse_index(ids)
+    sizes = np.diff(offsets)
+    return [(members[offsets[k]:offsets[k + 1]] + 1).tolist() for k in np.flatnonzero(sizes > 1)]
+
+
+def orbit_sizes(ids):
+    """
+    Returns the size of every orbit.
+
+    Parameters:
+    ids (np.ndarray): Node -> orbit id array.
+
+    Returns:
+    np.ndarray: Number of nodes in each orbit, indexed by orbit id.
+    """
+    return np.bincount(ids)
+
+
+def orbit_stats(ids):
+    """
+    Summarises the orbit sizes of a partition.
+
+    Parameters:
+    ids (np.ndarray): Node -> orbit id array.
+
+    Returns:
+    dict: Number of orbits, number of non-trivial orbits, number of moved nodes and the largest orbit size.
+    """
+    sizes = orbit_sizes(ids)
+    return {
+        'n_orbits'      : int(len(sizes)),
+        'n_nontrivial'  : int((sizes > 1).sum()),
+        'moved_nodes'   : int(sizes[sizes > 1].sum()),
+        'largest_orbit' : int(sizes.max()) if len(sizes) else 0,
+        }
+
+
+def colour_indices(ids):
+    """
+    Assigns a colour index to every node: non-trivial orbits are numbered 2, 3, ... in orbit id order and cycle through
+    RGB_CODES, while fixed nodes get -1.
+
+    Parameters:
+    ids (np.ndarray): Node -> orbit id array.
+
+    Returns:
+    np.ndarray: Index into RGB_CODES for each node, or -1 for the default colour.
+    """
+    nontrivial = orbit_sizes(ids) > 1
+    group = np.cumsum(nontrivial) + 1  # first non-trivial orbit is colour group 2
+    return np.where(nontrivial[ids], group[ids] % len(RGB_CODES), -1)
+
+
+def partition_paths(folder, stub):
+    """
+    Returns the .npy file paths of a saved partition.
+
+    Parameters:
+    folder (str): Folder holding the partitions.
+    stub (str): Network stub.
+
+    Returns:
+    tuple: Paths of the ids, members and offsets arrays.
+    """
+    base = os.path.join(str(folder), stub)
+    return base + '.ids.npy', base + '.members.npy', base + '.offsets.npy'
+
+
+def save_partition(folder, stub, ids):
+    """
+    Saves a partition and its inverse index as .npy files, replacing any earlier version.
+
+    Parameters:
+    folder (str): Folder holding the partitions (created if needed).
+    stub (str): Network stub.
+    ids (np.ndarray): Node -> orbit id array.
+
+    Returns:
+    list: The paths written.
+    """
+    os.makedirs(str(folder), exist_ok=True)
+    ids = np.asarray(ids, dtype=np.int32)
+    members, offsets = inverse_index(ids)
+    paths = partition_paths(folder, stub)
+    for path, array in zip(paths, (ids, members, offsets)):
+        tmp_path = path[:-4] + '.tmp.npy'
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+    return list(paths)
+
+
+def load_partition(folder, stub):
+    """
+    Memory-maps a saved partition.
+
+    Parameters:
+    folder (str): Folder holding the partitions.
+    stub (str): Network stub.
+
+    Returns:
+    OrbitPartition or None: The memory-mapped arrays, or None if the partition has not been saved.
+    """
+    paths = partition_paths(folder, stub)
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return OrbitPartition(*(np.load(path, mmap_mode='r') for path in paths))
@@ -0,0 +1,215 @@
+'''
+Overlapped batch pipeline.
+
+Run in phases, the batch pipeline runs saucy on every network, then gaut2gap on every network, then lumping, so the GAP
+workers sit idle while saucy works through the long tail of large networks, and the reverse. Here every network
+streams through the stages on its own, so network k can be lumped while network k+1 is still in saucy. Each stage has
+a concurrency limit of its own:
+
+- saucy runs as asyncio subprocesses, at most config.SAUCY_WORKERS at a time;
+- the .gaut to .gap conversion runs on a pool of config.CONVERT_WORKERS processes;
+- lumping runs on the supervised GAP pool (see gap_pool.py), fed from a queue as networks become ready, with the same
+  time and memory budgets, skip ledger and manifest bookkeeping as batch_lumping.main.
+
+Total batch time then approaches the throughput of the slowest stage instead of the sum of the three. A network that
+raises in any stage, including a saucy run that exits with an error, is recorded as failed in that stage (in the
+progress status and the manifest) and the other networks carry on, as in the phased pipeline.
+'''
+
+import os
+import glob
+import queue
+import asyncio
+import subprocess
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+from . import config
+from . import manifest
+from . import tracing
+from . import progress
+from . import skip_ledger
+from . import results_store
+from . import batch_gaut2gap
+from . import batch_lumping
+from .gap_pool import GapPool
+
+current_file_path   = os.path.abspath(__file__)
+base_path = os.path.join(current_file_path, '..','..')
+base_path = os.path.normpath(base_path)
+
+saucy_directory = os.path.join(base_path,'data','interim','batch_saucy_output')
+gap_directory = os.path.join(base_path,'data','interim','batch_gap_output')
+
+
+async def run_saucy(scy_path, limit):
+    """
+    Runs saucy on a network as a subprocess and writes its .gaut and .log files, as batch_auts.auts_gen does.
+
+    Parameters:
+    scy_path (str): Path of the network in .scy format.
+    limit (asyncio.Semaphore): Bounds the number of saucy processes running at once.
+
+    Returns:
+    str: The output stub, i.e. the path of the .gaut and .log files without their extension.
+
+    Raises:
+    subprocess.CalledProcessError: If saucy exits with an error; no .gaut or .log file is written then.
+    """
+    network = os.path.basename(scy_path)[:-4]
+    async with limit:
+        with tracing.span('saucy', network, category='stage'), progress.task('saucy', network):
+            proc = await asyncio.create_subprocess_exec(config.SAUCY_PATH, '-s', scy_path,
+                                                        stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE)
+            output, error = await proc.communicate()
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, [config.SAUCY_PATH, '-s', scy_path], output,
+                                                    error)
+
+    fname = os.path.join(saucy_directory, os.path.basename(scy_path)[:-4])
+    for suffix, text in (('.gaut', output), ('.log', error)):
+        with open(fname + suffix, 'w') as f:
+            f.write(text.decode("utf-8"))
+    return fname
+
+
+def _supervise(pool, feed, loop, waiting, stages):
+    # Supervisor thread: run the GAP pool over the feed and hand every result to the coroutine waiting for it.
+    def started(stub):
+        progress.start(stages[stub], os.path.basename(stub)[:-4])
+    try:
+        for result in pool.imap(batch_lumping.gen_row, feed, on_start=started):
+            loop.call_soon_threadsafe(waiting.pop(result.key).set_result, result)
+    except Exception as e:
+        for future in list(waiting.values()):
+            loop.call_soon_threadsafe(future.set_exception, e)
+        raise
+
+
+async def _pipeline(scy_paths):
+    # Stream every network through saucy, conversion and lumping, and export the results once all are done.
+    loop = asyncio.get_running_loop()
+    for directory in (saucy_directory, gap_directory, batch_lumping.lumpsout_path):
+        os.makedirs(directory, exist_ok=True)
+
+    skipped_networks = batch_lumping.read_skipped_networks()
+    ledger_path = os.path.join(batch_lumping.lumpsout_path, 'skip_ledger.json')
+    ledger = skip_ledger.read_ledger(ledger_path)
+    time_budget = config.LUMPING_TIME_BUDGET
+    mem_budget = config.GAP_MEM_LIMIT
+
+    # Bring results from runs that predate the results store into it
+    store = results_store.connect(batch_lumping.store_path)
+    rowdat_dir = os.path.join(batch_lumping.lumpsout_path, 'rowdat')
+    if os.path.isdir(rowdat_dir):
+        results_store.import_legacy(store, rowdat_dir)
+    conn = manifest.connect(batch_lumping.manifest_path)
+
+    saucy_limit = asyncio.Semaphore(max(1, config.SAUCY_WORKERS))
+    feed, waiting = queue.Queue(), {}  # jobs for the GAP pool; .gap path -> future of its JobResult
+    stages = {}  # .gap path -> progress stage of its queued job, 'lumping' or 'estimate'
+    counts = {'lumped': 0, 'estimated': 0, 'failed': 0}
+
+    async def lump(stub, mode):
+        # Queue a lumping job on the GAP pool and wait for its outcome.
+        future = waiting[stub] = loop.create_future()
+        stages[stub] = 'lumping' if mode == 'exact' else 'estimate'
+        if mode == 'exact':
+            feed.put((stub, (stub,), time_budget))
+        else:
+            feed.put((stub, (stub, 'approximate'), 2 * config.APPROX_TIME_BUDGET))
+        return await future
+
+    async def network(scy_path, converter):
+        # Run one network through the stages; an error is recorded against the stage it was raised in, so a single
+        # bad network does not abort the batch
+        name = os.path.basename(scy_path)[:-4]
+        stage = ['saucy']
+        try:
+            await stream(scy_path, converter, stage)
+        except Exception as e:
+            detail = f"{type(e).__name__}: {e}"
+            print(f"{name} failed in {stage[0]}. Reason: {detail}")
+            progress.finish(stage[0], name, ok=False)
+            manifest.mark_failed(conn, name, stage[0], detail)
+            counts['failed'] += 1
+        return
+
+    async def stream(scy_path, converter, stage):
+        # The stages of one network; stage[0] follows the stage being run
+        fname = await run_saucy(scy_path, saucy_limit)
+        name = os.path.basename(fname)
+        stub = os.path.join(gap_directory, name + '.gap')
+        stage[0] = 'gaut2gap'
+        if os.path.isfile(stub):
+            progress.skip('gaut2gap', name)
+        else:
+            try:
+                with progress.task('gaut2gap', name):
+                    await loop.run_in_executor(converter, batch_gaut2gap.gaut_to_gap, fname, stub)
+            except ValueError as e:
+                print(f"Skipping {fname}. Reason: {e}")
+                # Asymmetric networks are still lumped from their saucy log alone (see batch_lumping.gen_row)
+                if batch_lumping.read_log(fname + '.log').get('generators') != '0':
+                    return
+
+        stage[0] = 'lumping'
+        mode = batch_lumping.plan_job(conn, store, ledger, skipped_networks, stub, time_budget, mem_budget)
+        if mode == 'exact':
+            result = await lump(stub, mode)
+            if batch_lumping.record_result(conn, ledger, ledger_path, result, time_budget, mem_budget):
+                counts['lumped'] += 1
+                return
+            mode = 'approximate'  # Estimate rho for networks the exact engine could not finish
+        if mode == 'approximate':
+            stage[0] = 'estimate'
+            result = await lump(stub, mode)
+            if batch_lumping.record_result(conn, ledger, ledger_path, result, time_budget, mem_budget, estimate=True):
+                counts['estimated'] += 1
+        return
+
+    with GapPool(mem_limit=mem_budget) as pool, \
+            ProcessPoolExecutor(max(1, config.CONVERT_WORKERS), mp_context=mp.get_context('spawn')) as converter:
+        supervisor = threading.Thread(target=_supervise, args=(pool, feed, loop, waiting, stages), daemon=True)
+        supervisor.start()
+        try:
+            await asyncio.gather(*(network(scy_path, converter) for scy_path in scy_paths))
+        finally:
+            feed.put(None)
+            await loop.run_in_executor(None, supervisor.join)
+    conn.close()
+    print(f"Lumped {counts['lumped']} networks and estimated rho for {counts['estimated']} in this run; "
+          f"{counts['failed']} failed.")
+
+    batch_lumping.export_results(store)
+    store.close()
+    return counts
+
+
+def run(scy_paths):
+    """
+    Runs the batch pipeline on a set of networks, streaming each network through saucy, gaut2gap and lumping.
+
+    Parameters:
+    scy_paths (list): Paths of the networks in .scy format.
+
+    Returns:
+    dict: The number of networks lumped exactly ('lumped'), given an estimated rho ('estimated') and failed in a
+          stage ('failed').
+    """
+    return asyncio.run(_pipeline(sorted(scy_paths)))
+
+
+def main():
+    """
+    Runs the overlapped batch pipeline on every network in the network repository folder.
+    """
+    data_path = os.path.join(base_path,'data','external','1_network_data','networkrepository','*.scy')
+    run(glob.glob(data_path))
+    return
+
+
+if __name__ == '__batch_run__':
+    main()
@@ -0,0 +1,279 @@
+'''
+Permutations of network nodes as NumPy arrays.
+
+A permutation of N nodes is an int64 array p of length N with p[i] the image of node i (0-indexed, as in saucy
+output). Products follow the GAP convention of acting on the right, so multiply(p, q) applies p first and then q.
+These helpers let orbit and group computations run natively on the generators saucy produces, without GAP.
+'''
+
+import re
+import math
+from functools import reduce
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from . import orbits
+
+
+def identity(N):
+    """
+    Returns the identity permutation.
+
+    Parameters:
+    N (int): Number of nodes.
+
+    Returns:
+    np.ndarray: The array [0, 1, ..., N-1].
+    """
+    return np.arange(N, dtype=np.int64)
+
+
+def from_cycles(cycles, N):
+    """
+    Builds a permutation from cycle notation.
+
+    Parameters:
+    cycles (list): Cycles as lists of 0-indexed nodes, e.g. [[8, 9], [144, 146]] as read from a .gaut file.
+    N (int): Number of nodes.
+
+    Returns:
+    np.ndarray: The permutation array.
+    """
+    p = identity(N)
+    for cycle in cycles:
+        if len(cycle) > 1:
+            cycle = np.asarray(cycle, dtype=np.int64)
+            p[cycle] = np.roll(cycle, -1)
+    return p
+
+
+def parse_gap_generators(zin, N):
+    """
+    Parses the generator list of a .gap file into permutation arrays.
+
+    Parameters:
+    zin (str): The generator line, e.g. 'z:=[(9,10),(145,147)(138,139)];;' (1-indexed points).
+    N (int): Number of nodes.
+
+    Returns:
+    list: Permutation arrays (0-indexed), one per generator.
+    """
+    body = zin[zin.index('[') + 1:zin.rindex(']')].strip()
+    if not body:
+        return []
+    generators = []
+    # Generators are separated by '),(' and the cycles of one generator by ')('
+    for gstring in re.split(r'\)\s*,\s*\(', body):
+        cycles = []
+        for cstring in re.split(r'\)\s*\(', gstring.strip().lstrip('(').rstrip(')')):
+            if cstring.strip():
+                cycles.append([int(point) - 1 for point in cstring.split(',')])
+        generators.append(from_cycles(cycles, N))
+    return generators
+
+
+def parse_gaut(text, N):
+    """
+    Parses saucy generators, one per line in 0-indexed cycle notation, e.g. '(0 1)(2 3)'.
+
+    Parameters:
+    text (str): The .gaut text.
+    N (int): Number of nodes.
+
+    Returns:
+    list: Permutation arrays, one per generator.
+    """
+    generators = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('('):
+            cycles = [[int(num) for num in x.split()] for x in line.lstrip('(').rstrip(')').split(')(')]
+            generators.append(from_cycles(cycles, N))
+    return generators
+
+
+def to_gap(generators):
+    """
+    Writes permutation arrays in GAP cycle notation, the inverse of parse_gap_generators.
+
+    Parameters:
+    generators (list): Permutation arrays (0-indexed).
+
+    Returns:
+    str: The generator line, e.g. 'z:=[(9,10),(145,147)];'.
+    """
+    gstrings = []
+    for p in generators:
+        gstring = ''.join('(' + ','.join(str(point + 1) for point in cycle) + ')' for cycle in cycles(p))
+        gstrings.append(gstring or '()')
+    return 'z:=[' + ','.join(gstrings) + '];'
+
+
+def multiply(p, q):
+    """
+    Multiplies two permutations, applying p first and then q (GAP's p*q).
+
+    Parameters:
+    p (np.ndarray): First permutation.
+    q (np.ndarray): Second permutation.
+
+    Returns:
+    np.ndarray: The product.
+    """
+    return q[p]
+
+
+def inverse(p):
+    """
+    Inverts a permutation.
+
+    Parameters:
+    p (np.ndarray): A permutation.
+
+    Returns:
+    np.ndarray: Its inverse.
+    """
+    inv = np.empty_like(p)
+    inv[p] = np.arange(len(p), dtype=p.dtype)
+    return inv
+
+
+def power(p, k):
+    """
+    Raises a permutation to an integer power by repeated squaring.
+
+    Parameters:
+    p (np.ndarray): A permutation.
+    k (int): The exponent (may be negative).
+
+    Returns:
+    np.ndarray: p^k.
+    """
+    if k < 0:
+        p, k = inverse(p), -k
+    result = identity(len(p))
+    while k:
+        if k & 1:
+            result = multiply(result, p)
+        p = multiply(p, p)
+        k >>= 1
+    return result
+
+
+def support(p):
+    """
+    Returns the nodes moved by a permutation.
+
+    Parameters:
+    p (np.ndarray): A permutation.
+
+    Returns:
+    np.ndarray: Sorted indices i with p[i] != i.
+    """
+    return np.flatnonzero(p != np.arange(len(p)))
+
+
+def cycle_labels(p):
+    """
+    Labels every node with the smallest node of its cycle, using pointer doubling (log2 N vectorised steps).
+
+    Parameters:
+    p (np.ndarray): A permutation.
+
+    Returns:
+    np.ndarray: The cycle label of each node.
+    """
+    labels = np.arange(len(p), dtype=np.int64)
+    jump = p.copy()
+    for _ in range(max(1, int(len(p)).bit_length())):
+        labels = np.minimum(labels, labels[jump])
+        jump = jump[jump]
+    return labels
+
+
+def cycle_count(p):
+    """
+    Counts the cycles of a permutation, fixed points included.
+
+    Parameters:
+    p (np.ndarray): A permutation.
+
+    Returns:
+    int: The number of cycles.
+    """
+    labels = cycle_labels(p)
+    return int(np.count_nonzero(labels == np.arange(len(p))))
+
+
+def cycle_lengths(p):
+    """
+    Returns the lengths of the non-trivial cycles of a permutation.
+
+    Parameters:
+    p (np.ndarray): A permutation.
+
+    Returns:
+    np.ndarray: Cycle lengths greater than one.
+    """
+    counts = np.bincount(cycle_labels(p))
+    return counts[counts > 1]
+
+
+def cycles(p):
+    """
+    Returns the non-trivial cycles of a permutation.
+
+    Parameters:
+    p (np.ndarray): A permutation.
+
+    Returns:
+    list: Cycles as lists of 0-indexed nodes, each starting at its smallest node.
+    """
+    result = []
+    seen = np.zeros(len(p), dtype=bool)
+    for start in support(p):
+        if seen[start]:
+            continue
+        cycle = [int(start)]
+        seen[start] = True
+        node = p[start]
+        while node != start:
+            cycle.append(int(node))
+            seen[node] = True
+            node = p[node]
+        result.append(cycle)
+    return result
+
+
+def order(p):
+    """
+    Returns the order of a permutation.
+
+    Parameters:
+    p (np.ndarray): A permutation.
+
+    Returns:
+    int: The least common multiple of its cycle lengths.
+    """
+    return reduce(lambda a, b: a * b // math.gcd(a, b), (int(length) for length in cycle_lengths(p)), 1)
+
+
+def orbit_labels(generators, N):
+    """
+    Computes the node orbits of the group generated by a set of permutations (union-find over generator edges).
+
+    Parameters:
+    generators (list): Permutation arrays.
+    N (int): Number of nodes.
+
+    Returns:
+    np.ndarray: Canonical node -> orbit id array (see orbits.py).
+    """
+    if len(generators) == 0:
+        return orbits.canonical(np.arange(N))
+    rows = np.tile(np.arange(N, dtype=np.int64), len(generators))
+    cols = np.concatenate(generators)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(N, N))
+    return orbits.canonical(connected_components(graph, directed=True, connection='weak')[1])
@@ -0,0 +1,203 @@
+'''
+In-memory lumping API.
+
+The command-line pipeline passes every network through files under data/: processing writes .scy, auts writes
+.gaut and .log, gaut2gap writes .gap and lumping parses them all back. lump runs the same stages on an edge array and
+returns a LumpingResult, with every hop but saucy's input in memory:
+
+    edges -> canonical edges -> saucy (via a temporary .scy file) -> generators -> rho_engines -> orbits, delta
+
+so notebooks and services can analyse many graphs without text round trips or clashing file names. Automorphisms can
+also be supplied directly (e.g. from another tool), in which case saucy is not needed at all. Writing the usual
+artifacts (.scy, .gaut, .log, .gap and the orbit partition) is opt-in, by passing a folder.
+'''
+
+import os
+import math
+import tempfile
+import subprocess
+from collections import namedtuple
+
+import numpy as np
+
+from . import config
+from . import orbits
+from . import approx_rho
+from . import edge_orbits
+from . import permutations
+from . import rho_engines
+
+# Result of lumping one network: saucy statistics (empty when generators were supplied), generators as permutation
+# arrays, the node -> orbit id array, group order, rho with its log10 and interval, delta, and the engine used
+LumpingResult = namedtuple('LumpingResult', ['name', 'n_nodes', 'M_edges', 'stats', 'generators', 'orbit_ids',
+                                             'order', 'rho', 'log10_rho', 'log10_rho_low', 'log10_rho_high', 'delta',
+                                             'engine', 'engine_reason'])
+
+# Saucy log keywords kept in LumpingResult.stats, as in lumping.read_log
+LOG_KEYWORDS = ['vertices', 'edges', 'group size', 'levels', 'nodes', 'generators', 'total support',
+                'average support', 'nodes per generator', 'bad nodes', 'cpu time (s)']
+
+
+def scy_text(edges, N):
+    """
+    Formats a network in saucy's .scy format.
+
+    Parameters:
+    edges (np.ndarray): Canonical edges (see edge_orbits.canonical_edges).
+    N (int): Number of nodes.
+
+    Returns:
+    str: The .scy text with a single colour.
+    """
+    lines = [f"{N} {len(edges)} 1"]
+    lines += [f"{u} {v}" for u, v in np.asarray(edges).tolist()]
+    return '\n'.join(lines) + '\n'
+
+
+def parse_log(text):
+    """
+    Extracts the statistics from a saucy log.
+
+    Parameters:
+    text (str): The log text.
+
+    Returns:
+    dict: Keyword -> value strings for the keywords in LOG_KEYWORDS.
+    """
+    stats = {}
+    for line in text.splitlines():
+        if '=' in line:
+            key, value = line.split('=', 1)
+            if key.strip() in LOG_KEYWORDS:
+                stats[key.strip()] = value.strip()
+    return stats
+
+
+def run_saucy(text, saucy_path=None, timeout=None):
+    """
+    Runs saucy on a network held in memory. saucy reads its input twice (it rewinds the file after counting the
+    adjacencies), so it cannot read a pipe; the network goes through a temporary file instead.
+
+    Parameters:
+    text (str): The network in .scy format.
+    saucy_path (str, optional): Path to the saucy binary. Defaults to config.SAUCY_PATH.
+    timeout (float, optional): Seconds before saucy is killed.
+
+    Returns:
+    tuple: The generator (.gaut) text and the log text.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        scy_path = os.path.join(folder, 'network.scy')
+        with open(scy_path, 'w') as f:
+            f.write(text)
+        completed = subprocess.run([saucy_path or config.SAUCY_PATH, '-s', scy_path], stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, timeout=timeout, check=True)
+    return completed.stdout.decode('utf-8'), completed.stderr.decode('utf-8')
+
+
+def _write_artifacts(folder, name, edges, N, gaut, log, generators, ids):
+    # Write the files the command-line pipeline would have produced for this network.
+    os.makedirs(str(folder), exist_ok=True)
+    base = os.path.join(str(folder), name)
+    with open(base + '.scy', 'w') as f:
+        f.write(scy_text(edges, N))
+    for suffix, text in (('.gaut', gaut), ('.log', log)):
+        if text is not None:
+            with open(base + suffix, 'w') as f:
+                f.write(text)
+    with open(base + '.gap', 'w') as f:
+        f.write(f"N:={N};;\n{permutations.to_gap(generators or [permutations.identity(N)])[:-1]};;\n")
+    orbits.save_partition(folder, name, ids)
+    return
+
+
+def lump(edges, N=None, generators=None, name='network', exactness='auto', gap_count=None, time_budget=None,
+         artifacts=None):
+    """
+    Lumps a network held in memory.
+
+    Parameters:
+    edges (np.ndarray): (M, 2) array of 0-indexed edges; direction, duplicates and self-loops are ignored.
+    N (int, optional): Number of nodes. Defaults to the largest node in edges plus one.
+    generators (list, optional): Permutation arrays generating the automorphism group. Defaults to running saucy.
+    name (str, optional): Name of the network, used for artifacts. Defaults to 'network'.
+    exactness (str, optional): 'exact', 'auto' or 'approximate', as for rho_engines.count_rho. Defaults to 'auto'.
+    gap_count (callable, optional): GAP counting function for blocks too large to enumerate (see
+                                    lumping.gap_polya). Without it GAP is never used.
+    time_budget (float, optional): Seconds for sampled blocks. Defaults to config.APPROX_TIME_BUDGET.
+    artifacts (str or Path, optional): Folder to write .scy, .gaut, .log, .gap and orbit files to. Defaults to none.
+
+    Returns:
+    LumpingResult: The statistics, generators, orbits, order, rho and delta of the network.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    N = int(edges.max()) + 1 if N is None and len(edges) else int(N or 0)
+    edges = edge_orbits.canonical_edges(edges, N)
+    M = len(edges)
+
+    gaut = log = None
+    stats = {}
+    if generators is None:
+        gaut, log = run_saucy(scy_text(edges, N))
+        stats = parse_log(log)
+        generators = permutations.parse_gaut(gaut, N)
+
+    if stats.get('generators') == '0' or not generators:
+        result = rho_engines.trivial_result(N)
+    else:
+        log10_order = approx_rho.log10_group_size(stats.get('group size'))
+        result = rho_engines.count_rho(generators, N, exactness, log10_order, gap_count=gap_count,
+                                       time_budget=config.APPROX_TIME_BUDGET if time_budget is None else time_budget,
+                                       minimise=config.MINIMISE_GENERATORS)
+    ids = permutations.orbit_labels(generators, N)
+    delta = round(N * math.log10(M) / result.log10_rho) if M > 0 and result.log10_rho > 0 else float('inf')
+
+    if artifacts is not None:
+        _write_artifacts(artifacts, name, edges, N, gaut, log, generators, ids)
+    # The order of a block counted from saucy's group size alone is not known exactly; report saucy's size instead
+    order = result.order if result.order is not None else stats.get('group size', -1)
+    return LumpingResult(name, N, M, stats, generators, ids, order, result.rho, result.log10_rho,
+                         result.log10_low, result.log10_high, delta, result.engine, result.reason)
+
+
+def lump_many(graphs, **kwargs):
+    """
+    Lumps many networks held in memory, one after the other.
+
+    Parameters:
+    graphs (dict or iterable): name -> edge array, or (name, edge array) pairs.
+    **kwargs: Passed on to lump.
+
+    Yields:
+    LumpingResult: The result of every network, in order.
+    """
+    items = graphs.items() if isinstance(graphs, dict) else graphs
+    for name, edges in items:
+        yield lump(edges, name=name, **kwargs)
+
+
+def to_row(result):
+    """
+    Converts a LumpingResult to a row in the results store format (see results_store.put_row).
+
+    Parameters:
+    result (LumpingResult): The result.
+
+    Returns:
+    dict: The row.
+    """
+    return {
+        'graph_name'     : result.name,
+        'n_nodes'        : result.n_nodes,
+        'M_edges'        : result.M_edges,
+        'aut_grp_order'  : result.order,
+        'rho'            : result.rho,
+        'log10_rho'      : result.log10_rho,
+        'log10_rho_low'  : result.log10_rho_low,
+        'log10_rho_high' : result.log10_rho_high,
+        'avg_support'    : result.stats.get('average support'),
+        'tot_support'    : result.stats.get('total support'),
+        'orbits'         : str(orbits.decode(result.orbit_ids)),
+        'delta'          : result.delta,
+        'engine_reason'  : result.engine_reason,
+        }
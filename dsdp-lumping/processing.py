@@ -4,6 +4,8 @@ from pathlib import Path
 
 import networkx as nx
 
+from . import tracing
+
 def read_in(input_file):
     """
     Reads an input file and returns its contents as a nested list.
@@ -135,6 +137,7 @@ def rm_duplicates(df):
     df = df.astype('int')  # Convert columns back to integers
     return df
 
+@tracing.traced()
 def scy_formatting(G_in, edgelist_df, write_path):
     """
     Writes the graph to a file in .scy format, including nodes, edges, and additional formatting.
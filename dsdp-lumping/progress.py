@@ -0,0 +1,387 @@
+'''
+Live progress of batch runs.
+
+While a batch runs, every network is tracked through the stages saucy, gaut2gap, lumping and estimate (the approximate
+rho of networks the exact engine skips or cannot finish) as pending, running, done, failed or skipped (nothing to do,
+e.g. up to date, or dropped after an earlier stage failed). For every stage the tracker reports these counts, the
+throughput and an ETA weighted by cost: a network costs the size of its .scy file, so a stage that has worked through
+the small networks does not promise the large ones at the same pace. A stage's rate is measured in the run once one
+of its networks has finished, and taken from the status file of the previous run until then.
+
+The status is written as JSON to config.PROGRESS_FILE (data/interim/batch_progress.json by default) every
+WRITE_INTERVAL seconds and when the run ends, and with DSDP_PROGRESS_PORT set it is also served on
+http://127.0.0.1:<port>/, so a batch running in the background can be followed with
+
+    python -m dsdp-lumping status
+
+or any HTTP client. Progress is kept by the process that dispatches the work (the batch run, the orchestrator or a
+work-queue worker); GAP and conversion workers report nothing themselves. Outside a tracked run the module functions
+do nothing.
+'''
+
+import os
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import config
+
+current_file_path   = os.path.abspath(__file__)
+base_path = os.path.join(current_file_path, '..','..')
+base_path = os.path.normpath(base_path)
+
+status_path = config.PROGRESS_FILE or os.path.join(base_path,'data','interim','batch_progress.json')
+
+# Stages in pipeline order; networks only enter the ON_DEMAND stages when they are added to them
+STAGES = ['saucy', 'gaut2gap', 'lumping', 'estimate']
+ON_DEMAND = ('estimate',)
+
+STATES = ['pending', 'running', 'done', 'failed', 'skipped']
+
+# Seconds between writes of the status file
+WRITE_INTERVAL = 2.0
+
+# Running networks listed in the status, longest-running first
+MAX_RUNNING_SHOWN = 20
+
+# Tracker of the current run, if any
+_current = None
+
+
+class Tracker:
+    """
+    Progress of the networks of one run through its stages.
+
+    Parameters:
+    costs (dict): Network -> cost, e.g. the size of its .scy file in bytes.
+    stages (list, optional): Stage names in pipeline order. Defaults to STAGES.
+    overlapped (bool, optional): Whether the stages run at the same time (see orchestrator.py), which makes the ETA
+                                 of the run the longest ETA of its stages rather than their sum. Defaults to False.
+    prior (dict, optional): Stage -> cost per second from an earlier run, used until the stage has a rate of its own.
+    """
+
+    def __init__(self, costs, stages=STAGES, overlapped=False, prior=None):
+        self.costs = dict(costs)
+        self.stages = list(stages)
+        self.overlapped = overlapped
+        self.prior = prior or {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        # stage -> network -> [state, start time, end time]
+        self.tasks = {stage: {} for stage in self.stages}
+        for stage in self.stages:
+            if stage not in ON_DEMAND:
+                self.tasks[stage] = {network: ['pending', None, None] for network in self.costs}
+
+    def _task(self, stage, network):
+        # The task of a network in a stage, added as pending if the network was not known yet.
+        return self.tasks[stage].setdefault(network, ['pending', None, None])
+
+    def add(self, stage, network):
+        """
+        Adds a network to a stage, e.g. to the estimate stage once its exact lumping failed.
+        """
+        with self._lock:
+            self.tasks[stage][network] = ['pending', None, None]
+
+    def skip(self, stage, network):
+        """
+        Marks a network as having nothing to do in a stage.
+        """
+        with self._lock:
+            task = self._task(stage, network)
+            if task[0] == 'pending':
+                task[0] = 'skipped'
+
+    def skip_network(self, network):
+        """
+        Marks a network as having nothing to do in any stage, e.g. when another worker processes it.
+        """
+        for stage in self.stages:
+            if stage not in ON_DEMAND:
+                self.skip(stage, network)
+
+    def start(self, stage, network):
+        """
+        Marks a network as running in a stage.
+        """
+        with self._lock:
+            self._task(stage, network)[:] = ['running', time.time(), None]
+
+    def finish(self, stage, network, ok=True):
+        """
+        Marks a network as done or failed in a stage; a failed network is skipped by the later pipeline stages.
+        """
+        with self._lock:
+            task = self._task(stage, network)
+            task[0], task[2] = 'done' if ok else 'failed', time.time()
+            if task[1] is None:
+                task[1] = task[2]
+            if not ok and stage in self.stages:
+                for later in self.stages[self.stages.index(stage) + 1:]:
+                    if later not in ON_DEMAND:
+                        later_task = self._task(later, network)
+                        if later_task[0] == 'pending':
+                            later_task[0] = 'skipped'
+
+    def _stage_status(self, stage, now):
+        # Counts, throughput and ETA of one stage.
+        tasks = self.tasks[stage]
+        counts = Counter(task[0] for task in tasks.values())
+        processed = [network for network, task in tasks.items() if task[0] in ('done', 'failed')]
+        remaining = [network for network, task in tasks.items() if task[0] in ('pending', 'running')]
+        cost_processed = sum(self.costs.get(network, 1) for network in processed)
+        cost_remaining = sum(self.costs.get(network, 1) for network in remaining)
+
+        starts = [task[1] for task in tasks.values() if task[1] is not None]
+        ends = [task[2] for task in tasks.values() if task[2] is not None]
+        active = ((now if remaining else max(ends)) - min(starts)) if starts and (remaining or ends) else 0.0
+        if processed and active > 0:
+            rate, source = cost_processed / active, 'run'
+        elif self.prior.get(stage):
+            rate, source = self.prior[stage], 'previous run'
+        else:
+            rate, source = None, None
+
+        if not remaining:
+            eta = 0.0
+        elif rate:
+            eta = cost_remaining / rate
+        else:
+            eta = None
+        status = {state: counts.get(state, 0) for state in STATES}
+        status.update({
+            'total'              : len(tasks),
+            'networks_per_min'   : 60 * len(processed) / active if processed and active > 0 else None,
+            'cost_done'          : cost_processed,
+            'cost_remaining'     : cost_remaining,
+            'rate'               : rate,
+            'rate_source'        : source,
+            'eta_s'              : eta,
+            'failed_networks'    : sorted(network for network, task in tasks.items() if task[0] == 'failed'),
+            })
+        return status
+
+    def snapshot(self, finished=False):
+        """
+        Returns the status of the run.
+
+        Parameters:
+        finished (bool, optional): Whether the run has ended. Defaults to False.
+
+        Returns:
+        dict: Start and update times, elapsed seconds, the ETA of the run (None while a stage with work left has no
+              rate), the status of every stage and the running networks, longest-running first.
+        """
+        now = time.time()
+        with self._lock:
+            stages = {stage: self._stage_status(stage, now) for stage in self.stages}
+            running = sorted(({'stage': stage, 'network': network, 'seconds': now - task[1]}
+                              for stage, tasks in self.tasks.items() for network, task in tasks.items()
+                              if task[0] == 'running'), key=lambda entry: -entry['seconds'])
+        etas = [status['eta_s'] for status in stages.values()]
+        if any(eta is None for eta in etas):
+            eta = None
+        else:
+            eta = max(etas) if self.overlapped else sum(etas)
+        return {
+            'started'    : self.started,
+            'updated'    : now,
+            'elapsed_s'  : now - self.started,
+            'finished'   : finished,
+            'overlapped' : self.overlapped,
+            'eta_s'      : eta,
+            'stages'     : stages,
+            'running'    : running[:MAX_RUNNING_SHOWN],
+            }
+
+
+def _write(tracker, path, finished=False):
+    # Write the status atomically, so readers never see a partial file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(tracker.snapshot(finished), f, indent=1)
+    os.replace(tmp_path, path)
+    return
+
+
+def read_status(path=None):
+    """
+    Reads the status file of a run.
+
+    Parameters:
+    path (str, optional): Status file. Defaults to status_path.
+
+    Returns:
+    dict or None: The status, or None if there is no readable status file.
+    """
+    try:
+        with open(path or status_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _serve(tracker, port):
+    # Serve the status as JSON on localhost from a daemon thread.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(tracker.snapshot(), indent=1).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # keep requests out of the batch output
+            return
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@contextmanager
+def tracking(costs, overlapped=False, path=None, port=None):
+    """
+    Tracks the progress of a run: writes the status file periodically and, with a port, serves it over HTTP.
+
+    Parameters:
+    costs (dict): Network -> cost, e.g. the size of its .scy file in bytes.
+    overlapped (bool, optional): Whether the stages run at the same time. Defaults to False.
+    path (str, optional): Status file. Defaults to status_path.
+    port (int, optional): Local port serving the status; 0 or None disables it. Defaults to config.PROGRESS_PORT.
+
+    Yields:
+    Tracker: The tracker, also used by the module functions until the run ends.
+    """
+    global _current
+    path = path or status_path
+    port = config.PROGRESS_PORT if port is None else port
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    # Rates measured by the previous run estimate the stages this run has not measured yet
+    previous = read_status(path) or {}
+    prior = {stage: status['rate'] for stage, status in previous.get('stages', {}).items()
+             if status.get('rate_source') == 'run'}
+    tracker = _current = Tracker(costs, overlapped=overlapped, prior=prior)
+
+    stop = threading.Event()
+    def write_periodically():
+        while not stop.wait(WRITE_INTERVAL):
+            _write(tracker, path)
+    writer = threading.Thread(target=write_periodically, daemon=True)
+    writer.start()
+
+    server = None
+    if port:
+        try:
+            server = _serve(tracker, port)
+            print(f"Progress served on http://127.0.0.1:{port}/")
+        except OSError as e:
+            print(f"Progress is not served on port {port} ({e}); see {path}")
+    try:
+        yield tracker
+    finally:
+        stop.set()
+        writer.join()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        _write(tracker, path, finished=True)
+        _current = None
+
+
+def add(stage, network):
+    # Adds a network to a stage of the current run (see Tracker.add).
+    if _current is not None:
+        _current.add(stage, network)
+
+
+def skip(stage, network):
+    # Marks a network as having nothing to do in a stage of the current run (see Tracker.skip).
+    if _current is not None:
+        _current.skip(stage, network)
+
+
+def skip_network(network):
+    # Marks a network as having nothing to do in the current run (see Tracker.skip_network).
+    if _current is not None:
+        _current.skip_network(network)
+
+
+def start(stage, network):
+    # Marks a network as running in a stage of the current run (see Tracker.start).
+    if _current is not None:
+        _current.start(stage, network)
+
+
+def finish(stage, network, ok=True):
+    # Marks a network as done or failed in a stage of the current run (see Tracker.finish).
+    if _current is not None:
+        _current.finish(stage, network, ok)
+
+
+@contextmanager
+def task(stage, network):
+    """
+    Tracks a block of work on a network as running, then done, or failed if it raises.
+
+    Parameters:
+    stage (str): The stage, e.g. 'saucy'.
+    network (str): The network name.
+    """
+    start(stage, network)
+    try:
+        yield
+    except BaseException:
+        finish(stage, network, ok=False)
+        raise
+    finish(stage, network)
+
+
+def _duration(seconds):
+    # Human-readable duration, e.g. '1h02m' or '45s'.
+    if seconds is None:
+        return '?'
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def main(path=None):
+    """
+    Prints the status of the current or last batch run as a table.
+
+    Parameters:
+    path (str, optional): Status file. Defaults to status_path.
+    """
+    status = read_status(path)
+    if status is None:
+        print(f"No batch progress found at {path or status_path}.")
+        return
+
+    state = 'finished' if status['finished'] else f"updated {_duration(time.time() - status['updated'])} ago"
+    print(f"Batch started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(status['started']))}, "
+          f"elapsed {_duration(status['elapsed_s'])}, ETA {_duration(status['eta_s'])} ({state})")
+    print(f"{'stage':<10}{'done':>8}{'running':>9}{'failed':>8}{'skipped':>9}{'pending':>9}{'net/min':>9}{'ETA':>9}")
+    # Marks the ETAs of stages that have no finished network yet, estimated from the previous run
+    def estimated(info):
+        return info['rate_source'] == 'previous run' and bool(info['eta_s'])
+
+    for stage, info in status['stages'].items():
+        rate = f"{info['networks_per_min']:.1f}" if info['networks_per_min'] is not None else '-'
+        eta = _duration(info['eta_s']) + ('*' if estimated(info) else '')
+        print(f"{stage:<10}{info['done']:>8}{info['running']:>9}{info['failed']:>8}{info['skipped']:>9}"
+              f"{info['pending']:>9}{rate:>9}{eta:>9}")
+    if any(estimated(info) for info in status['stages'].values()):
+        print("* estimated from the rate of the previous run")
+    for entry in status['running'][:5]:
+        print(f"running {entry['stage']} on {entry['network']} for {_duration(entry['seconds'])}")
+    return
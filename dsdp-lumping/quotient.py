@@ -0,0 +1,309 @@
+'''
+Lumped quotient network and lumped binary-state dynamics.
+
+Given the orbit partition of a network (see orbits.py), the quotient network has one node per vertex orbit. Its
+edge-count matrix E = P^T A P counts the edges between every pair of orbits (ordered pairs, so the diagonal holds twice
+the number of edges inside an orbit), and its neighbour matrix B = D^-1 E gives the number of neighbours that any node
+of orbit a has in orbit b. B is the exact lumped operator for linear dynamics dx/dt = a x + b A x on the network.
+
+For binary-state single-vertex-transition models (SIS, voter, ...) the lumped system is the master equation on the
+orbits of the automorphism group acting on the 2^N states, of which there are rho. lumped_generator builds that rho x
+rho generator matrix from a local update rule, so the reduced model can be solved directly. Enumerating the states
+needs 2^N memory, so it is limited to networks of at most MAX_STATE_NODES nodes.
+'''
+
+import os
+from pathlib import Path
+from collections import namedtuple
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from . import orbits
+from . import permutations
+
+# Get the current file path and set the base path for data processing
+CURRENT_FILE_PATH = Path(__file__).resolve()
+BASE_PATH = CURRENT_FILE_PATH.parents[1]
+
+# Quotient matrices are written next to the lumping outputs they are built from
+lumpsout_path = BASE_PATH / 'data' / 'processed' / 'lumping_output'
+quotient_path = lumpsout_path / 'quotient'
+
+# Largest network for which the full binary state space is enumerated
+MAX_STATE_NODES = 22
+
+# Quotient network of an orbit partition
+Quotient = namedtuple('Quotient', ['edge_counts', 'neighbour_counts', 'sizes'])
+
+# Lumped binary-state model: generator (rho x rho, rows sum to zero), a representative state per lumped state, the
+# lumped state of every full state and the number of full states in each lumped state
+LumpedModel = namedtuple('LumpedModel', ['generator', 'representatives', 'state_ids', 'state_counts'])
+
+
+def read_scy(scy_path):
+    """
+    Reads a network in saucy (.scy) format.
+
+    Parameters:
+    scy_path (str or Path): Path to the .scy file (header 'nodes edges colours', then 0-indexed edge pairs).
+
+    Returns:
+    tuple: The number of nodes and an (M, 2) int64 array of edges.
+    """
+    with open(scy_path, 'r') as f:
+        N = int(f.readline().split()[0])
+        edges = np.loadtxt(f, dtype=np.int64, ndmin=2)
+    return N, edges.reshape(-1, 2)
+
+
+def adjacency(edges, N):
+    """
+    Builds the symmetric adjacency matrix of an undirected network.
+
+    Parameters:
+    edges (np.ndarray): (M, 2) array of 0-indexed edges.
+    N (int): Number of nodes.
+
+    Returns:
+    scipy.sparse.csr_matrix: N x N adjacency matrix with unit entries.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    A = sp.coo_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(N, N)).tocsr()
+    A.data[:] = 1  # collapse duplicate edges
+    return A
+
+
+def indicator(ids):
+    """
+    Builds the node -> orbit indicator matrix of a partition.
+
+    Parameters:
+    ids (np.ndarray): Node -> orbit id array.
+
+    Returns:
+    scipy.sparse.csr_matrix: N x K matrix with P[i, ids[i]] = 1.
+    """
+    N = len(ids)
+    return sp.csr_matrix((np.ones(N, dtype=np.int64), (np.arange(N), np.asarray(ids))), shape=(N, int(ids.max()) + 1))
+
+
+def quotient_graph(ids, edges):
+    """
+    Builds the quotient network of an orbit partition.
+
+    Parameters:
+    ids (np.ndarray): Node -> orbit id array.
+    edges (np.ndarray): (M, 2) array of 0-indexed edges.
+
+    Returns:
+    Quotient: Edge-count matrix E (K x K), neighbour-count matrix B = D^-1 E (K x K) and orbit sizes.
+    """
+    ids = np.asarray(ids)
+    A = adjacency(edges, len(ids))
+    P = indicator(ids)
+    E = (P.T @ A @ P).tocsr()
+    sizes = orbits.orbit_sizes(ids)
+    B = (sp.diags(1.0 / sizes) @ E).tocsr()
+    return Quotient(E, B, sizes)
+
+
+def linear_operator(quotient, self_rate, coupling):
+    """
+    Lumped operator of the linear dynamics dx/dt = self_rate * x + coupling * A x.
+
+    Parameters:
+    quotient (Quotient): The quotient network.
+    self_rate (float): Coefficient of each node's own state.
+    coupling (float): Coefficient of the sum over neighbours.
+
+    Returns:
+    scipy.sparse.csr_matrix: K x K operator acting on the common state of each orbit.
+    """
+    K = len(quotient.sizes)
+    return (self_rate * sp.identity(K, format='csr') + coupling * quotient.neighbour_counts).tocsr()
+
+
+def sis_rule(beta, gamma):
+    """
+    Local update rule of the SIS model: a susceptible node is infected at rate beta per infected neighbour and an
+    infected node recovers at rate gamma.
+
+    Parameters:
+    beta (float): Infection rate per infected neighbour.
+    gamma (float): Recovery rate.
+
+    Returns:
+    callable: rule(x, m, k) giving the flip rate of every node, where x holds node states (0 or 1), m the number of
+              active neighbours and k the degrees (all broadcastable arrays).
+    """
+    def rule(x, m, k):
+        return np.where(x == 0, beta * m, gamma)
+    return rule
+
+
+def voter_rule(rate=1.0):
+    """
+    Local update rule of the voter model: a node adopts the state of a uniformly chosen neighbour at the given rate.
+
+    Parameters:
+    rate (float, optional): Update rate of each node. Defaults to 1.
+
+    Returns:
+    callable: rule(x, m, k) as for sis_rule.
+    """
+    def rule(x, m, k):
+        k_safe = np.maximum(k, 1)
+        return rate * np.where(x == 0, m, k - m) / k_safe
+    return rule
+
+
+def apply_to_states(p, states, N):
+    """
+    Applies a node permutation to binary states encoded as integers (bit i is the state of node i).
+
+    Parameters:
+    p (np.ndarray): Node permutation.
+    states (np.ndarray): uint64 state codes.
+    N (int): Number of nodes.
+
+    Returns:
+    np.ndarray: The permuted state codes.
+    """
+    out = np.zeros_like(states)
+    for i in np.flatnonzero(p != np.arange(N)):
+        out |= ((states >> np.uint64(i)) & np.uint64(1)) << np.uint64(p[i])
+    fixed = np.uint64(sum(1 << int(i) for i in np.flatnonzero(p == np.arange(N))))
+    return out | (states & fixed)
+
+
+def state_orbits(generators, N):
+    """
+    Computes the orbits of the automorphism group on the 2^N binary states.
+
+    Parameters:
+    generators (list): Permutation arrays generating the group.
+    N (int): Number of nodes (at most MAX_STATE_NODES).
+
+    Returns:
+    np.ndarray: Canonical state -> lumped state id array of length 2^N; there are rho lumped states.
+    """
+    if N > MAX_STATE_NODES:
+        raise ValueError(f"State space of {N} nodes is too large to enumerate (limit {MAX_STATE_NODES}).")
+    n_states = 1 << N
+    states = np.arange(n_states, dtype=np.uint64)
+    if len(generators) == 0:
+        return np.arange(n_states, dtype=np.int64)
+    rows = np.tile(states.astype(np.int64), len(generators))
+    cols = np.concatenate([apply_to_states(g, states, N).astype(np.int64) for g in generators])
+    graph = sp.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n_states, n_states))
+    return orbits.canonical(connected_components(graph, directed=True, connection='weak')[1]).astype(np.int64)
+
+
+def state_bits(states, N):
+    """
+    Expands integer state codes into a 0/1 matrix.
+
+    Parameters:
+    states (np.ndarray): uint64 state codes.
+    N (int): Number of nodes.
+
+    Returns:
+    np.ndarray: uint8 array of shape (len(states), N).
+    """
+    shifts = np.arange(N, dtype=np.uint64)
+    return ((states[:, None] >> shifts[None, :]) & np.uint64(1)).astype(np.uint8)
+
+
+def lumped_generator(generators, edges, N, rule):
+    """
+    Builds the lumped master-equation generator of a binary-state single-vertex-transition model.
+
+    Parameters:
+    generators (list): Permutation arrays generating the automorphism group.
+    edges (np.ndarray): (M, 2) array of 0-indexed edges.
+    N (int): Number of nodes (at most MAX_STATE_NODES).
+    rule (callable): Local update rule, e.g. sis_rule(beta, gamma).
+
+    Returns:
+    LumpedModel: The rho x rho generator Q (dp/dt = p Q for row vector p of lumped state probabilities),
+                 a representative state code per lumped state, the state -> lumped state ids and the lumped state sizes.
+    """
+    state_ids = state_orbits(generators, N)
+    n_lumped = int(state_ids.max()) + 1
+    # canonical ids are ordered by smallest member, so the first state of each lumped state is found with unique
+    representatives = np.unique(state_ids, return_index=True)[1].astype(np.uint64)
+
+    A = adjacency(edges, N)
+    degree = np.asarray(A.sum(axis=1)).ravel()
+    X = state_bits(representatives, N)
+    active = np.asarray((A @ X.T.astype(np.int64)).T)
+    rates = np.asarray(rule(X, active, degree[None, :]), dtype=float)
+
+    # Flipping node j of representative r leads to the lumped state of r XOR 2^j
+    targets = representatives[:, None] ^ (np.uint64(1) << np.arange(N, dtype=np.uint64))[None, :]
+    rows = np.repeat(np.arange(n_lumped), N)
+    cols = state_ids[targets.ravel().astype(np.int64)]
+    Q = sp.coo_matrix((rates.ravel(), (rows, cols)), shape=(n_lumped, n_lumped)).tocsr()
+    Q = (Q - sp.diags(np.asarray(Q.sum(axis=1)).ravel())).tocsr()
+    return LumpedModel(Q, representatives, state_ids, np.bincount(state_ids))
+
+
+def build_quotient(stub, scy_path, partition_folder, out_folder, generators=None, rule=None):
+    """
+    Builds and saves the quotient network of a lumped network, and its lumped binary-state generator when the network is
+    small enough.
+
+    Parameters:
+    stub (str): Network stub.
+    scy_path (str or Path): Path to the network in .scy format.
+    partition_folder (str or Path): Folder holding the saved orbit partition (see orbits.save_partition).
+    out_folder (str or Path): Folder to write the sparse matrices to.
+    generators (list, optional): Permutation arrays of the automorphism group, needed for the lumped generator.
+    rule (callable, optional): Local update rule for the lumped generator. Defaults to SIS with beta = gamma = 1.
+
+    Returns:
+    list: The paths written.
+    """
+    N, edges = read_scy(scy_path)
+    partition = orbits.load_partition(partition_folder, stub)
+    ids = np.asarray(partition.ids) if partition is not None else permutations.orbit_labels(generators or [], N)
+
+    os.makedirs(str(out_folder), exist_ok=True)
+    base = os.path.join(str(out_folder), stub)
+    quotient = quotient_graph(ids, edges)
+    sp.save_npz(base + '.quotient_edges.npz', quotient.edge_counts)
+    sp.save_npz(base + '.quotient_neighbours.npz', quotient.neighbour_counts)
+    written = [base + '.quotient_edges.npz', base + '.quotient_neighbours.npz']
+
+    if generators is not None and N <= MAX_STATE_NODES:
+        model = lumped_generator(generators, edges, N, rule or sis_rule(1.0, 1.0))
+        sp.save_npz(base + '.lumped_generator.npz', model.generator)
+        written.append(base + '.lumped_generator.npz')
+    return written
+
+
+def main():
+    """
+    Builds the quotient network and lumped SIS generator of every network in the user lumping output.
+    """
+    gap_directory = BASE_PATH / 'data' / 'processed' / 'gap_output'
+    scy_directory = BASE_PATH / 'data' / 'processed' / 'processing_output'
+
+    for gap_file in sorted(gap_directory.glob('*.gap')):
+        stub = gap_file.stem
+        with open(gap_file, 'r') as f:
+            aut_in = [line.strip() for line in f]
+        N = int(aut_in[0].replace('N:=', '').replace(';;', ''))
+        generators = permutations.parse_gap_generators(aut_in[1], N)
+        written = build_quotient(stub, scy_directory / (stub + '.scy'), lumpsout_path / 'orbits', quotient_path,
+                                 generators)
+        print(stub, '->', ', '.join(os.path.basename(path) for path in written))
+    return
+
+
+if __name__ == "__main__":
+    main()
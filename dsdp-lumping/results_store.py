@@ -0,0 +1,267 @@
+'''
+Consolidated results store for lumping outputs.
+
+All per-network results live in a single SQLite database (WAL mode, so several workers can append at once) with one
+row per network: the scalar statistics used by the dashboard and analytics, plus the orbit partition as an int32
+array of node -> orbit id (see orbits.py). It replaces the per-network rowdat/*.json and orbit_colours/*.txt files and the graph_data.csv
+rebuilt from them; the whole table can be read and filtered with a single query.
+
+Exact integers (group order and rho) can be far larger than 64 bits, so they are stored as text alongside a REAL
+log10(rho) column that can be indexed and plotted. Estimated values (see approx_rho.py) also fill the log10_rho_low
+and log10_rho_high columns with their confidence interval; these are NULL for exact results.
+'''
+
+import os
+import json
+import math
+import time
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from . import orbits
+from .manifest import BUSY_TIMEOUT
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS networks (
+    graph_name      TEXT PRIMARY KEY,
+    n_nodes         INTEGER,
+    M_edges         INTEGER,
+    aut_grp_order   TEXT,
+    rho             TEXT,
+    log10_rho       REAL,
+    log10_rho_low   REAL,
+    log10_rho_high  REAL,
+    delta           REAL,
+    avg_support     REAL,
+    tot_support     REAL,
+    engine          TEXT,
+    engine_reason   TEXT,
+    orbit_ids       BLOB,
+    updated         REAL
+);
+CREATE INDEX IF NOT EXISTS networks_n_nodes ON networks (n_nodes);
+CREATE INDEX IF NOT EXISTS networks_log10_rho ON networks (log10_rho);
+CREATE INDEX IF NOT EXISTS networks_delta ON networks (delta);
+'''
+
+# Scalar columns returned by read_table by default (everything except the orbit array)
+SCALAR_COLUMNS = ['graph_name', 'n_nodes', 'M_edges', 'aut_grp_order', 'rho', 'log10_rho', 'log10_rho_low',
+                  'log10_rho_high', 'delta', 'avg_support', 'tot_support', 'engine', 'engine_reason']
+
+# Columns added since the first version of the schema, with their types, for upgrading existing stores
+ADDED_COLUMNS = [('log10_rho_low', 'REAL'), ('log10_rho_high', 'REAL'), ('engine_reason', 'TEXT')]
+
+
+def connect(db_path):
+    """
+    Opens (and if necessary creates) a results store.
+
+    Parameters:
+    db_path (str or Path): Path to the SQLite database file.
+
+    Returns:
+    sqlite3.Connection: A connection in autocommit mode with WAL journaling enabled.
+    """
+    conn = sqlite3.connect(str(db_path), timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL;')
+    conn.execute('PRAGMA synchronous=NORMAL;')
+    conn.executescript(SCHEMA)
+    existing = set(info[1] for info in conn.execute('PRAGMA table_info(networks);'))
+    for column, column_type in ADDED_COLUMNS:
+        if column not in existing:
+            conn.execute(f'ALTER TABLE networks ADD COLUMN {column} {column_type};')
+    return conn
+
+
+def _number_text(value):
+    # Exact text form of an integer-valued result, leaving anything else (inf, -1 fallbacks) as it is.
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _log10(value):
+    try:
+        value = int(value) if str(value).lstrip('-').isdigit() else float(value)
+        return math.log10(value) if value > 0 and not math.isinf(value) else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _real(value):
+    try:
+        value = float(value)
+    except (ValueError, TypeError):
+        return None
+    return None if math.isnan(value) or math.isinf(value) else value
+
+
+def put_row(conn, row, ids=None, engine=None):
+    """
+    Inserts or replaces the results for one network.
+
+    Parameters:
+    conn (sqlite3.Connection): Results store connection.
+    row (dict): A row as built by gen_row (graph_name, n_nodes, M_edges, aut_grp_order, rho, delta, ...). Estimated
+                rows also carry log10_rho, log10_rho_low and log10_rho_high.
+    ids (np.ndarray, optional): Node -> orbit id array for the network.
+    engine (str, optional): Name of the engine that computed rho; row['engine_reason'] may say why it was chosen.
+    """
+    blob = None if ids is None else np.asarray(ids, dtype='<i4').tobytes()
+    conn.execute('BEGIN IMMEDIATE;')
+    try:
+        conn.execute('''
+            INSERT OR REPLACE INTO networks
+            (graph_name, n_nodes, M_edges, aut_grp_order, rho, log10_rho, log10_rho_low, log10_rho_high, delta,
+             avg_support, tot_support, engine, engine_reason, orbit_ids, updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);''',
+            (row['graph_name'], int(row['n_nodes']), int(row['M_edges']), _number_text(row['aut_grp_order']),
+             _number_text(row['rho']), _real(row.get('log10_rho', _log10(row['rho']))),
+             _real(row.get('log10_rho_low')), _real(row.get('log10_rho_high')), _real(row['delta']),
+             _real(row.get('avg_support')), _real(row.get('tot_support')), engine, row.get('engine_reason'), blob,
+             time.time()))
+    except Exception:
+        conn.execute('ROLLBACK;')
+        raise
+    conn.execute('COMMIT;')
+    return
+
+
+def _parse_number(text):
+    # Inverse of _number_text: exact ints come back as Python ints, anything else as float.
+    if text is None:
+        return None
+    return int(text) if text.lstrip('-').isdigit() else float(text)
+
+
+def get_row(conn, graph_name):
+    """
+    Fetches the scalar results for one network.
+
+    Parameters:
+    conn (sqlite3.Connection): Results store connection.
+    graph_name (str): Network stub.
+
+    Returns:
+    dict or None: The row with the same keys as the legacy rowdat JSON, or None if the network is not in the store.
+    """
+    cur = conn.execute(f'SELECT {", ".join(SCALAR_COLUMNS)} FROM networks WHERE graph_name = ?;', (graph_name,))
+    values = cur.fetchone()
+    if values is None:
+        return None
+    row = dict(zip(SCALAR_COLUMNS, values))
+    row['aut_grp_order'] = _parse_number(row['aut_grp_order'])
+    row['rho'] = _parse_number(row['rho'])
+    if row['delta'] is not None and float(row['delta']).is_integer():
+        row['delta'] = int(row['delta'])
+    return row
+
+
+def get_orbit_ids(conn, graph_name):
+    """
+    Fetches the node -> orbit id array for one network.
+
+    Parameters:
+    conn (sqlite3.Connection): Results store connection.
+    graph_name (str): Network stub.
+
+    Returns:
+    np.ndarray or None: The int32 orbit id array, or None if it is not stored.
+    """
+    values = conn.execute('SELECT orbit_ids FROM networks WHERE graph_name = ?;', (graph_name,)).fetchone()
+    if values is None or values[0] is None:
+        return None
+    return np.frombuffer(values[0], dtype='<i4')
+
+
+def read_table(conn, columns=None, where=None, params=()):
+    """
+    Reads many networks in one query.
+
+    Parameters:
+    conn (sqlite3.Connection): Results store connection.
+    columns (list, optional): Columns to return. Defaults to all scalar columns.
+    where (str, optional): SQL condition, e.g. 'n_nodes < ? AND delta > ?'.
+    params (tuple, optional): Parameters for the condition.
+
+    Returns:
+    pd.DataFrame: One row per matching network, ordered by graph_name.
+    """
+    columns = columns or SCALAR_COLUMNS
+    sql = f'SELECT {", ".join(columns)} FROM networks'
+    if where:
+        sql += f' WHERE {where}'
+    return pd.read_sql_query(sql + ' ORDER BY graph_name;', conn, params=params)
+
+
+def import_legacy(conn, rowdat_dir):
+    """
+    Loads per-network rowdat/*.json files written by earlier versions into the store.
+    Networks already in the store are left untouched.
+
+    Parameters:
+    conn (sqlite3.Connection): Results store connection.
+    rowdat_dir (str or Path): Folder containing the legacy JSON files.
+
+    Returns:
+    int: Number of networks imported.
+    """
+    stored = set(name for (name,) in conn.execute('SELECT graph_name FROM networks;'))
+    count = 0
+    for filename in sorted(os.listdir(rowdat_dir)):
+        if not filename.endswith('.json') or filename[:-5] in stored:
+            continue
+        with open(os.path.join(rowdat_dir, filename), 'r') as f:
+            row = json.load(f)
+        # Orbits were stored as str(list) of GAP lists, which is also valid JSON
+        zorbits = json.loads(row.get('orbits', '[]'))
+        put_row(conn, row, orbits.encode(zorbits, int(row['n_nodes'])))
+        count += 1
+    return count
+
+
+def latest_name(conn):
+    """
+    Returns the most recently written network, e.g. the single user network in the user-path store.
+
+    Parameters:
+    conn (sqlite3.Connection): Results store connection.
+
+    Returns:
+    str or None: The graph_name of the latest row, or None if the store is empty.
+    """
+    values = conn.execute('SELECT graph_name FROM networks ORDER BY updated DESC LIMIT 1;').fetchone()
+    return None if values is None else values[0]
+
+
+def merge(conn, shard_path):
+    """
+    Copies the rows of another results store, e.g. the shard of a work-queue worker (see work_queue.py), into this one.
+    Where both stores hold a network, the most recently written row is kept.
+
+    Parameters:
+    conn (sqlite3.Connection): Results store connection.
+    shard_path (str or Path): Path of the store to merge in.
+
+    Returns:
+    int: Number of rows copied.
+    """
+    columns = ', '.join(SCALAR_COLUMNS + ['orbit_ids', 'updated'])
+    conn.execute('ATTACH DATABASE ? AS shard;', (str(shard_path),))
+    try:
+        conn.execute('BEGIN IMMEDIATE;')
+        try:
+            count = conn.execute(f'''
+                INSERT OR REPLACE INTO networks ({columns})
+                SELECT {columns} FROM shard.networks AS s
+                WHERE NOT EXISTS (SELECT 1 FROM networks AS n
+                                  WHERE n.graph_name = s.graph_name AND n.updated >= s.updated);''').rowcount
+        except Exception:
+            conn.execute('ROLLBACK;')
+            raise
+        conn.execute('COMMIT;')
+    finally:
+        conn.execute('DETACH DATABASE shard;')
+    return count
@@ -0,0 +1,443 @@
+'''
+Adaptive selection of the engine that counts rho.
+
+Generators whose supports overlap are grouped into blocks; blocks with disjoint supports generate commuting subgroups,
+so the automorphism group is their direct product and, by Burnside's lemma,
+
+    rho = 2^(number of fixed nodes) * product over blocks of rho_i,
+
+where rho_i counts the binary states of the block's support up to the block's subgroup. Each block is counted by the
+fastest engine that meets the requested exactness:
+
+- 'closed-cyclic' / 'closed-dihedral': blocks generated by one permutation, or by two involutions, are counted in
+  closed form from cycle lengths, whatever their order;
+- 'closed-symmetric': blocks generating the full symmetric group S_k on their k points (twin nodes, stars) have
+  rho_i = k + 1, since a state is determined up to S_k by its number of ones;
+- 'native-enum': the block's subgroup is small enough to list every element, so rho_i is summed exactly in NumPy;
+- 'gap-polya': GAP's conjugacy classes of the block's subgroup (exact, but may not finish for large groups);
+- 'sample': the Burnside average estimated from random elements (see approx_rho.py), with a confidence interval.
+
+A group with no generators (saucy's 'generators = 0') is trivial and gets rho = 2^N directly ('trivial').
+
+The exactness modes are 'exact' (never sample), 'approximate' (never call GAP) and 'auto' (GAP for blocks whose
+order is at most GAP_MAX_LOG10_ORDER, sampling beyond). The order of the blocks left for GAP or sampling is taken from
+saucy's group size, less the orders of the blocks already counted; Schreier-Sims (see generator_reduction.py) is only
+used when that does not settle a block's order. It, the minimisation of the blocks' generating sets and the native
+enumeration all stop after the first half of the time budget, which leaves the second half for sampling. The engines
+used and the reasons for choosing them are returned with the count so they can be recorded with the results.
+'''
+
+import math
+import time
+from collections import Counter, namedtuple
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from . import permutations
+from . import approx_rho
+from . import tracing
+from . import generator_reduction
+
+# Largest subgroup enumerated element by element, and cap on elements x points x generators of the enumeration
+ENUM_MAX_ORDER = 200000
+ENUM_MAX_WORK = 100000000
+
+# Cap on points^2 x generators of the primitivity test that recognises symmetric blocks (see closed_form)
+PRIMITIVE_MAX_WORK = 1000000
+
+# In 'auto' mode, blocks whose order exceeds 10^GAP_MAX_LOG10_ORDER are sampled rather than sent to GAP
+GAP_MAX_LOG10_ORDER = 30
+
+EXACTNESS_MODES = ('exact', 'auto', 'approximate')
+
+# Count of rho for one network; log10_low/log10_high are None when the count is exact
+RhoResult = namedtuple('RhoResult', ['rho', 'log10_rho', 'log10_low', 'log10_high', 'order', 'engine', 'reason'])
+
+# One block of support-disjoint generators, restricted to and relabelled on its support
+Block = namedtuple('Block', ['support', 'generators'])
+
+
+def blocks(generators, N):
+    """
+    Splits a generating set into blocks with disjoint supports.
+
+    Parameters:
+    generators (list): Permutation arrays.
+    N (int): Number of nodes.
+
+    Returns:
+    list: Block tuples; each block's generators act on 0..len(support)-1, where local point k is node support[k].
+    """
+    generators = [g for g in generators if len(permutations.support(g))]
+    if not generators:
+        return []
+
+    # Link each generator to the nodes it moves; blocks are the connected components containing generators
+    n_gens = len(generators)
+    supports = [permutations.support(g) for g in generators]
+    rows = np.concatenate([np.full(len(s), k, dtype=np.int64) for k, s in enumerate(supports)])
+    cols = np.concatenate(supports) + n_gens
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n_gens + N, n_gens + N))
+    labels = connected_components(graph, directed=False)[1]
+
+    result = []
+    for label in np.unique(labels[:n_gens]):
+        members = np.flatnonzero(labels[:n_gens] == label)
+        support = np.unique(np.concatenate([supports[k] for k in members]))
+        local = [np.searchsorted(support, generators[k][support]) for k in members]
+        result.append(Block(support, local))
+    return result
+
+
+def enumerate_group(generators, max_order=ENUM_MAX_ORDER, deadline=None):
+    """
+    Lists every element of a permutation group by breadth-first closure.
+
+    Parameters:
+    generators (list): Permutation arrays on a common set of points.
+    max_order (int, optional): Give up once the group is known to have more elements than this.
+    deadline (float, optional): time.perf_counter() value after which to give up. Defaults to none.
+
+    Returns:
+    np.ndarray or None: The elements as rows of an (order, n) array, or None if the order exceeds max_order or the
+                        deadline passed first.
+    """
+    n = len(generators[0])
+    dtype = np.int16 if n < 2 ** 15 else np.int32
+    gens = [g.astype(dtype) for g in generators]
+    frontier = permutations.identity(n).astype(dtype)[None, :]
+    seen = {frontier[0].tobytes()}
+    elements = [frontier]
+    while len(frontier):
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
+        # multiply(h, g) = g[h] for every frontier element h and generator g; duplicates are dropped by their bytes,
+        # which is much faster than sorting the rows with np.unique
+        new = []
+        for row in np.concatenate([g[frontier] for g in gens]):
+            key = row.tobytes()
+            if key not in seen:
+                seen.add(key)
+                new.append(row)
+        if len(seen) > max_order:
+            return None
+        frontier = np.array(new, dtype=dtype).reshape(-1, n)
+        elements.append(frontier)
+    return np.concatenate(elements)
+
+
+def cycle_counts(elements):
+    """
+    Counts the cycles of many permutations at once by pointer doubling along rows.
+
+    Parameters:
+    elements (np.ndarray): (k, n) array of permutations.
+
+    Returns:
+    np.ndarray: Number of cycles (fixed points included) of every row.
+    """
+    k, n = elements.shape
+    labels = np.broadcast_to(np.arange(n), (k, n)).copy()
+    jump = elements.astype(np.int64)
+    for _ in range(max(1, n.bit_length())):
+        labels = np.minimum(labels, np.take_along_axis(labels, jump, axis=1))
+        jump = np.take_along_axis(jump, jump, axis=1)
+    return (labels == np.arange(n)).sum(axis=1)
+
+
+def burnside_exact(elements):
+    """
+    Counts binary states up to a group from the full list of its elements.
+
+    Parameters:
+    elements (np.ndarray): (order, n) array of all group elements.
+
+    Returns:
+    int: The exact number of orbits on the 2^n states.
+    """
+    values, hist = np.unique(cycle_counts(elements), return_counts=True)
+    return sum(int(h) << int(c) for c, h in zip(values, hist)) // len(elements)
+
+
+def _factorize(n):
+    # Prime factorisation by trial division; n is a cycle length, so at most the number of nodes.
+    factors = Counter()
+    p = 2
+    while p * p <= n:
+        while n % p == 0:
+            factors[p] += 1
+            n //= p
+        p += 1
+    if n > 1:
+        factors[n] += 1
+    return factors
+
+
+def _divisors_with_totient(factors):
+    # All divisors d of k = prod p^e, each paired with Euler's phi(k / d).
+    pairs = [(1, 1)]
+    for p, e in factors.items():
+        extended = []
+        for d, phi in pairs:
+            for i in range(e + 1):
+                # phi of the cofactor's p-part: p^(e-i) contributes p^(e-i-1) (p - 1) unless i == e
+                part = 1 if i == e else p ** (e - i - 1) * (p - 1)
+                extended.append((d * p ** i, phi * part))
+        pairs = extended
+    return pairs
+
+
+def _cyclic_sum(g, max_divisors=ENUM_MAX_ORDER):
+    # Burnside sum over <g> and its order, from cycle lengths: g^j has sum over cycles of gcd(j, L) cycles, which only
+    # depends on d = gcd(j, k), and phi(k / d) of the exponents j < k share each d.
+    lengths = permutations.cycle_lengths(g)
+    fixed = len(g) - int(lengths.sum())
+    values, mult = np.unique(lengths, return_counts=True)
+    factors = Counter()
+    for length in values:
+        for p, e in _factorize(int(length)).items():
+            factors[p] = max(factors[p], e)
+    if math.prod(e + 1 for e in factors.values()) > max_divisors:
+        return None
+    k = math.prod(p ** e for p, e in factors.items())
+    total = 0
+    for d, phi in _divisors_with_totient(factors):
+        cycles = fixed + sum(int(m) * math.gcd(d, int(length)) for length, m in zip(values, mult))
+        total += phi << cycles
+    return total, k
+
+
+def _primitive(generators, k):
+    # Whether a transitive group on k points is primitive: for every point b the smallest block of imprimitivity
+    # containing 0 and b (Atkinson's union-find closure) must be the whole set.
+    images = [g.tolist() for g in generators]
+    for b in range(1, k):
+        parent = list(range(k))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        parent[b] = 0
+        classes, queue = k - 1, [(0, b)]
+        for x, y in queue:
+            for g in images:
+                u, v = find(g[x]), find(g[y])
+                if u != v:
+                    parent[max(u, v)] = min(u, v)
+                    classes -= 1
+                    queue.append((u, v))
+        if classes > 1:
+            return False
+    return True
+
+
+def is_symmetric(generators):
+    """
+    Tests whether a block generates the full symmetric group on its points. Transpositions connecting every point
+    generate it; otherwise Jordan's theorem is used: a primitive group containing a transposition is symmetric, and
+    g^m is a transposition for odd m when g has one 2-cycle and otherwise odd cycles.
+
+    Parameters:
+    generators (list): Permutation arrays of the block.
+
+    Returns:
+    bool: True if the group is S_k on all k points; False if it is not, or could not be shown within
+          PRIMITIVE_MAX_WORK.
+    """
+    k = len(generators[0])
+    lengths = [permutations.cycle_lengths(g) for g in generators]
+    if int(sum(l.sum() for l in lengths)) == 0 or len(np.unique(permutations.orbit_labels(generators, k))) > 1:
+        return False
+    if all(len(l) == 1 and l[0] == 2 for l in lengths):
+        return True
+    if not any(np.count_nonzero(l == 2) == 1 and np.count_nonzero(l % 2 == 0) == 1 for l in lengths):
+        return False
+    return k * k * len(generators) <= PRIMITIVE_MAX_WORK and _primitive(generators, k)
+
+
+def closed_form(generators):
+    """
+    Counts a block in closed form when it is cyclic (one generator), dihedral (two involutions) or the full symmetric
+    group on its points.
+
+    Parameters:
+    generators (list): Permutation arrays of the block.
+
+    Returns:
+    tuple or None: rho, the group order and the engine name, or None if no closed form applies.
+    """
+    if len(generators) == 1:
+        counted = _cyclic_sum(generators[0])
+        if counted is None:
+            return None
+        total, k = counted
+        return total // k, k, 'closed-cyclic'
+
+    if len(generators) == 2 and all(permutations.order(g) == 2 for g in generators):
+        # <a, b> is dihedral of order 2n with n the order of the rotation r = ab; its reflections are r^j a
+        a, b = generators
+        r = permutations.multiply(a, b)
+        counted = _cyclic_sum(r)
+        if counted is None or counted[1] * len(r) > ENUM_MAX_WORK:
+            return None
+        total, n = counted
+        reflection = a
+        for _ in range(n):
+            total += 1 << permutations.cycle_count(reflection)
+            reflection = permutations.multiply(r, reflection)
+        return total // (2 * n), 2 * n, 'closed-dihedral'
+
+    if is_symmetric(generators):
+        k = len(generators[0])
+        return k + 1, math.factorial(k), 'closed-symmetric'
+    return None
+
+
+def trivial_result(N):
+    """
+    Returns the count for a network with a trivial automorphism group, without looking at any generators.
+
+    Parameters:
+    N (int): Number of nodes.
+
+    Returns:
+    RhoResult: rho = 2^N, group order 1.
+    """
+    return RhoResult(1 << N, N * approx_rho.LOG10_2, None, None, 1, 'trivial', 'no generators: every state is its own orbit')
+
+
+def select_engine(n_points, n_generators, log10_order, exactness, gap_available):
+    """
+    Chooses the engine for a block that is too large to enumerate.
+
+    Parameters:
+    n_points (int): Size of the block's support.
+    n_generators (int): Number of generators of the block.
+    log10_order (float or None): Estimated log10 of the block's order, if known.
+    exactness (str): One of EXACTNESS_MODES.
+    gap_available (bool): Whether a GAP counting function was supplied.
+
+    Returns:
+    tuple: The engine name and the reason it was chosen.
+    """
+    size = f"{n_points} points, {n_generators} generators"
+    order_text = f"order ~10^{log10_order:.1f}" if log10_order is not None else "order unknown"
+    if exactness == 'approximate':
+        return 'sample', f"{size}, {order_text}, approximate counts requested"
+    if exactness == 'exact':
+        if not gap_available:
+            raise ValueError(f"Exact count needs GAP for a block of {size} ({order_text}).")
+        return 'gap-polya', f"{size}, {order_text}, exact count requested"
+    if gap_available and log10_order is not None and log10_order <= GAP_MAX_LOG10_ORDER:
+        return 'gap-polya', f"{size}, {order_text} within GAP limit 10^{GAP_MAX_LOG10_ORDER}"
+    if not gap_available:
+        return 'sample', f"{size}, {order_text}, GAP unavailable"
+    return 'sample', f"{size}, {order_text} beyond GAP limit 10^{GAP_MAX_LOG10_ORDER}"
+
+
+@tracing.traced()
+def count_rho(generators, N, exactness='auto', log10_order=None, gap_count=None, time_budget=10.0,
+              minimise=False):
+    """
+    Counts rho with the fastest engine per block that meets the requested exactness.
+
+    Parameters:
+    generators (list): Permutation arrays generating the automorphism group.
+    N (int): Number of nodes.
+    exactness (str, optional): 'exact', 'auto' or 'approximate'. Defaults to 'auto'.
+    log10_order (float, optional): log10 of the whole group's order (e.g. from the saucy log), which gives the order
+                                   of the blocks left for GAP or sampling.
+    gap_count (callable, optional): gap_count(zin, n) returning (rho, order) for the group with GAP generator line zin
+                                    on n points. Without it GAP is never used.
+    time_budget (float, optional): Seconds for Schreier-Sims, minimisation and the sampled blocks (GAP is limited by
+                                   its worker pool instead). Defaults to 10.
+    minimise (bool, optional): Minimise the generating sets of blocks handed to GAP or sampling with Schreier-Sims
+                               (see generator_reduction.py). Defaults to False.
+
+    Returns:
+    RhoResult: rho (an integer, exact unless sampled), its log10 and interval, the group order (None when a
+               block's order was only known from saucy's group size), the engines used and the reasons.
+    """
+    if exactness not in EXACTNESS_MODES:
+        raise ValueError(f"Unknown exactness '{exactness}', expected one of {EXACTNESS_MODES}.")
+    # Enumeration, Schreier-Sims and minimisation stop after half the time budget; sampling gets the rest
+    start = time.perf_counter()
+    deadline = start + time_budget / 2
+
+    parts = blocks(generators, N)
+    if not parts:
+        return trivial_result(N)
+    fixed = N - sum(len(block.support) for block in parts)
+    rho, log10_rho = 1 << fixed, fixed * approx_rho.LOG10_2
+    interval = [log10_rho, log10_rho]
+    order = 1
+    engines, reasons, pending = [], [f"{len(parts)} blocks, {fixed} fixed nodes"], []
+
+    # Count cyclic and dihedral blocks in closed form and enumerate the other small blocks natively
+    for block in parts:
+        counted = closed_form(block.generators)
+        if counted is None:
+            # The closure gives up early, so trying costs at most ENUM_MAX_WORK even for huge blocks
+            max_order = min(ENUM_MAX_ORDER, ENUM_MAX_WORK // (len(block.support) * len(block.generators)))
+            elements = enumerate_group(block.generators, max(max_order, 1), deadline)
+            if elements is None:
+                pending.append(block)
+                continue
+            counted = burnside_exact(elements), len(elements), 'native-enum'
+        block_rho, block_order, engine = counted
+        rho *= block_rho
+        log10_rho += math.log10(block_rho)
+        interval = [value + math.log10(block_rho) for value in interval]
+        order *= block_order
+        engines.append(engine)
+    if engines:
+        counts = Counter(engines)
+        reasons.append(', '.join(f"{n} {engine}" for engine, n in sorted(counts.items())) + f" blocks (order {order})")
+
+    # The remaining blocks share what is left of saucy's group size: that is the order of a single remaining block, and
+    # bounds each of several. Only when it does not settle a block's order is a stabiliser chain tried, and both it
+    # and the minimisation of the generating sets give up after half the time budget
+    remaining = log10_order - math.log10(order) if log10_order is not None else None
+    sampled = []
+    for block in pending:
+        n = len(block.support)
+        block = Block(block.support, generator_reduction.reduce_generators(block.generators, n, minimise, deadline))
+        block_order, block_log10 = None, remaining if len(pending) == 1 else None
+        if block_log10 is None:
+            chain = generator_reduction.schreier_sims(block.generators, n, deadline)
+            if chain is not None:
+                block_order = generator_reduction.group_order(chain)
+                block_log10 = math.log10(block_order)
+            else:
+                block_log10 = remaining
+        engine, reason = select_engine(n, len(block.generators), block_log10, exactness, gap_count is not None)
+        engines.append(engine)
+        reasons.append(reason)
+        if engine == 'gap-polya':
+            block_rho, block_order = (int(value) for value in gap_count(permutations.to_gap(block.generators), n))
+            rho *= block_rho
+            log10_rho += math.log10(block_rho)
+            interval = [value + math.log10(block_rho) for value in interval]
+        else:
+            sampled.append((block, block_log10))
+        order = order * block_order if order is not None and block_order is not None else None
+
+    # The sampled blocks share what is left of the time budget, at least its second half
+    share = max(start + time_budget - time.perf_counter(), time_budget / 2) / max(len(sampled), 1)
+    for block, block_log10 in sampled:
+        estimate = approx_rho.estimate_rho(block.generators, len(block.support), log10_order=block_log10,
+                                           time_budget=share)
+        rho *= estimate.rho
+        log10_rho += estimate.log10_rho
+        interval = [interval[0] + estimate.log10_low, interval[1] + estimate.log10_high]
+
+    if log10_order is not None and order is not None and abs(log10_order - math.log10(order)) > 1e-3:
+        reasons.append(f"saucy group size 10^{log10_order:.3f} differs from computed order {order}")
+    low, high = (interval if sampled else (None, None))
+    engine = '+'.join(sorted(set(engines))) or 'native-enum'
+    return RhoResult(rho, log10_rho, low, high, order, engine, '; '.join(reasons))
@@ -0,0 +1,103 @@
+'''
+Machine-readable ledger of networks that could not be lumped within their budget.
+
+The ledger is a JSON file keyed by network stub. Each entry records why the job was stopped ('timeout', 'memory',
+'crashed' or 'failed'), how long it ran, its peak resident memory, the budgets in force and the engine used. A network
+in the ledger is skipped by later batch runs until the budget it exceeded is raised or the engine changes, and it is
+removed from the ledger as soon as it completes. This replaces hand-maintaining skipped_networks.txt, which is still
+honoured for networks that should never be attempted.
+'''
+
+import os
+import json
+import time
+
+
+def read_ledger(ledger_path):
+    """
+    Reads the skip ledger.
+
+    Parameters:
+    ledger_path (str): Path to the ledger JSON file.
+
+    Returns:
+    dict: Ledger entries keyed by network stub; empty if the file does not exist or is unreadable.
+    """
+    try:
+        with open(ledger_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        print(f"Skip ledger {ledger_path} is corrupted. Starting a new ledger.")
+        return {}
+
+
+def write_ledger(ledger_path, ledger):
+    """
+    Writes the skip ledger atomically so an interrupted batch never leaves a truncated file behind.
+
+    Parameters:
+    ledger_path (str): Path to the ledger JSON file.
+    ledger (dict): Ledger entries keyed by network stub.
+    """
+    tmp_path = ledger_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(ledger, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, ledger_path)
+    return
+
+
+def make_entry(reason, elapsed, peak_rss, time_budget, mem_budget, engine, detail=''):
+    """
+    Builds a ledger entry for a network that exceeded its budget or failed.
+
+    Parameters:
+    reason (str): 'timeout', 'memory', 'crashed' or 'failed'.
+    elapsed (float): Wall-clock seconds the job ran for.
+    peak_rss (int or None): Peak resident memory of the job in bytes, if known.
+    time_budget (float): Wall-clock budget in force, in seconds (0 means unlimited).
+    mem_budget (int): Memory budget in force, in bytes (0 means unlimited).
+    engine (str): Name of the engine used to compute rho.
+    detail (str, optional): Free-text detail such as the last line of a traceback.
+
+    Returns:
+    dict: The ledger entry.
+    """
+    return {
+        'reason'      : reason,
+        'elapsed_s'   : round(elapsed, 3),
+        'peak_rss'    : peak_rss,
+        'time_budget' : time_budget,
+        'mem_budget'  : mem_budget,
+        'engine'      : engine,
+        'detail'      : detail,
+        'recorded'    : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+
+def _raised(old, new):
+    # A budget counts as raised if it is now unlimited (0) or larger than before.
+    return (not new and old) or (new and old and new > old)
+
+
+def should_retry(entry, time_budget, mem_budget, engine):
+    """
+    Decides whether a network in the ledger is worth attempting again.
+
+    Parameters:
+    entry (dict): The ledger entry for the network.
+    time_budget (float): Current wall-clock budget in seconds (0 means unlimited).
+    mem_budget (int): Current memory budget in bytes (0 means unlimited).
+    engine (str): Name of the current rho engine.
+
+    Returns:
+    bool: True if the engine has changed or the budget the network exceeded has been raised.
+    """
+    if entry.get('engine') != engine:
+        return True
+    if entry.get('reason') == 'timeout':
+        return bool(_raised(entry.get('time_budget'), time_budget))
+    if entry.get('reason') == 'memory':
+        return bool(_raised(entry.get('mem_budget'), mem_budget))
+    return False
@@ -0,0 +1,265 @@
+'''
+Snapshot mode for temporal networks.
+
+A temporal edge list carries a fourth 'timestamps' column (sources, targets, weights, timestamps, as read by
+processing.build_net). Instead of one pipeline run per snapshot, the edge list is sliced into time windows and the
+snapshots are processed in order, carrying state from one to the next:
+
+- a snapshot whose edge set equals the previous one reuses its generators, orbit partition and counts outright;
+- otherwise saucy runs on the snapshot, and rho is assembled from the support-disjoint blocks of the generators (see
+  rho_engines.blocks), whose counts are cached by the block's content. Blocks away from the changed edges usually come
+  back with the same generators, so only blocks touched by the changes are counted again.
+
+All snapshots share the node set of the whole temporal network, so their partitions are directly comparable. Nodes
+without edges in a window are interchangeable: they form one orbit, acted on by the full symmetric group, and their k
+states count up to it as k + 1 (the number of them in state 1). They are therefore left out of the snapshot handed to
+saucy, whose .scy, .gaut and .log files cover the active nodes only, numbered in order, and the factor is multiplied
+back in. As the inactive set changes from window to window, this also keeps it out of the block cache. Rows use the
+results store format, named '<stub>@<window start>', and go to a store of their own.
+'''
+
+import os
+import math
+import hashlib
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from . import orbits
+from . import config
+from . import permutations
+from . import edge_orbits
+from . import approx_rho
+from . import rho_engines
+from . import results_store
+
+# Get the current file path and set the base path for data processing
+CURRENT_FILE_PATH = Path(__file__).resolve()
+BASE_PATH = CURRENT_FILE_PATH.parents[1]
+
+lumpsout_path = BASE_PATH / 'data' / 'processed' / 'lumping_output'
+temporal_path = BASE_PATH / 'data' / 'processed' / 'temporal_output'
+
+
+def read_temporal(input_file):
+    """
+    Reads a temporal edge list.
+
+    Parameters:
+    input_file (str or Path): Whitespace-separated file with 1-indexed sources and targets, weights and timestamps.
+
+    Returns:
+    tuple: The number of nodes, an (M, 2) array of 0-indexed edges and the timestamp of every edge.
+    """
+    data = np.loadtxt(str(input_file), ndmin=2)
+    if data.shape[1] < 4:
+        raise ValueError(f"{input_file} has no timestamps column (expected sources, targets, weights, timestamps).")
+    edges = data[:, :2].astype(np.int64) - 1  # shift to 0-indexed nodes, as processing.shift_nodes
+    return int(edges.max()) + 1 if len(edges) else 0, edges, data[:, 3]
+
+
+def windows(times, window, step=None):
+    """
+    Returns the start times of the snapshot windows covering a set of timestamps.
+
+    Parameters:
+    times (np.ndarray): Edge timestamps.
+    window (float): Length of each window.
+    step (float, optional): Distance between window starts. Defaults to the window length.
+
+    Returns:
+    np.ndarray: Window start times; snapshot k holds the edges with start <= t < start + window.
+    """
+    step = step or window
+    if len(times) == 0:
+        return np.zeros(0)
+    return np.arange(times.min(), times.max() + step / 2, step)
+
+
+def write_scy(scy_path, edges, N):
+    """
+    Writes a snapshot in .scy format.
+
+    Parameters:
+    scy_path (str or Path): Output path.
+    edges (np.ndarray): Canonical edges (see edge_orbits.canonical_edges).
+    N (int): Number of nodes.
+    """
+    with open(scy_path, 'w') as f:
+        f.write(f"{N} {len(edges)} 1\n")
+        np.savetxt(f, edges, fmt='%d')
+    return
+
+
+def run_saucy(scy_path):
+    """
+    Runs saucy on a .scy file, as auts.main does.
+
+    Parameters:
+    scy_path (str or Path): The network in .scy format.
+
+    Returns:
+    tuple: The generator (.gaut) text and the log text.
+    """
+    p = subprocess.Popen([config.SAUCY_PATH, '-s', str(scy_path)], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, error = p.communicate()
+    return output.decode("utf-8"), error.decode("utf-8")
+
+
+def _block_key(block):
+    # Content key of a block: its support and its generators in a fixed order.
+    digest = hashlib.blake2b(np.asarray(block.support, dtype=np.int64).tobytes(), digest_size=16)
+    for g in sorted(np.asarray(g, dtype=np.int64).tobytes() for g in block.generators):
+        digest.update(g)
+    return digest.hexdigest()
+
+
+def count_blocks(generators, N, block_cache, exactness='auto', inactive=0, gap_count=None):
+    """
+    Counts rho block by block, reusing the counts of blocks seen in earlier snapshots.
+
+    Parameters:
+    generators (list): Permutation arrays generating the snapshot's automorphism group on its active nodes.
+    N (int): Number of nodes.
+    block_cache (dict): Block key -> RhoResult of the block, updated in place.
+    exactness (str, optional): As for rho_engines.count_rho. Defaults to 'auto'.
+    inactive (int, optional): Number of nodes without edges, which the generators fix. Any permutation of them is an
+                              automorphism too, so they contribute a factor k + 1 rather than 2^k. Defaults to 0.
+    gap_count (callable, optional): GAP counting function for blocks too large to enumerate, as for
+                                    rho_engines.count_rho; exact mode needs it for such blocks.
+
+    Returns:
+    tuple: The RhoResult of the snapshot and the number of blocks reused.
+    """
+    parts = rho_engines.blocks(generators, N)
+    if not parts and not inactive:
+        return rho_engines.trivial_result(N), 0
+    fixed = N - inactive - sum(len(block.support) for block in parts)
+    rho = (1 << fixed) * (inactive + 1)
+    log10_rho = fixed * approx_rho.LOG10_2 + math.log10(inactive + 1)
+    order = math.factorial(inactive)
+    interval = [log10_rho, log10_rho]
+    engines, sampled, reused = {'closed-symmetric'} if inactive > 1 else set(), False, 0
+    for block in parts:
+        key = _block_key(block)
+        if key in block_cache:
+            reused += 1
+        else:
+            block_cache[key] = rho_engines.count_rho(block.generators, len(block.support), exactness,
+                                                     gap_count=gap_count,
+                                                     time_budget=config.APPROX_TIME_BUDGET / len(parts),
+                                                     minimise=config.MINIMISE_GENERATORS)
+        result = block_cache[key]
+        rho *= result.rho
+        log10_rho += result.log10_rho
+        order = order * result.order if order is not None and result.order is not None else None
+        sampled = sampled or result.log10_low is not None
+        interval[0] += result.log10_low if result.log10_low is not None else result.log10_rho
+        interval[1] += result.log10_high if result.log10_high is not None else result.log10_rho
+        engines.update(result.engine.split('+'))
+    low, high = interval if sampled else (None, None)
+    reason = (f"{len(parts)} blocks, {fixed} fixed nodes, {inactive} inactive nodes, {reused} blocks reused from "
+              f"earlier snapshots")
+    return rho_engines.RhoResult(rho, log10_rho, low, high, order, '+'.join(sorted(engines)), reason), reused
+
+
+def process_snapshots(stub, edges, times, N, window, step=None, out_folder=temporal_path, exactness='auto',
+                      gap_count=None):
+    """
+    Lumps the snapshots of a temporal network in order, reusing results between consecutive snapshots.
+
+    Parameters:
+    stub (str): Network stub.
+    edges (np.ndarray): (M, 2) array of 0-indexed edges.
+    times (np.ndarray): Timestamp of every edge.
+    N (int): Number of nodes of the whole temporal network.
+    window (float): Length of each snapshot window.
+    step (float, optional): Distance between window starts. Defaults to the window length.
+    out_folder (str or Path, optional): Folder for the snapshot .scy, .gaut and .log files.
+    exactness (str, optional): As for rho_engines.count_rho. Defaults to 'auto'.
+    gap_count (callable, optional): GAP counting function for blocks too large to enumerate (see count_blocks).
+
+    Returns:
+    list: (row, ids) for every snapshot, where row is in the results store format.
+    """
+    os.makedirs(str(out_folder), exist_ok=True)
+    block_cache, previous, results = {}, None, []
+    for start in windows(times, window, step):
+        snapshot = edge_orbits.canonical_edges(edges[(times >= start) & (times < start + window)], N)
+        name = f"{stub}@{start:g}"
+        if previous is not None and np.array_equal(snapshot, previous[0]):
+            generators, ids, result = previous[1:]
+            result = result._replace(reason=result.reason + '; edge set unchanged, snapshot reused')
+        else:
+            # saucy sees the active nodes only, relabelled 0..len(active)-1; its generators are lifted back to all nodes
+            active = np.unique(snapshot)
+            inactive = np.setdiff1d(np.arange(N), active)
+            generators = []
+            if len(active):
+                base = os.path.join(str(out_folder), name)
+                write_scy(base + '.scy', np.searchsorted(active, snapshot), len(active))
+                gaut, log = run_saucy(base + '.scy')
+                for suffix, text in (('.gaut', gaut), ('.log', log)):
+                    with open(base + suffix, 'w') as f:
+                        f.write(text)
+                for g in permutations.parse_gaut(gaut, len(active)):
+                    lifted = np.arange(N)
+                    lifted[active] = active[g]
+                    generators.append(lifted)
+            result = count_blocks(generators, N, block_cache, exactness, len(inactive), gap_count)[0]
+            labels = permutations.orbit_labels(generators, N)
+            if len(inactive):
+                labels[inactive] = labels[inactive[0]]  # the inactive nodes are one orbit
+            ids = orbits.canonical(labels)
+        previous = (snapshot, generators, ids, result)
+
+        M = len(snapshot)
+        delta = round(N * math.log10(M) / result.log10_rho) if M > 0 and result.log10_rho > 0 else float('inf')
+        row = {
+            'graph_name'     : name,
+            'n_nodes'        : N,
+            'M_edges'        : M,
+            'aut_grp_order'  : result.order if result.order is not None else -1,
+            'rho'            : result.rho,
+            'log10_rho'      : result.log10_rho,
+            'log10_rho_low'  : result.log10_low,
+            'log10_rho_high' : result.log10_high,
+            'delta'          : delta,
+            'orbits'         : str(orbits.decode(ids)),
+            'engine_reason'  : result.reason,
+            'engine'         : result.engine,
+            }
+        results.append((row, ids))
+    return results
+
+
+def main():
+    """
+    Lumps the user network snapshot by snapshot when it has timestamps and DSDP_TEMPORAL_WINDOW is set. In exact mode
+    (config.LUMPING_EXACTNESS) blocks too large to enumerate are counted by GAP, which is only started then.
+    """
+    input_dir = BASE_PATH / 'data' / 'external' / '5_user_data'
+    input_file = list(input_dir.glob('*.*'))[0]
+    N, edges, times = read_temporal(input_file)
+
+    gap_count = None
+    if config.LUMPING_EXACTNESS == 'exact':
+        from .lumping import gap_polya as gap_count  # imports gappy, which starts GAP
+
+    store = results_store.connect(lumpsout_path / 'temporal.sqlite')
+    try:
+        for row, ids in process_snapshots(input_file.stem, edges, times, N, config.TEMPORAL_WINDOW,
+                                          config.TEMPORAL_STEP, exactness=config.LUMPING_EXACTNESS,
+                                          gap_count=gap_count):
+            results_store.put_row(store, row, ids, engine=row.pop('engine'))
+            orbits.save_partition(lumpsout_path / 'orbits', row['graph_name'], ids)
+            print(f"{row['graph_name']}: {row['M_edges']} edges, rho ~10^{row['log10_rho']:.1f}, "
+                  f"{row['engine_reason']}")
+    finally:
+        store.close()
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+'''
+Pipeline tracing.
+
+With DSDP_TRACE set to a folder, every pipeline stage and a few hot functions (saucy runs, readautomorphismgroup,
+scy_formatting, norbits, polya_enum and the rho engines) are timed. A span records
+
+- wall time and the CPU time of the process,
+- the CPU time of child processes reaped during the span (saucy runs as a child process; spans that overlap in one
+  process, like the concurrent saucy runs of the overlapped batch, share it),
+- the resident memory at the end of the span and the peak resident memory of the process so far,
+
+together with the network it belongs to, which nested spans inherit from the enclosing one (also across asyncio
+tasks). Every process, including the spawned GAP workers, appends its spans to trace-<pid>.jsonl in the folder as they
+finish, so a killed worker keeps the spans it completed. export merges them into
+
+- trace.json, in the Chrome trace-event format (open it in chrome://tracing or https://ui.perfetto.dev), and
+- summary.csv, with the count, total times and peak memory of every (network, span) pair,
+
+so a slow batch can be profiled after the fact. Trace files are appended to, so point DSDP_TRACE at a fresh folder
+to trace a single run. Without DSDP_TRACE, span and traced cost a single check.
+'''
+
+import os
+import csv
+import json
+import glob
+import time
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # resource is POSIX only; child-process usage and peak memory are not recorded elsewhere
+    resource = None
+
+from . import config
+from .gap_pool import rss_bytes
+
+# Network of the innermost open span, inherited by nested spans
+_network = contextvars.ContextVar('network', default=None)
+
+_lock = threading.Lock()
+
+# Columns of summary.csv
+SUMMARY_COLUMNS = ['network', 'name', 'category', 'count', 'wall_s', 'cpu_s', 'child_cpu_s', 'peak_rss_mb']
+
+
+def enabled():
+    """
+    Returns whether tracing is on, i.e. whether config.TRACE_DIR is set.
+
+    Returns:
+    bool: True if spans are recorded.
+    """
+    return bool(config.TRACE_DIR)
+
+
+def _usage():
+    # CPU time of the process and of its reaped children, and the peak resident memory of the process in bytes.
+    if resource is None:
+        return time.process_time(), 0.0, None
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kilobytes on Linux
+    return time.process_time(), children.ru_utime + children.ru_stime, peak
+
+
+def _emit(event):
+    # Append a finished span to this process's trace file.
+    os.makedirs(config.TRACE_DIR, exist_ok=True)
+    line = json.dumps(event) + '\n'
+    with _lock:
+        with open(os.path.join(config.TRACE_DIR, f"trace-{os.getpid()}.jsonl"), 'a') as f:
+            f.write(line)
+    return
+
+
+@contextmanager
+def span(name, network=None, category='function', **args):
+    """
+    Times a block of code.
+
+    Parameters:
+    name (str): Span name, e.g. the stage or function name.
+    network (str, optional): Network the work belongs to. Defaults to the network of the enclosing span.
+    category (str, optional): 'stage' or 'function'. Defaults to 'function'.
+    **args: Extra values recorded with the span.
+    """
+    if not enabled():
+        yield
+        return
+    network = network or _network.get()
+    token = _network.set(network)
+    start_wall, start_time = time.perf_counter(), time.time()
+    start_cpu, start_children, _ = _usage()
+    status = 'done'
+    try:
+        yield
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        _network.reset(token)
+        end_cpu, end_children, peak = _usage()
+        _emit({
+            'name'  : name,
+            'cat'   : category,
+            'ph'    : 'X',
+            'ts'    : int(start_time * 1e6),
+            'dur'   : int((time.perf_counter() - start_wall) * 1e6),
+            'pid'   : os.getpid(),
+            'tid'   : threading.get_ident(),
+            'args'  : dict(args, network=network, status=status, cpu_s=end_cpu - start_cpu,
+                           child_cpu_s=end_children - start_children, rss=rss_bytes(os.getpid()), peak_rss=peak),
+            })
+
+
+def traced(name=None, category='function'):
+    """
+    Decorates a function so every call runs in a span.
+
+    Parameters:
+    name (str, optional): Span name. Defaults to the function name.
+    category (str, optional): 'stage' or 'function'. Defaults to 'function'.
+
+    Returns:
+    callable: The decorator.
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with span(name or func.__name__, category=category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def read_events(trace_dir=None):
+    """
+    Reads the spans recorded by every process.
+
+    Parameters:
+    trace_dir (str, optional): Trace folder. Defaults to config.TRACE_DIR.
+
+    Returns:
+    list: Chrome trace events, ordered by start time.
+    """
+    events = []
+    for path in sorted(glob.glob(os.path.join(trace_dir or config.TRACE_DIR, 'trace-*.jsonl'))):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # A line cut short by a killed process
+    return sorted(events, key=lambda event: event['ts'])
+
+
+def summarise(events):
+    """
+    Sums spans by network and name.
+
+    Parameters:
+    events (list): Chrome trace events from read_events.
+
+    Returns:
+    list: One dictionary per (network, name) with the columns in SUMMARY_COLUMNS.
+    """
+    rows = {}
+    for event in events:
+        args = event['args']
+        key = (args.get('network') or '', event['name'])
+        row = rows.setdefault(key, {'network': key[0], 'name': key[1], 'category': event['cat'], 'count': 0,
+                                    'wall_s': 0.0, 'cpu_s': 0.0, 'child_cpu_s': 0.0, 'peak_rss_mb': 0.0})
+        row['count'] += 1
+        row['wall_s'] += event['dur'] / 1e6
+        row['cpu_s'] += args['cpu_s']
+        row['child_cpu_s'] += args['child_cpu_s']
+        row['peak_rss_mb'] = max(row['peak_rss_mb'], (args.get('peak_rss') or args.get('rss') or 0) / 2**20)
+    return [rows[key] for key in sorted(rows)]
+
+
+def export(trace_dir=None):
+    """
+    Writes trace.json and summary.csv from the spans recorded so far; does nothing when tracing is off.
+
+    Parameters:
+    trace_dir (str, optional): Trace folder. Defaults to config.TRACE_DIR.
+
+    Returns:
+    list or None: The summary rows, or None when tracing is off.
+    """
+    trace_dir = trace_dir or config.TRACE_DIR
+    if not trace_dir:
+        return None
+    events = read_events(trace_dir)
+    with open(os.path.join(trace_dir, 'trace.json'), 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    rows = summarise(events)
+    with open(os.path.join(trace_dir, 'summary.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({column: round(value, 6) if isinstance(value, float) else value
+                             for column, value in row.items()})
+    print(f"Trace of {len(events)} spans written to {trace_dir}")
+    return rows
@@ -0,0 +1,416 @@
+'''
+Differential verification of the lumping engines against GAP.
+
+Every engine that computes a quantity of the lumping stage is run on the same permutation groups and compared with a
+reference:
+
+- orbits: GAP's Orbits ('gap'), the union-find over generator edges ('native', permutations.orbit_labels) and the
+  columns of the enumerated group ('native-enum');
+- order: GAP's Size ('gap'), Schreier-Sims ('schreier-sims', see generator_reduction.py) and the enumerated group
+  ('native-enum');
+- rho: GAP's conjugacy classes with Polya enumeration ('gap-polya', batch_lumping.polya_enum), the block engines of
+  rho_engines.count_rho without GAP ('rho-engines'), Burnside's lemma over the enumerated group ('native-enum') and
+  random sampling ('sample', see approx_rho.py);
+- edges: the edge permutations of edge_orbits.py ('edge-orbits'), which must map the edge set of the network saucy
+  read onto itself under every generator ('scy').
+
+The reference of a quantity is GAP when it finished and native-enum otherwise; groups too large to enumerate that GAP
+did not finish are reported as unchecked. Exact engines must equal the reference ('match' or 'mismatch'); sampled
+counts, including rho-engines when it sampled a block, must contain it in their confidence interval ('within' or
+'outside', which happens for about 1 - confidence of the groups). The enumeration time of native-enum is counted
+towards each of its quantities. Edges are checked for the networks whose .scy file is at hand: the corpus networks in
+the batch input folder (scy_path) and the user networks of data/processed with their saucy generators.
+
+Groups are read from the .gap files of the batch corpus (data/interim/batch_gap_output, or the shipped GAP archive
+through archive.py) and drawn at random (random_group). GAP runs in the worker pool of gap_pool.py, one job per group
+under GAP_TIME_LIMIT, so a group that GAP cannot finish is reported with its pool status ('timeout', 'memory', ...)
+instead of stalling the run. Without gappy the native engines are checked against native-enum only.
+
+Every check is written to reports/verification/checks.csv, and the per-engine summary (groups checked, mismatches,
+seconds and the speedup over the reference on the same groups) to reports/verification/summary.csv and printed.
+'''
+
+import os
+import re
+import math
+import time
+import importlib.util
+from pathlib import Path
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from . import orbits
+from . import archive
+from . import quotient
+from . import edge_orbits
+from . import permutations
+from . import approx_rho
+from . import rho_engines
+from . import generator_reduction
+from .gap_pool import GapPool
+
+# Get the current file path and set the base path for data processing
+CURRENT_FILE_PATH = Path(__file__).resolve()
+BASE_PATH = CURRENT_FILE_PATH.parents[1]
+
+corpus_path = BASE_PATH / 'data' / 'interim' / 'batch_gap_output'
+report_path = BASE_PATH / 'reports' / 'verification'
+
+# Networks saucy read in the batch (see batch_auts.py), and the user network with its saucy output
+scy_path = BASE_PATH / 'data' / 'external' / '1_network_data' / 'networkrepository'
+user_scy_path = BASE_PATH / 'data' / 'processed' / 'processing_output'
+user_saucy_path = BASE_PATH / 'data' / 'processed' / 'saucy_output'
+
+# Wall-clock seconds GAP may spend on one group
+GAP_TIME_LIMIT = float(os.environ.get('DSDP_VERIFY_GAP_TIME', 60))
+
+# Seconds of sampling for the 'sample' engine and for blocks that rho-engines samples
+SAMPLE_TIME_BUDGET = 1.0
+
+# Number of random groups checked alongside the corpus, and the range of their number of points
+RANDOM_GROUPS = 50
+RANDOM_POINTS = (6, 40)
+
+# log10 slack when checking that a sampled interval contains the reference
+LOG10_TOLERANCE = 1e-9
+
+QUANTITIES = ['orbits', 'order', 'rho']
+
+# A permutation group to verify: its name, number of points and generators (0-indexed permutation arrays)
+Group = namedtuple('Group', ['name', 'N', 'generators'])
+
+# Outcome of one engine on one group; reference_seconds is the reference engine's time for the same quantity
+Check = namedtuple('Check', ['group', 'N', 'quantity', 'engine', 'reference', 'status', 'seconds', 'reference_seconds',
+                             'value', 'detail'])
+
+
+def gap_available():
+    """
+    Returns whether gappy can be imported, i.e. whether the GAP engines can run.
+
+    Returns:
+    bool: True if gappy is installed.
+    """
+    return importlib.util.find_spec('gappy') is not None
+
+
+def corpus_groups(directory=corpus_path, limit=None):
+    """
+    Reads the automorphism groups of the batch corpus.
+
+    Parameters:
+    directory (str or Path, optional): Folder of .gap files, or a folder inside a zip archive. Defaults to
+        corpus_path.
+    limit (int, optional): Read only the first limit files (in name order).
+
+    Returns:
+    list: Group tuples named after the networks.
+    """
+    groups = []
+    for path in archive.list_files(str(directory), '.gap')[:limit]:
+        with archive.open_text(path) as f:
+            lines = f.read().splitlines()
+        N = int(re.search(r'N:=(\d+)', lines[0]).group(1))
+        groups.append(Group(Path(path).stem, N, permutations.parse_gap_generators(lines[1], N)))
+    return groups
+
+
+def user_groups():
+    """
+    Reads the automorphism groups of the user networks from their saucy output.
+
+    Returns:
+    list: Group tuples named after the networks, one per .scy file of user_scy_path with a .gaut file.
+    """
+    groups = []
+    for scy in sorted(user_scy_path.glob('*.scy')):
+        gaut = user_saucy_path / (scy.stem + '.gaut')
+        if gaut.exists():
+            N = quotient.read_scy(scy)[0]
+            groups.append(Group(scy.stem, N, permutations.parse_gaut(gaut.read_text(), N)))
+    return groups
+
+
+def random_group(seed):
+    """
+    Draws a random permutation group: one to three generators, each a product of disjoint cycles of length 2 to 4 on
+    random points, which gives cyclic, direct product, wreath-like and full symmetric groups.
+
+    Parameters:
+    seed (int): Seed of the group.
+
+    Returns:
+    Group: The group, named 'random-<seed>'.
+    """
+    rng = np.random.default_rng(seed)
+    N = int(rng.integers(*RANDOM_POINTS))
+    generators = []
+    for _ in range(int(rng.integers(1, 4))):
+        points = rng.permutation(N)[:int(rng.integers(2, N // 2 + 1))]
+        cycles, start = [], 0
+        while start < len(points) - 1:
+            length = int(rng.integers(2, 5))
+            cycles.append(list(points[start:start + length]))
+            start += length
+        generators.append(permutations.from_cycles([cycle for cycle in cycles if len(cycle) > 1], N))
+    return Group(f"random-{seed}", N, generators)
+
+
+def gap_engines(zin, N):
+    """
+    Computes the orbits, order and rho of a group with GAP; run in a GAP worker (see gap_pool.py).
+
+    Parameters:
+    zin (str): GAP generator line, e.g. 'z:=[(1,2),(3,4)];'.
+    N (int): Number of points.
+
+    Returns:
+    dict: Quantity -> (value, seconds); orbits are lists of 1-indexed points as returned by gap.Orbits.
+    """
+    from . import batch_lumping  # imports gappy, so only GAP workers load it
+    gap = batch_lumping.gap
+
+    gap.eval(zin)
+    G = gap.eval('zgroup:=GroupWithGenerators(z);')
+    values = {}
+    start = time.perf_counter()
+    values['orbits'] = ([[int(point) for point in orbit] for orbit in gap.Orbits(G)], time.perf_counter() - start)
+    start = time.perf_counter()
+    values['order'] = (int(gap.Size(G)), time.perf_counter() - start)
+    start = time.perf_counter()
+    values['rho'] = (int(batch_lumping.polya_enum(G, N)), time.perf_counter() - start)
+    return values
+
+
+def run_gap(groups, time_limit=GAP_TIME_LIMIT):
+    """
+    Runs the GAP engines on every group in the GAP worker pool.
+
+    Parameters:
+    groups (list): Group tuples.
+    time_limit (float, optional): Seconds per group. Defaults to GAP_TIME_LIMIT.
+
+    Returns:
+    dict: Group name -> gap_pool.JobResult.
+    """
+    jobs = [(group.name, (permutations.to_gap(group.generators or [permutations.identity(group.N)]), group.N))
+            for group in groups]
+    results = {}
+    with GapPool() as pool:
+        for result in pool.imap(gap_engines, jobs, time_limit=time_limit):
+            results[result.key] = result
+    return results
+
+
+def _timed(func, *args, **kwargs):
+    # Runs func and returns its value with the seconds it took.
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+
+def native_engines(group, seed=0):
+    """
+    Computes the orbits, order and rho of a group with every native engine.
+
+    Parameters:
+    group (Group): The group.
+    seed (int, optional): Seed of the sampling engine. Defaults to 0.
+
+    Returns:
+    dict: (quantity, engine) -> (value, seconds, interval); interval is the log10 confidence interval of a sampled
+          rho and None for exact values.
+    """
+    N, generators = group.N, group.generators or [permutations.identity(group.N)]
+    values = {}
+
+    labels, seconds = _timed(permutations.orbit_labels, generators, N)
+    values['orbits', 'native'] = (labels, seconds, None)
+    order, seconds = _timed(lambda: generator_reduction.group_order(generator_reduction.schreier_sims(generators, N)))
+    values['order', 'schreier-sims'] = (order, seconds, None)
+
+    result, seconds = _timed(rho_engines.count_rho, generators, N, exactness='auto', time_budget=SAMPLE_TIME_BUDGET)
+    sampled = result.log10_low is not None
+    values['rho', 'rho-engines'] = (result.rho, seconds, (result.log10_low, result.log10_high) if sampled else None)
+    estimate, seconds = _timed(approx_rho.estimate_rho, generators, N, time_budget=SAMPLE_TIME_BUDGET, seed=seed)
+    values['rho', 'sample'] = (estimate.rho, seconds, (estimate.log10_low, estimate.log10_high))
+
+    # Enumerate the group element by element when it is small enough, with the work cap of rho_engines.count_rho
+    max_order = min(rho_engines.ENUM_MAX_ORDER, rho_engines.ENUM_MAX_WORK // (N * len(generators)))
+    elements, seconds = _timed(rho_engines.enumerate_group, generators, max(max_order, 1))
+    if elements is not None:
+        # The orbit of node i is column i of the element list, so its smallest entry labels the orbit
+        labels, orbit_seconds = _timed(lambda: orbits.canonical(elements.min(axis=0)))
+        rho, rho_seconds = _timed(rho_engines.burnside_exact, elements)
+        values['orbits', 'native-enum'] = (labels, seconds + orbit_seconds, None)
+        values['order', 'native-enum'] = (len(elements), seconds, None)
+        values['rho', 'native-enum'] = (rho, seconds + rho_seconds, None)
+    return values
+
+
+def _same(quantity, value, reference):
+    # Exact comparison of two values of a quantity; orbit partitions are canonical orbit id arrays.
+    if quantity == 'orbits':
+        return np.array_equal(value, reference)
+    return int(value) == int(reference)
+
+
+def verify_group(group, gap_result=None, seed=0):
+    """
+    Runs every engine on a group and compares it with the reference of each quantity.
+
+    Parameters:
+    group (Group): The group.
+    gap_result (gap_pool.JobResult, optional): Outcome of the GAP engines on the group; None if GAP did not run.
+    seed (int, optional): Seed of the sampling engine. Defaults to 0.
+
+    Returns:
+    list: Check tuples, one per quantity and engine.
+    """
+    values = native_engines(group, seed)
+    checks = []
+    if gap_result is not None:
+        done = gap_result.status == 'done'
+        for quantity in QUANTITIES:
+            engine = 'gap-polya' if quantity == 'rho' else 'gap'
+            if done:
+                value, seconds = gap_result.value[quantity]
+                if quantity == 'orbits':
+                    value = orbits.encode(value, group.N)
+                values[quantity, engine] = (value, seconds, None)
+            else:
+                checks.append(Check(group.name, group.N, quantity, engine, None, gap_result.status, None, None, None,
+                                    f"{gap_result.status} after {gap_result.elapsed:.1f}s"))
+
+    for quantity in QUANTITIES:
+        engines = [engine for (q, engine) in values if q == quantity]
+        reference = next((engine for engine in ('gap', 'gap-polya', 'native-enum') if engine in engines), None)
+        ref_value, ref_seconds = values[quantity, reference][:2] if reference else (None, None)
+        for engine in engines:
+            if engine == reference:
+                continue
+            value, seconds, interval = values[quantity, engine]
+            detail = None
+            if reference is None:
+                status = 'unchecked'
+            elif interval is not None:
+                log10_ref = math.log10(int(ref_value))
+                inside = interval[0] - LOG10_TOLERANCE <= log10_ref <= interval[1] + LOG10_TOLERANCE
+                status = 'within' if inside else 'outside'
+                detail = f"log10 {log10_ref:.4f} against [{interval[0]:.4f}, {interval[1]:.4f}]"
+            else:
+                status = 'match' if _same(quantity, value, ref_value) else 'mismatch'
+                if status == 'mismatch':
+                    detail = (f"{len(np.unique(value))} orbits against {len(np.unique(ref_value))}"
+                              if quantity == 'orbits' else f"{value} against {ref_value}")
+            shown = None if quantity == 'orbits' else str(value)
+            checks.append(Check(group.name, group.N, quantity, engine, reference, status, seconds, ref_seconds,
+                                shown, detail))
+    return checks
+
+
+def verify_edges(group, scy):
+    """
+    Checks that every generator of a group maps the edges of its network onto edges, i.e. that the edge orbits are
+    computed from edges labelled as saucy labelled the nodes.
+
+    Parameters:
+    group (Group): The automorphism group of the network.
+    scy (str or Path): The .scy file saucy read.
+
+    Returns:
+    Check: The 'edges' check of the 'edge-orbits' engine, whose value is the number of edge orbits.
+    """
+    start = time.perf_counter()
+    edges = edge_orbits.canonical_edges(quotient.read_scy(scy)[1], group.N)
+    try:
+        labels = edge_orbits.edge_orbit_labels(group.generators, edges, group.N)
+    except (ValueError, IndexError) as e:
+        return Check(group.name, group.N, 'edges', 'edge-orbits', 'scy', 'mismatch', time.perf_counter() - start,
+                     None, None, str(e))
+    return Check(group.name, group.N, 'edges', 'edge-orbits', 'scy', 'match', time.perf_counter() - start, None,
+                 str(len(np.unique(labels))), f"{len(edges)} edges")
+
+
+def summarise(checks):
+    """
+    Summarises the checks per quantity and engine.
+
+    Parameters:
+    checks (list): Check tuples.
+
+    Returns:
+    pd.DataFrame: One row per quantity and engine: groups checked, matches (exact or within the interval), mismatches,
+                  sampled intervals that missed, unchecked and failed GAP runs, total seconds and the speedup over the
+                  reference (reference seconds over engine seconds, on the groups where both ran).
+    """
+    frame = pd.DataFrame(checks, columns=Check._fields)
+    rows = []
+    for (quantity, engine), part in frame.groupby(['quantity', 'engine'], sort=False):
+        compared = part[part['reference_seconds'].notna()]
+        engine_seconds = compared['seconds'].sum()
+        rows.append({
+            'quantity': quantity,
+            'engine': engine,
+            'groups': len(part),
+            'matches': int(part['status'].isin(['match', 'within']).sum()),
+            'mismatches': int((part['status'] == 'mismatch').sum()),
+            'outside': int((part['status'] == 'outside').sum()),
+            'unchecked': int((part['status'] == 'unchecked').sum()),
+            'failed': int((~part['status'].isin(['match', 'mismatch', 'within', 'outside', 'unchecked'])).sum()),
+            'seconds': part['seconds'].sum(),
+            'speedup': compared['reference_seconds'].sum() / engine_seconds if engine_seconds > 0 else float('nan'),
+            })
+    return pd.DataFrame(rows)
+
+
+def main(corpus=True, random_groups=RANDOM_GROUPS, limit=None, gap_time_limit=GAP_TIME_LIMIT, archives=False):
+    """
+    Verifies every engine on the corpus and on random groups, writes the checks and the summary and prints the table.
+
+    Parameters:
+    corpus (bool, optional): Include the groups of the batch corpus. Defaults to True.
+    random_groups (int, optional): Number of random groups. Defaults to RANDOM_GROUPS.
+    limit (int, optional): Read only the first limit networks of the corpus.
+    gap_time_limit (float, optional): Seconds GAP may spend on one group. Defaults to GAP_TIME_LIMIT.
+    archives (bool, optional): Read the corpus from the shipped GAP archive instead of the batch output.
+
+    Returns:
+    list: Check tuples of the exact engines that disagreed with the reference; empty when all agree.
+    """
+    directory = archive.shipped_directory('gap') if archives else corpus_path
+    groups = (corpus_groups(directory, limit) if corpus else []) + [random_group(seed) for seed in range(random_groups)]
+    print(f"Verifying {len(groups)} groups")
+    if gap_available():
+        gap_results = run_gap(groups, gap_time_limit)
+    else:
+        print("gappy is not installed: checking the native engines against native-enum only.")
+        gap_results = {}
+
+    checks = []
+    for i, group in enumerate(groups):
+        checks += verify_group(group, gap_results.get(group.name), seed=i)
+
+    # Edge orbits of the networks whose .scy file is at hand
+    for group in groups:
+        if (scy_path / (group.name + '.scy')).exists():
+            checks.append(verify_edges(group, scy_path / (group.name + '.scy')))
+    for group in user_groups():
+        checks.append(verify_edges(group, user_scy_path / (group.name + '.scy')))
+
+    os.makedirs(report_path, exist_ok=True)
+    pd.DataFrame(checks, columns=Check._fields).to_csv(report_path / 'checks.csv', index=False)
+    summary = summarise(checks)
+    summary.to_csv(report_path / 'summary.csv', index=False)
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.3g}"))
+
+    mismatches = [check for check in checks if check.status == 'mismatch']
+    for check in mismatches:
+        print(f"MISMATCH {check.group} {check.quantity} {check.engine}: {check.detail} ({check.reference})")
+    return mismatches
+
+
+if __name__ == "__main__":
+    main()
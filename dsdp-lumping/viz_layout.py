@@ -1,16 +1,19 @@
 from dash import Dash, html, dcc, callback, Output, Input
 import pandas as pd
 import os
-import ast
 import dash_cytoscape as cyto
 cyto.load_extra_layouts()
 import dash_bootstrap_components as dbc
 import networkx as nx
+import numpy as np
 import json
 from pathlib import Path
 
 import plotly.graph_objs as go
 
+from . import results_store
+from . import orbits
+
 
 '''
 This script is a Dash application that allows users to visualize and 
@@ -29,6 +32,10 @@ Plotly: To generate interactive graphs.
 current_file_path = Path(__file__).resolve()
 base_path = current_file_path.parents[1]
 
+# Results stores written by batch_lumping (preloaded networks) and lumping (user network)
+batch_store_path = base_path / 'data' / 'interim' / 'batch_lumping_output' / 'results.sqlite'
+user_store_path = base_path / 'data' / 'processed' / 'lumping_output' / 'results.sqlite'
+
 def read_user_net(filepath):
     """
     Reads the user-uploaded network data from a CSV file.
@@ -117,6 +124,27 @@ def read_netdat(filepath):
     except FileNotFoundError:
         return None
 
+def read_store(store_path, graph_name=None):
+    """
+    Reads the statistics and orbit partition of a network from a results store.
+
+    Parameters:
+    store_path (Path): The path to the results store.
+    graph_name (str, optional): The network to read. Defaults to the most recently written network.
+
+    Returns:
+    tuple: The network statistics (dict) and node -> orbit id array, or (None, None) if the network is not stored.
+    """
+    if not store_path.exists():
+        return None, None
+
+    conn = results_store.connect(store_path)
+    graph_name = graph_name or results_store.latest_name(conn)
+    net_row = results_store.get_row(conn, graph_name)
+    orbit_ids = results_store.get_orbit_ids(conn, graph_name)
+    conn.close()
+    return net_row, orbit_ids
+
 def DashStats(net_row):
     """
     Formats network statistics for display in the dashboard.
@@ -130,13 +158,31 @@ def DashStats(net_row):
 
     if net_row is None:
         return {} #Return empty dictionary if nothing is passed.
-    
+
+    if net_row.get('log10_rho_low') is not None:
+        # Estimated rho (see approx_rho.py): show the estimate and its confidence interval in powers of ten
+        return {
+            'name': f"Network Name: {net_row['graph_name']}",
+            'Automporphism group order': f"Automporphism group order: {net_row['aut_grp_order']}",
+            'node': f"Nodes: {net_row['n_nodes']}",
+            'edge': f"Edges: {net_row['M_edges']}",
+            'rho': f"Rho ≈ 10^{net_row['log10_rho']:.2f} (95% CI 10^{net_row['log10_rho_low']:.2f} to 10^{net_row['log10_rho_high']:.2f})",
+            'reduction': f"{10**net_row['delta']}",
+            'delta': f"Δ ≈ {net_row['delta']}"
+        }
+
+    # Exact rho is an arbitrarily large int (2^N for asymmetric networks), too large to format as a float
+    if net_row.get('log10_rho') is not None:
+        rho_text = f"Rho: 10^{net_row['log10_rho']:.2f}"
+    else:
+        rho_text = f"Rho: {net_row['rho']}"
+
     return {
         'name': f"Network Name: {net_row['graph_name']}",
         'Automporphism group order': f"Automporphism group order: {net_row['aut_grp_order']}",
         'node': f"Nodes: {net_row['n_nodes']}",
         'edge': f"Edges: {net_row['M_edges']}",
-        'rho': f"Rho: {net_row['rho']:.2e}",
+        'rho': rho_text,
         'reduction': f"{10**net_row['delta']}",
         # 'reduction': f"{10**net_row['delta']:.2e}",
         'delta': f"Δ: {net_row['delta']}"
@@ -154,60 +200,46 @@ def normalize_node_id(node_id):
     """
     return str(node_id).lower().strip()
 
-def assign_colours(G, filename=None):
+def assign_colours(G, filename=None, orbit_ids=None):
     """
     Assigns colors to nodes in a graph based on their orbit groups. 
-    If no filename is provided, it defaults to a predefined orbit colours file.
+    Orbits are taken from orbit_ids when given (as read from a results store), otherwise from a legacy orbit colours
+    file; if no filename is provided, it defaults to a predefined orbit colours file.
     
     Parameters:
     G (networkx.Graph): The graph whose nodes will be colored.
     filename (str, optional): Path to the file containing orbit information. Defaults to None.
+    orbit_ids (np.ndarray, optional): Node -> orbit id array. Defaults to None.
 
     Returns:
     dict: A dictionary mapping each node to an assigned color in hexadecimal RGB format.
     """
 
-    if filename is None: # Set default filename if none is provided
-        filename = base_path / 'data' / 'processed' / 'lumping_output' / 'orbitcolours.txt'
+    if orbit_ids is None:
+        if filename is None: # Set default filename if none is provided
+            filename = base_path / 'data' / 'processed' / 'lumping_output' / 'orbitcolours.txt'
+
+        try:
+            with open(filename) as coloursf: # Read orbit colour file (GAP list syntax, which is valid JSON)
+                zorbits = json.loads(coloursf.read().strip())
+        except (FileNotFoundError, json.JSONDecodeError):  #return an empty dictionary if the orbit colour file is not usable.
+            return {}
+        n_points = max((max(orbit) for orbit in zorbits if orbit), default=0)
+        orbit_ids = orbits.encode(zorbits, n_points)
+
+    # Colour index of every GAP point; fixed points get -1, which selects the default colour (light gray)
+    colour_idx = orbits.colour_indices(np.asarray(orbit_ids))
+    rgb_codes = np.array(orbits.RGB_CODES + [orbits.DEFAULT_COLOUR])
+
+    # Graph nodes are labelled with GAP points (1-indexed); anything else gets the default colour
+    nodes = list(G.nodes)
+    points = np.array([int(label) if label.isdigit() else 0 for label in map(normalize_node_id, nodes)], dtype=np.int64)
+    known = (points >= 1) & (points <= len(colour_idx))
+    node_idx = np.full(len(nodes), -1, dtype=np.int64)
+    node_idx[known] = colour_idx[points[known] - 1]
 
-    try:
-        with open(filename) as coloursf: # Read orbit colour file.
-            orbits_in = coloursf.read().strip()
-        lines = ast.literal_eval(orbits_in)
-    except FileNotFoundError:  #return an empty dictionary if the orbit colour file is not found.
-        return {}
-
-    # Initialize an empty dictionary to store node-color mappings
-    colourdict = {}
-    colcount = 1 # Counter to assign color groups
-
-    # Loop through each orbit group and assign a color group ID to each node in that orbit
-    for x, orbit in enumerate(lines):
-        colcount += 1 # Increment the color group count
-        for node_id in orbit:
-            normalized_id = normalize_node_id(node_id) # Normalize node ID (lowercase, trimmed)
-            colourdict[normalized_id] = colcount # Assign color group ID to the node
-
-    # Predefined RGB color codes (hex values) for color mapping
-    rgb_codes = ['#FF0000', '#FF8700', '#FFD300', '#DEFF0A', '#A1FF0A', 
-                 '#0AFF99', '#0AEFFF', '#147DF5', '#580AFF', '#BE0AFF']
-    
-    # Initialize the final color map for the graph nodes
-    colour_map = {}
-
-    # Iterate through each node in the graph
-    for node in G.nodes:
-        normalized_node = normalize_node_id(node)
-        if normalized_node in colourdict:
-             # Assign an RGB color based on the color group, cycling through the rgb_codes list
-            rgb_place = colourdict[normalized_node] % 10 #Keeping index within bounds
-            colour_map[node] = rgb_codes[rgb_place] # Assign the corresponding color
-        else:
-            # If the node is not found in the color dictionary, assign a default color (light gray)
-            colour_map[node] = '#f3f3f3'
-    
     # Return the final color map
-    return colour_map
+    return dict(zip(nodes, rgb_codes[node_idx].tolist()))
 
 def GenCytoElements(G, colour_map, pos):
     """
@@ -397,17 +429,20 @@ def update_elements(data_source_choice, selected_dataset):
     """
     if data_source_choice == 'preloaded' and selected_dataset:
         df = read_preloaded_nets(selected_dataset)
+        orbit_ids = read_store(batch_store_path, selected_dataset[:-4])[1]
         colour_file = base_path / 'data' / 'interim' / 'batch_lumping_output' / 'orbit_colours' / f"{selected_dataset[:-3]}txt"
     elif data_source_choice == 'uploaded':
         usernetpath = base_path / 'dsdp-lumping' / 'visedges.csv'
         df = read_user_net(usernetpath) 
+        orbit_ids = read_store(user_store_path)[1]
         colour_file = base_path / 'data' / 'processed' / 'lumping_output' / 'orbitcolours.txt'
     else:
         return []
 
     G = nx.from_pandas_edgelist(df, source='sources', target='targets')
     pos = nx.spring_layout(G)
-    colour_map = assign_colours(G, filename=colour_file)
+    # Networks lumped before the results store existed fall back to their orbit colours file
+    colour_map = assign_colours(G, filename=colour_file, orbit_ids=orbit_ids)
     elements = GenCytoElements(G, colour_map, pos)
     return elements
 
@@ -435,11 +470,15 @@ def update_network_statistics(data_source_choice, selected_dataset):
     """
 
     if data_source_choice == 'preloaded' and selected_dataset:
-        netdat_path = base_path / 'data' / 'interim' / 'batch_lumping_output' / 'rowdat' / f"{selected_dataset[:-4]}.json"
-        net_row = read_netdat(netdat_path)
+        net_row = read_store(batch_store_path, selected_dataset[:-4])[0]
+        if net_row is None:
+            netdat_path = base_path / 'data' / 'interim' / 'batch_lumping_output' / 'rowdat' / f"{selected_dataset[:-4]}.json"
+            net_row = read_netdat(netdat_path)
     elif data_source_choice == 'uploaded':
-        netdat_path = base_path / 'data' / 'processed' / 'lumping_output' / 'rowdat.json'
-        net_row = read_netdat(netdat_path)
+        net_row = read_store(user_store_path)[0]
+        if net_row is None:
+            netdat_path = base_path / 'data' / 'processed' / 'lumping_output' / 'rowdat.json'
+            net_row = read_netdat(netdat_path)
     else:
         return "No network selected", "", "", "", "", ""
 
@@ -463,15 +502,17 @@ def update_graph(data_source_choice, selected_dataset):
     go.Figure: A Plotly figure object containing the scatter plot.
     """
 
-    # Read the CSV file
+    # Read every network in one query from the results store, falling back to the legacy CSV
     file_path = base_path / 'data' / 'interim' / 'batch_lumping_output' / 'graph_data.csv'
-    
-    # Check if the file exists
-    if not file_path.exists():
-        return go.Figure()  # Return an empty figure if the file is not found
 
-    # Load the data into a DataFrame
-    df = pd.read_csv(file_path)
+    if batch_store_path.exists():
+        conn = results_store.connect(batch_store_path)
+        df = results_store.read_table(conn, ['n_nodes', 'log10_rho AS rho'])
+        conn.close()
+    elif file_path.exists():
+        df = pd.read_csv(file_path)
+    else:
+        return go.Figure()  # Return an empty figure if there is no data
 
     # Check if the necessary columns exist in the CSV
     if 'n_nodes' not in df.columns or 'rho' not in df.columns:
@@ -514,11 +555,11 @@ def main():
     
     df = read_user_net(usernetpath) # Read the user network data from the CSV file into a DataFrame
 
-    # Define the path to the network data (row data)
-    netdat_path = base_path / 'data' / 'processed' / 'lumping_output' / 'rowdat.json'
-    
-    # Read network data from the JSON file
-    net_row = read_netdat(netdat_path)
+    # Read network data from the user results store, falling back to the legacy JSON file
+    net_row, orbit_ids = read_store(user_store_path)
+    if net_row is None:
+        netdat_path = base_path / 'data' / 'processed' / 'lumping_output' / 'rowdat.json'
+        net_row = read_netdat(netdat_path)
 
     # Format network data for display
     dash_stats = DashStats(net_row)
@@ -529,7 +570,7 @@ def main():
     # Generate the layout for the nodes of the graph using a spring layout algorithm
     pos = nx.spring_layout(G)
     
-    colour_map = assign_colours(G) # Assign colors to nodes
+    colour_map = assign_colours(G, orbit_ids=orbit_ids) # Assign colors to nodes
     elements = GenCytoElements(G, colour_map, pos) #Generate Cytoscape elements (nodes and edges) for visualization
 
     # Initialize the Dash application with the DARKLY theme from Dash Bootstrap Components
@@ -1,7 +1,6 @@
 import os
-import pandas as pd
-import numpy as np
-import json
+
+from . import results_store
 
 current_file_path   = os.path.abspath(__file__)
 
@@ -11,43 +10,21 @@ base_path = os.path.normpath(base_path)
 dot_gap_path = os.path.join(base_path,'data','interim','batch_gap_output')
 scy_path = os.path.join(base_path,'data','external','1_network_data','networkrepository')
 graph_dat_path = os.path.join(base_path,'data','interim','batch_lumping_output','rowdat')
+store_path = os.path.join(base_path,'data','interim','batch_lumping_output','results.sqlite')
 stubs = os.listdir(dot_gap_path)
 
 def extract_graph_dat(datpath):
-    # Initialize a list to store the extracted data
-    data = []
-
-    # Loop over all files in the folder
-    for filename in os.listdir(datpath):
-        # Check if the file has a .json extension
-        if filename.endswith('.json'):
-            file_path = os.path.join(datpath, filename)
-            
-            # Open and load the JSON file
-            with open(file_path, 'r') as json_file:
-                json_data = json.load(json_file)
-                
-                # Extract "n_nodes" and "rho" if they exist in the JSON data
-                n_nodes = json_data.get('n_nodes')
-                rho = json_data.get('rho')
-                
-                # Append the extracted values and filename to the list
-                data.append({
-                    # 'filename': filename,
-                    'n_nodes': n_nodes,
-                    'rho': rho
-                })
+    # Brings any legacy per-network JSON files into the results store, then exports n_nodes and log10(rho)
+    # for every network with a single query
+    conn = results_store.connect(store_path)
+    if os.path.isdir(datpath):
+        imported = results_store.import_legacy(conn, datpath)
+        if imported > 0:
+            print(f"Imported {imported} legacy rowdat files into the results store.")
 
-    # Convert the list into a pandas DataFrame for better visualization
-    df = pd.DataFrame(data)
-    
-    # Convert the second column to numeric, setting invalid parsing to NaN
-    df.iloc[:, 1] = pd.to_numeric(df.iloc[:, 1], errors='coerce')
+    df = results_store.read_table(conn, ['n_nodes', 'log10_rho AS rho'])
+    conn.close()
 
-    # Replace zero or negative values with NaN to avoid log errors
-    df.iloc[:, 1] = df.iloc[:, 1].replace(0, np.nan)
-    df.iloc[:, 1] = df.iloc[:, 1].apply(lambda x: np.nan if x <= 0 else np.log(x))
-    
     outpath = os.path.join(base_path,'data','interim','batch_lumping_output','graph_data.csv')
     df.to_csv(outpath,index=False)
     return
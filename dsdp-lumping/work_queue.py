@@ -0,0 +1,390 @@
+'''
+Multi-node batch runs through a work queue on a shared filesystem.
+
+Any number of workers, on any number of hosts that mount the same data folder, can run
+
+    python -m dsdp-lumping batch --worker
+
+and share the networks of the batch between them without an external service. The queue is a folder:
+
+- leases/<network>: a worker claims a network by creating its lease file with O_CREAT | O_EXCL, which succeeds for
+  exactly one worker. While it works on the network a heartbeat thread touches the lease every LEASE_TTL / 3 seconds.
+- A lease untouched for longer than LEASE_TTL belongs to a crashed worker. It is taken over by renaming it to a name
+  private to the new worker (rename is atomic, so only one worker wins) and claiming the network again.
+- done/<network>: written atomically once a network is finished, with its status, the digest of its .scy input, the
+  engine and, when the exact engine was stopped, the network's skip ledger entry (see skip_ledger.py). Later runs skip
+  a network until its input or the engine changes; a network that was only estimated or failed is also retried once
+  skip_ledger.should_retry says its budget was raised, and one that failed without a ledger entry is retried every
+  run. The marker carries the entry because every worker starts with an empty skip ledger in its own shard.
+- shards/<worker>/: every worker writes its results store, checkpoint manifest, skip ledger and progress status
+  (see progress.py) to a shard of its own, so no SQLite database is shared between hosts. Saucy, .gap and orbit
+  files have one name per network and go to the usual folders.
+
+Once the workers are done, 'python -m dsdp-lumping batch --merge' merges the shards into the batch results store and
+manifest and exports lumps_out.csv. Lease expiry compares file modification times with the local clock, so hosts are
+assumed to keep their clocks in sync to well within LEASE_TTL (e.g. with NTP).
+'''
+
+import os
+import json
+import time
+import glob
+import random
+import socket
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from . import config
+from . import hashing
+from . import manifest
+from . import progress
+from . import skip_ledger
+from . import results_store
+from . import batch_auts
+from . import batch_gaut2gap
+from . import batch_lumping
+from .gap_pool import GapPool
+
+current_file_path   = os.path.abspath(__file__)
+base_path = os.path.join(current_file_path, '..','..')
+base_path = os.path.normpath(base_path)
+
+queue_path = config.QUEUE_DIR or os.path.join(base_path,'data','interim','work_queue')
+saucy_directory = os.path.join(base_path,'data','interim','batch_saucy_output')
+gap_directory = os.path.join(base_path,'data','interim','batch_gap_output')
+
+# A claimed network: the lease file, the network stub and the worker holding it
+Lease = namedtuple('Lease', ['path', 'network', 'worker'])
+
+
+def worker_id():
+    """
+    Returns a name for this worker that is unique across hosts.
+
+    Returns:
+    str: '<host>-<pid>'.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _write_atomic(path, data):
+    # Write a JSON file under a temporary name and move it into place, so readers never see it half written.
+    tmp_path = f"{path}.{worker_id()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+    return
+
+
+def _create_lease(path, network, worker):
+    # Create a lease file if none exists; exactly one of several concurrent callers succeeds.
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'worker': worker, 'claimed': time.time()}, f)
+    return Lease(path, network, worker)
+
+
+def is_done(queue_dir, network, digest):
+    """
+    Checks whether a network was finished from the same input by the current engine, under budgets that would not let
+    it get further now.
+
+    Parameters:
+    queue_dir (str): Queue folder.
+    network (str): Network stub.
+    digest (str): Digest of the network's .scy file.
+
+    Returns:
+    bool: True if the network can be skipped.
+    """
+    try:
+        with open(os.path.join(queue_dir, 'done', network), 'r') as f:
+            marker = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    if marker.get('input') != digest or marker.get('engine') != config.LUMPING_ENGINE:
+        return False
+    if marker.get('status') == 'done':
+        return True
+
+    # Estimated or failed: skipped like a network in the skip ledger, until the budget it exceeded is raised
+    entry = marker.get('ledger')
+    if entry is None:
+        return marker.get('status') == 'estimated'
+    return not skip_ledger.should_retry(entry, config.LUMPING_TIME_BUDGET, config.GAP_MEM_LIMIT,
+                                        config.LUMPING_ENGINE)
+
+
+def claim(queue_dir, network, worker, ttl=config.LEASE_TTL):
+    """
+    Claims a network, taking over the lease of a worker whose heartbeat has stopped.
+
+    Parameters:
+    queue_dir (str): Queue folder.
+    network (str): Network stub.
+    worker (str): Name of the claiming worker.
+    ttl (float, optional): Seconds after the last heartbeat at which a lease expires. Defaults to config.LEASE_TTL.
+
+    Returns:
+    Lease or None: The lease, or None if another worker holds the network.
+    """
+    path = os.path.join(queue_dir, 'leases', network)
+    lease = _create_lease(path, network, worker)
+    if lease is not None:
+        return lease
+
+    try:
+        if time.time() - os.stat(path).st_mtime <= ttl:
+            return None
+        expired = f"{path}.{worker}.expired"
+        os.rename(path, expired)
+    except FileNotFoundError:
+        return None  # Released, or taken over by another worker in the meantime
+
+    # Another worker may have taken the lease over and renewed it between the stat and the rename; put it back
+    if time.time() - os.stat(expired).st_mtime <= ttl:
+        try:
+            os.link(expired, path)
+        except FileExistsError:
+            pass
+        os.remove(expired)
+        return None
+    os.remove(expired)
+    print(f"Taking over the expired lease of {network}")
+    return _create_lease(path, network, worker)
+
+
+def heartbeat(lease):
+    """
+    Renews a lease.
+
+    Parameters:
+    lease (Lease): The lease.
+
+    Returns:
+    bool: False if the lease has been lost, i.e. it expired and was taken over by another worker.
+    """
+    try:
+        with open(lease.path, 'r') as f:
+            if json.load(f).get('worker') != lease.worker:
+                return False
+        os.utime(lease.path)
+    except (FileNotFoundError, ValueError):
+        return False
+    return True
+
+
+@contextmanager
+def hold(lease, ttl=config.LEASE_TTL):
+    """
+    Keeps a lease alive with heartbeats while the network is processed.
+
+    Parameters:
+    lease (Lease): The lease.
+    ttl (float, optional): Lease lifetime in seconds; a heartbeat is sent every ttl / 3. Defaults to config.LEASE_TTL.
+
+    Yields:
+    threading.Event: Set if the lease was lost while it was held.
+    """
+    lost, stop = threading.Event(), threading.Event()
+
+    def beat():
+        while not stop.wait(ttl / 3):
+            if not heartbeat(lease):
+                lost.set()
+                return
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield lost
+    finally:
+        stop.set()
+        thread.join()
+
+
+def complete(queue_dir, lease, status, digest, entry=None):
+    """
+    Marks a claimed network as finished and releases its lease.
+
+    Parameters:
+    queue_dir (str): Queue folder.
+    lease (Lease): The lease.
+    status (str): 'done', 'estimated' or 'failed'.
+    digest (str): Digest of the network's .scy file.
+    entry (dict, optional): The network's skip ledger entry, with the budgets the exact engine exceeded.
+    """
+    _write_atomic(os.path.join(queue_dir, 'done', lease.network),
+                  {'worker': lease.worker, 'status': status, 'input': digest, 'engine': config.LUMPING_ENGINE,
+                   'ledger': entry, 'finished': time.time()})
+    if heartbeat(lease):
+        os.remove(lease.path)
+    return
+
+
+def _lump(pool, stub, exactness, shard, time_limit):
+    # Run one lumping job on the GAP pool and return its JobResult.
+    started = batch_lumping.estimate_started if exactness == 'approximate' else batch_lumping.lumping_started
+    for result in pool.imap(batch_lumping.gen_row, [(stub, (stub, exactness, shard))], time_limit=time_limit,
+                            on_start=started):
+        outcome = result
+    return outcome
+
+
+def process_network(pool, scy_path, shard, conn, store, ledger, ledger_path, skipped_networks):
+    """
+    Runs saucy, gaut2gap and lumping on one network, writing the lumping results to a worker's shard.
+
+    Parameters:
+    pool (GapPool): The worker's GAP pool.
+    scy_path (str): Path of the network in .scy format.
+    shard (str): The worker's shard folder.
+    conn (sqlite3.Connection): The shard's checkpoint manifest.
+    store (sqlite3.Connection): The shard's results store.
+    ledger (dict): The shard's skip ledger, updated in place.
+    ledger_path (str): Path of the shard's skip ledger.
+    skipped_networks (set): Stubs listed in skipped_networks.txt.
+
+    Returns:
+    str: 'done', 'estimated' or 'failed'.
+    """
+    network = os.path.basename(scy_path)[:-4]
+    batch_auts.auts_gen(scy_path, saucy_directory)
+    fname = os.path.join(saucy_directory, network)
+    stub = os.path.join(gap_directory, network + '.gap')
+    try:
+        batch_gaut2gap.gaut_to_gap(fname, stub)
+    except ValueError as e:
+        print(f"Skipping {fname}. Reason: {e}")
+        # Asymmetric networks are still lumped from their saucy log alone (see batch_lumping.gen_row)
+        if batch_lumping.read_log(fname + '.log').get('generators') != '0':
+            return 'failed'
+
+    time_budget, mem_budget = config.LUMPING_TIME_BUDGET, config.GAP_MEM_LIMIT
+    mode = batch_lumping.plan_job(conn, store, ledger, skipped_networks, stub, time_budget, mem_budget)
+    if mode is None:
+        return 'done'
+    if mode == 'exact':
+        result = _lump(pool, stub, config.LUMPING_EXACTNESS, shard, time_budget)
+        if batch_lumping.record_result(conn, ledger, ledger_path, result, time_budget, mem_budget):
+            return 'done'
+    # Estimate rho for networks the exact engine skips or could not finish
+    result = _lump(pool, stub, 'approximate', shard, 2 * config.APPROX_TIME_BUDGET)
+    if batch_lumping.record_result(conn, ledger, ledger_path, result, time_budget, mem_budget, estimate=True):
+        return 'estimated'
+    return 'failed'
+
+
+def work(scy_paths, queue_dir=queue_path, worker=None, ttl=config.LEASE_TTL):
+    """
+    Runs a worker: claims networks from the queue one at a time and processes them until none are left.
+
+    Parameters:
+    scy_paths (list): Paths of every network in the batch, in .scy format.
+    queue_dir (str, optional): Queue folder on the shared filesystem. Defaults to queue_path.
+    worker (str, optional): Name of the worker. Defaults to worker_id().
+    ttl (float, optional): Lease lifetime in seconds. Defaults to config.LEASE_TTL.
+
+    Returns:
+    dict: Number of networks this worker finished, per status.
+    """
+    worker = worker or worker_id()
+    shard = os.path.join(queue_dir, 'shards', worker)
+    for directory in (os.path.join(queue_dir, 'leases'), os.path.join(queue_dir, 'done'), shard, saucy_directory,
+                      gap_directory):
+        os.makedirs(directory, exist_ok=True)
+
+    conn = manifest.connect(os.path.join(shard, 'manifest.sqlite'))
+    store = results_store.connect(os.path.join(shard, 'results.sqlite'))
+    ledger_path = os.path.join(shard, 'skip_ledger.json')
+    ledger = skip_ledger.read_ledger(ledger_path)
+    skipped_networks = batch_lumping.read_skipped_networks()
+
+    # Workers go through the networks in different orders, so they rarely contend for the same lease
+    scy_paths = sorted(scy_paths)
+    random.Random(worker).shuffle(scy_paths)
+
+    # Networks finished or claimed by other workers are skipped in this worker's progress
+    costs = {os.path.basename(scy_path)[:-4]: os.path.getsize(scy_path) for scy_path in scy_paths}
+    counts = {}
+    try:
+        with GapPool(mem_limit=config.GAP_MEM_LIMIT) as pool, \
+                progress.tracking(costs, path=os.path.join(shard, 'progress.json')):
+            for scy_path in scy_paths:
+                network = os.path.basename(scy_path)[:-4]
+                digest = hashing.file_digest(scy_path)
+                if is_done(queue_dir, network, digest):
+                    progress.skip_network(network)
+                    continue
+                lease = claim(queue_dir, network, worker, ttl)
+                if lease is None:
+                    progress.skip_network(network)
+                    continue
+                # The network may have been finished between the check above and the claim
+                if is_done(queue_dir, network, digest):
+                    os.remove(lease.path)
+                    progress.skip_network(network)
+                    continue
+
+                with hold(lease, ttl) as lost:
+                    status = process_network(pool, scy_path, shard, conn, store, ledger, ledger_path,
+                                             skipped_networks)
+                if lost.is_set():
+                    print(f"{worker} lost the lease of {network}; its results stay in the shard but another worker "
+                          "owns the network")
+                    continue
+                complete(queue_dir, lease, status, digest, ledger.get(network))
+                counts[status] = counts.get(status, 0) + 1
+    finally:
+        conn.close()
+        store.close()
+    print(f"{worker} finished {sum(counts.values())} networks: {counts}")
+    return counts
+
+
+def merge(queue_dir=queue_path):
+    """
+    Merges the shards of every worker into the batch results store, manifest and skip ledger, and exports
+    lumps_out.csv (see batch_lumping.export_results).
+
+    Parameters:
+    queue_dir (str, optional): Queue folder. Defaults to queue_path.
+
+    Returns:
+    int: Number of result rows merged.
+    """
+    os.makedirs(batch_lumping.lumpsout_path, exist_ok=True)
+    store = results_store.connect(batch_lumping.store_path)
+    conn = manifest.connect(batch_lumping.manifest_path)
+    ledger_path = os.path.join(batch_lumping.lumpsout_path, 'skip_ledger.json')
+    ledger = skip_ledger.read_ledger(ledger_path)
+    count = 0
+    try:
+        for shard in sorted(glob.glob(os.path.join(queue_dir, 'shards', '*'))):
+            count += results_store.merge(store, os.path.join(shard, 'results.sqlite'))
+            manifest.merge(conn, os.path.join(shard, 'manifest.sqlite'))
+            ledger.update(skip_ledger.read_ledger(os.path.join(shard, 'skip_ledger.json')))
+        skip_ledger.write_ledger(ledger_path, ledger)
+        batch_lumping.export_results(store)
+    finally:
+        conn.close()
+        store.close()
+    print(f"Merged {count} results from {queue_dir}")
+    return count
+
+
+def main():
+    """
+    Runs a work-queue worker on every network in the network repository folder.
+    """
+    data_path = os.path.join(base_path,'data','external','1_network_data','networkrepository','*.scy')
+    work(glob.glob(data_path))
+    return
+
+
+if __name__ == '__batch_run__':
+    main()